@@ -0,0 +1,317 @@
+# api.py
+# Serviço HTTP assíncrono (ASGI) para catracas e leitores de crachá, ao lado do app Streamlit.
+# Usa os mesmos modelos de database.py através do driver assíncrono aiosqlite.
+#
+#   ALUNOS_API_TOKEN=... uvicorn api:app --host 127.0.0.1 --port 8000
+#
+# Toda requisição precisa do cabeçalho "Authorization: Bearer <ALUNOS_API_TOKEN>" (o
+# mesmo segredo configurado nas catracas); sem ALUNOS_API_TOKEN o serviço não sobe.
+#
+# Rotas:
+#   POST /presencas/entrada        {"aluno_id": 1} ou {"codigo": "AB123"}, opcional "quando" (ISO 8601)
+#   POST /presencas/entrada/lote   {"entradas": [{...}, ...]}  (uma transação para o lote)
+#   POST /presencas/saida          {"aluno_id": 1} ou {"codigo": "AB123"}  (fecha a entrada aberta do dia)
+#   GET  /alunos/{id}
+#   GET  /alunos?codigo=AB123      (passaporte ou ID)   |   GET /alunos?q=maria  (busca FTS)
+#   GET  /presentes?dia=2025-03-10
+#   GET  /mudancas?desde=123&limite=1000&tabelas=alunos   (sincronização incremental por seq)
+#
+# Com várias escolas (ALUNOS_ESCOLAS), a escola vem do cabeçalho X-Escola ou do
+# parâmetro ?escola=; sem eles, vale a escola padrão.
+import asyncio
+import contextlib
+import hmac
+import json
+import os
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import database
+from database import (
+    COLUNAS_ALUNO,
+    Aluno,
+    AlunoDTO,
+    Presenca,
+    atualizar_presenca_diaria,
+    consulta_fts,
+    stmt_busca_fts,
+    stmt_fechar_presenca_aberta,
+    stmt_mudancas,
+    stmt_presentes,
+)
+
+LIMITE_LOTE = 5000
+TOKEN = os.environ.get("ALUNOS_API_TOKEN")
+
+
+def criar_engine_async(url: str = None):
+    """Engine assíncrono para o mesmo banco de database.url_banco(), com os mesmos PRAGMAs."""
+    url = make_url(url or database.url_banco())
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+    engine_async = create_async_engine(url)
+    if url.drivername.startswith("sqlite"):
+        database.registrar_pragmas(engine_async.sync_engine)
+    return engine_async
+
+
+engines_async = {}  # escola -> engine assíncrono, criado na primeira requisição da escola
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+        self.mensagem = mensagem
+
+
+def _json(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _engine(request):
+    roteador = database.roteador
+    escola = request.headers.get("X-Escola") or request.query_params.get("escola") or roteador.padrao
+    if escola not in roteador.destinos:
+        raise ErroRequisicao(404, f"escola desconhecida: {escola}")
+    if escola not in engines_async:
+        engines_async[escola] = criar_engine_async(roteador.url_escola(escola))
+    return engines_async[escola]
+
+
+def _aluno_json(aluno):
+    return {campo: _json(valor) for campo, valor in aluno._asdict().items()}
+
+
+def _quando(entrada: dict):
+    if entrada.get("quando"):
+        try:
+            return datetime.fromisoformat(entrada["quando"])
+        except (TypeError, ValueError):
+            raise ErroRequisicao(422, f"'quando' inválido: {entrada['quando']!r}")
+    return datetime.now()
+
+
+async def _resolver_ids(conn, entradas):
+    """Mapeia cada entrada (aluno_id ou codigo) para o ID do aluno; 404 para quem não existe."""
+    ids, codigos = set(), set()
+    for entrada in entradas:
+        if not isinstance(entrada, dict):
+            raise ErroRequisicao(422, "cada entrada deve ser um objeto JSON")
+        if entrada.get("aluno_id") is not None:
+            try:
+                ids.add(int(entrada["aluno_id"]))
+            except (TypeError, ValueError):
+                raise ErroRequisicao(422, f"aluno_id inválido: {entrada['aluno_id']!r}")
+        elif entrada.get("codigo"):
+            codigos.add(str(entrada["codigo"]).strip())
+        else:
+            raise ErroRequisicao(422, "informe aluno_id ou codigo")
+
+    existentes = set()
+    if ids:
+        existentes = set((await conn.execute(select(Aluno.id).where(Aluno.id.in_(ids)))).scalars())
+    por_codigo = {}
+    if codigos:
+        linhas = await conn.execute(select(Aluno.passaporte, Aluno.id).where(Aluno.passaporte.in_(codigos)))
+        por_codigo = dict(linhas.all())
+        numericos = {int(c) for c in codigos - set(por_codigo) if c.isdigit()}
+        if numericos:
+            achados = (await conn.execute(select(Aluno.id).where(Aluno.id.in_(numericos)))).scalars()
+            por_codigo.update({str(i): i for i in achados})
+
+    resolvidos = []
+    for entrada in entradas:
+        if entrada.get("aluno_id") is not None:
+            aluno_id = int(entrada["aluno_id"])
+            if aluno_id not in existentes:
+                raise ErroRequisicao(404, f"aluno não encontrado: {aluno_id}")
+        else:
+            codigo = str(entrada["codigo"]).strip()
+            if codigo not in por_codigo:
+                raise ErroRequisicao(404, f"aluno não encontrado: {codigo}")
+            aluno_id = por_codigo[codigo]
+        resolvidos.append(aluno_id)
+    return resolvidos
+
+
+async def _ler_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise ErroRequisicao(400, "corpo JSON inválido")
+
+
+async def _registrar_entradas(engine_async, entradas):
+    linhas = []
+    async with engine_async.begin() as conn:
+        ids = await _resolver_ids(conn, entradas)
+        for entrada, aluno_id in zip(entradas, ids):
+            agora = _quando(entrada)
+            linhas.append({"aluno_id": aluno_id, "data": agora.date(), "hora_entrada": agora,
+                           "observacao": entrada.get("observacao")})
+        stmt = insert(Presenca).returning(Presenca.id, sort_by_parameter_order=True)
+        gravadas = (await conn.execute(stmt, linhas)).scalars().all()
+        pares = {(linha["aluno_id"], linha["data"]) for linha in linhas}
+        await conn.run_sync(lambda c: atualizar_presenca_diaria(c, pares))
+    return [
+        {"id": pres_id, "aluno_id": linha["aluno_id"], "hora_entrada": linha["hora_entrada"].isoformat()}
+        for pres_id, linha in zip(gravadas, linhas)
+    ]
+
+
+# -------- Rotas --------
+async def entrada(request):
+    corpo = await _ler_json(request)
+    registro = (await _registrar_entradas(_engine(request), [corpo]))[0]
+    return JSONResponse(registro, status_code=201)
+
+
+async def entrada_lote(request):
+    corpo = await _ler_json(request)
+    entradas = corpo.get("entradas") if isinstance(corpo, dict) else None
+    if not isinstance(entradas, list) or not entradas:
+        raise ErroRequisicao(422, "informe uma lista não vazia em 'entradas'")
+    if len(entradas) > LIMITE_LOTE:
+        raise ErroRequisicao(413, f"lote acima de {LIMITE_LOTE} entradas")
+    registros = await _registrar_entradas(_engine(request), entradas)
+    return JSONResponse({"registradas": len(registros), "presencas": registros}, status_code=201)
+
+
+async def saida(request):
+    corpo = await _ler_json(request)
+    quando = _quando(corpo)
+    async with _engine(request).begin() as conn:
+        aluno_id = (await _resolver_ids(conn, [corpo]))[0]
+        linha = (await conn.execute(stmt_fechar_presenca_aberta(aluno_id, quando).returning(
+            Presenca.id, Presenca.data, Presenca.hora_entrada, Presenca.hora_saida
+        ))).first()
+        if linha is None:
+            raise ErroRequisicao(404, "nenhuma entrada aberta no dia para o aluno")
+        await conn.run_sync(lambda c: atualizar_presenca_diaria(c, [(aluno_id, linha.data)]))
+    return JSONResponse({
+        "id": linha.id, "aluno_id": aluno_id,
+        "hora_entrada": _json(linha.hora_entrada), "hora_saida": _json(linha.hora_saida),
+    })
+
+
+async def aluno(request):
+    try:
+        aluno_id = int(request.path_params["aluno_id"])
+    except ValueError:
+        raise ErroRequisicao(422, "ID inválido")
+    async with _engine(request).connect() as conn:
+        linha = (await conn.execute(select(*COLUNAS_ALUNO).where(Aluno.id == aluno_id))).first()
+    if linha is None:
+        raise ErroRequisicao(404, f"aluno não encontrado: {aluno_id}")
+    return JSONResponse(_aluno_json(AlunoDTO._make(linha)))
+
+
+async def alunos(request):
+    codigo = request.query_params.get("codigo")
+    termo = request.query_params.get("q")
+    async with _engine(request).connect() as conn:
+        if codigo:
+            ids = await _resolver_ids(conn, [{"codigo": codigo}])
+            linhas = await conn.execute(select(*COLUNAS_ALUNO).where(Aluno.id == ids[0]))
+        elif termo:
+            consulta = consulta_fts(termo)
+            if not consulta:
+                return JSONResponse([])
+            try:
+                limite = min(int(request.query_params.get("limite", 20)), 200)
+            except ValueError:
+                raise ErroRequisicao(422, "limite inválido")
+            linhas = await conn.execute(stmt_busca_fts(consulta, limite))
+        else:
+            raise ErroRequisicao(422, "informe 'codigo' ou 'q'")
+        return JSONResponse([_aluno_json(AlunoDTO._make(linha)) for linha in linhas])
+
+
+async def presentes(request):
+    dia = None
+    if request.query_params.get("dia"):
+        try:
+            dia = date.fromisoformat(request.query_params["dia"])
+        except ValueError:
+            raise ErroRequisicao(422, "dia inválido (use AAAA-MM-DD)")
+    async with _engine(request).connect() as conn:
+        linhas = (await conn.execute(stmt_presentes(dia))).all()
+    return JSONResponse([
+        {"aluno_id": l.id, "nome": l.nome, "serie": l.serie, "hora_entrada": _json(l.hora_entrada)} for l in linhas
+    ])
+
+
+async def mudancas(request):
+    try:
+        desde = int(request.query_params.get("desde", 0))
+        limite = max(1, min(int(request.query_params.get("limite", 1000)), LIMITE_LOTE))
+    except ValueError:
+        raise ErroRequisicao(422, "'desde' e 'limite' devem ser inteiros")
+    tabelas = [t for t in request.query_params.get("tabelas", "").split(",") if t] or None
+    async with _engine(request).connect() as conn:
+        linhas = (await conn.execute(stmt_mudancas(desde, tabelas).limit(limite + 1))).all()
+    mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    return JSONResponse({
+        "mudancas": [{
+            "seq": l.seq, "tabela": l.tabela, "operacao": l.operacao, "registro_id": l.registro_id,
+            "dados": json.loads(l.dados) if l.dados else None, "momento": _json(l.momento),
+        } for l in linhas],
+        # guarde ultimo_seq e peça de novo enquanto "mais" for verdadeiro
+        "ultimo_seq": linhas[-1].seq if linhas else desde,
+        "mais": mais,
+    })
+
+
+async def _erro_requisicao(request, exc):
+    return JSONResponse({"erro": exc.mensagem}, status_code=exc.status)
+
+
+class ExigirToken(BaseHTTPMiddleware):
+    """Recusa (401) requisições sem o token compartilhado no cabeçalho Authorization."""
+
+    async def dispatch(self, request, call_next):
+        esquema, _, recebido = request.headers.get("Authorization", "").partition(" ")
+        if not TOKEN or esquema.lower() != "bearer" or not hmac.compare_digest(recebido.encode(), TOKEN.encode()):
+            return JSONResponse({"erro": "token ausente ou inválido"}, status_code=401,
+                                headers={"WWW-Authenticate": "Bearer"})
+        return await call_next(request)
+
+
+@contextlib.asynccontextmanager
+async def _ciclo_de_vida(_app):
+    if not TOKEN:
+        raise RuntimeError("defina ALUNOS_API_TOKEN: a API não atende sem o token compartilhado")
+    # schema/migrações usam o engine síncrono de database.py
+    await asyncio.to_thread(database.criar_banco)
+    yield
+    for engine_async in engines_async.values():
+        await engine_async.dispose()
+    engines_async.clear()
+
+
+app = Starlette(
+    routes=[
+        Route("/presencas/entrada", entrada, methods=["POST"]),
+        Route("/presencas/entrada/lote", entrada_lote, methods=["POST"]),
+        Route("/presencas/saida", saida, methods=["POST"]),
+        Route("/alunos", alunos, methods=["GET"]),
+        Route("/alunos/{aluno_id}", aluno, methods=["GET"]),
+        Route("/presentes", presentes, methods=["GET"]),
+        Route("/mudancas", mudancas, methods=["GET"]),
+    ],
+    middleware=[Middleware(ExigirToken)],
+    exception_handlers={ErroRequisicao: _erro_requisicao},
+    lifespan=_ciclo_de_vida,
+)
@@ -1,40 +1,128 @@
 # app.py
 import streamlit as st
-import pandas as pd
-from io import BytesIO
-from datetime import datetime, date
+import metricas
+from datetime import datetime, date, timedelta
 from database import (
     criar_banco,
     inserir_aluno,
-    listar_alunos,
     obter_aluno_por_id,
     atualizar_aluno,
     deletar_aluno,
+    atualizar_alunos,
+    deletar_alunos,
+    promover_series,
+    proxima_serie,
+    contar_alunos_por_serie,
+    encontrar_duplicados,
+    mesclar_alunos,
     registrar_presenca_entrada,
-    registrar_presenca_saida,
     listar_presencas,
+    listar_alunos_pagina,
+    buscar_alunos,
+    listar_presencas_pagina,
+    contar_alunos,
+    contar_presencas,
     criar_usuario,
     autenticar_usuario,
+    LoginBloqueado,
+    emitir_token_sessao,
+    validar_token_sessao,
+    revogar_tokens_sessao,
+    obter_estatisticas,
+    importar_alunos,
+    exportar_alunos,
+    exportar_presencas,
+    resolver_aluno,
+    obter_fila_presencas,
+    registrar_presenca_saida_por_aluno,
+    fechar_presencas_abertas_anteriores,
+    SAIDA_NAO_REGISTRADA,
+    listar_presentes,
+    diretorio_alunos,
+    taxa_presenca_por_serie_semana,
+    tempo_medio_por_pais,
+    reconstruir_presenca_diaria,
+    roteador,
+    definir_escola,
+    usar_escola,
+    obter_estatisticas_rede,
+    exportar_alunos_rede,
+    exportar_presencas_rede,
+    arquivar_anos_encerrados,
+    listar_arquivos_presencas,
+    manter_banco,
+    exportar_mudancas,
+    ultimo_seq_mudancas,
 )
 
-# Inicializa banco e usuário admin padrão
-criar_banco()
-
 st.set_page_config(page_title="Controle de Alunos Estrangeiros", layout="wide")
 
+# Inicializa banco e usuário admin padrão uma vez por processo (não a cada rerun/sessão).
+# O pandas (centenas de ms para importar) só é importado nas páginas que mostram tabelas.
+@st.cache_resource(show_spinner=False)
+def inicializar_banco():
+    criar_banco()
+    return True
+
+inicializar_banco()
+
 # --- Helpers de sessão para autenticação ---
 if "user" not in st.session_state:
     st.session_state.user = None
 
+def cliente_atual():
+    """IP do navegador (para limitar tentativas de login por cliente), se o Streamlit expõe."""
+    contexto = getattr(st, "context", None)
+    ip = getattr(contexto, "ip_address", None)
+    if not ip and contexto is not None:
+        encaminhado = (getattr(contexto, "headers", None) or {}).get("X-Forwarded-For", "")
+        ip = encaminhado.split(",")[0].strip() or None
+    return ip
+
+def _guardar_usuario(user):
+    st.session_state.user = {"id": user.id, "username": user.username, "role": user.role, "escola": user.escola}
+
 def login(username, password):
-    user = autenticar_usuario(username, password)
+    user = autenticar_usuario(username, password, cliente=cliente_atual())
     if user:
-        st.session_state.user = {"id": user.id, "username": user.username, "role": user.role}
+        _guardar_usuario(user)
+        # token assinado na URL: ao reconectar/recarregar não é preciso verificar a senha de novo
+        st.query_params["sessao"] = emitir_token_sessao(user)
         return True
     return False
 
 def logout():
+    if st.session_state.user is not None:
+        # a URL com o token pode ter sido copiada: revoga em vez de só tirá-lo da URL
+        revogar_tokens_sessao(st.session_state.user["id"])
     st.session_state.user = None
+    st.query_params.pop("sessao", None)
+
+if st.session_state.user is None and st.query_params.get("sessao"):
+    user_token = validar_token_sessao(st.query_params["sessao"])
+    if user_token:
+        _guardar_usuario(user_token)
+    else:
+        st.query_params.pop("sessao", None)
+
+# --- Helpers de paginação (cursores keyset guardados na sessão) ---
+def paginador(chave, assinatura):
+    """Pilha de cursores da listagem `chave`; reinicia quando os filtros (assinatura) mudam."""
+    estado = st.session_state.get(chave)
+    if estado is None or estado["assinatura"] != assinatura:
+        estado = {"assinatura": assinatura, "cursores": [None]}
+        st.session_state[chave] = estado
+    return estado
+
+def controles_paginacao(chave, estado, proximo_cursor, total, tamanho):
+    pagina = len(estado["cursores"])
+    paginas = max(1, -(-total // tamanho))
+    col_ant, col_info, col_prox = st.columns([1, 2, 1])
+    col_ant.button("◀ Anterior", key=f"{chave}_ant", disabled=pagina == 1,
+                   on_click=lambda: estado["cursores"].pop())
+    col_info.caption(f"Página {pagina} de {paginas} — {total} registro(s)")
+    col_prox.button("Próxima ▶", key=f"{chave}_prox", disabled=proximo_cursor is None,
+                    on_click=lambda: estado["cursores"].append(proximo_cursor))
 
 # ---- Barra lateral: Login / Logout ----
 with st.sidebar:
@@ -45,11 +133,15 @@ with st.sidebar:
             pass_in = st.text_input("Senha", type="password")
             submitted = st.form_submit_button("Entrar")
             if submitted:
-                ok = login(user_in, pass_in)
-                if ok:
-                    st.success(f"Logado como {st.session_state.user['username']}")
+                try:
+                    ok = login(user_in, pass_in)
+                except LoginBloqueado as e:
+                    st.error(f"Muitas tentativas de login. Aguarde {e.segundos:.0f}s e tente novamente.")
                 else:
-                    st.error("Usuário ou senha incorretos")
+                    if ok:
+                        st.success(f"Logado como {st.session_state.user['username']}")
+                    else:
+                        st.error("Usuário ou senha incorretos")
         st.write("---")
         st.write("Usuário padrão: `admin` / senha: `admin123` (troque após o primeiro login)")
     else:
@@ -58,261 +150,165 @@ with st.sidebar:
             logout()
             st.experimental_rerun()
 
-# ---- Menu principal ----
-menu = st.sidebar.selectbox("Menu", ["Dashboard", "Cadastrar", "Listar / Buscar", "Presença", "Relatórios", "Usuários (admin)"])
-
-# ---- Dashboard ----
-if menu == "Dashboard":
-    st.title("📊 Dashboard")
-    # Resumo rápido
-    alunos = listar_alunos()
-    total = len(alunos)
-    st.metric("Total de alunos cadastrados", total)
-
-    # Alunos por país e por série (tabelas)
-    if alunos:
-        df = pd.DataFrame([{
-            "ID": a.id,
-            "Nome": a.nome,
-            "País": a.pais or "",
-            "Série": a.serie or "",
-            "Entrada": a.data_entrada.isoformat() if a.data_entrada else ""
-        } for a in alunos])
-
-        st.subheader("Alunos por País")
-        pais_count = df["País"].value_counts().rename_axis("País").reset_index(name="Quantidade")
-        st.dataframe(pais_count)
-
-        st.subheader("Alunos por Série")
-        serie_count = df["Série"].value_counts().rename_axis("Série").reset_index(name="Quantidade")
-        st.dataframe(serie_count)
+# ---- Escola da sessão (cada escola tem o próprio banco) ----
+ESCOLAS = roteador.escolas
+
+def eh_admin():
+    return st.session_state.user is not None and st.session_state.user.get("role") == "admin"
+
+def escola_da_sessao():
+    user = st.session_state.user
+    if user is not None and not eh_admin() and user.get("escola") in ESCOLAS:
+        return user["escola"]
+    escola = st.session_state.get("escola")
+    return escola if escola in ESCOLAS else roteador.padrao
+
+if len(ESCOLAS) > 1:
+    if eh_admin():
+        # só troca o banco usado pelas próximas consultas; os engines das escolas ficam abertos
+        st.sidebar.selectbox("Escola", ESCOLAS, index=ESCOLAS.index(escola_da_sessao()), key="escola")
     else:
-        st.info("Nenhum aluno cadastrado ainda.")
-
-# ---- Cadastro ----
-elif menu == "Cadastrar":
-    st.title("➕ Cadastrar Aluno")
-    with st.form("form_cadastrar"):
-        nome = st.text_input("Nome completo", max_chars=200)
-        idade = st.number_input("Idade", min_value=1, max_value=120, value=15)
-        pais = st.text_input("País de origem")
-        passaporte = st.text_input("Passaporte / Documento")
-        serie = st.text_input("Série / Ano")
-        data_entrada = st.date_input("Data de entrada", value=date.today())
-        responsavel = st.text_input("Responsável")
-        observacoes = st.text_area("Observações")
-        btn = st.form_submit_button("Salvar")
-        if btn:
-            aluno = inserir_aluno(
-                nome=nome,
-                idade=int(idade),
-                pais=pais,
-                passaporte=passaporte,
-                serie=serie,
-                data_entrada=data_entrada,
-                responsavel=responsavel,
-                observacoes=observacoes,
-            )
-            st.success(f"Aluno '{aluno.nome}' cadastrado (ID {aluno.id}).")
-
-# ---- Listar / Buscar / Editar / Deletar ----
-elif menu == "Listar / Buscar":
-    st.title("🔎 Buscar e Gerenciar Alunos")
-
-    with st.expander("Filtros"):
-        nome_f = st.text_input("Nome contém")
-        pais_f = st.text_input("País (exato)")
-        serie_f = st.text_input("Série (exato)")
+        st.sidebar.caption(f"Escola: **{escola_da_sessao()}**")
+definir_escola(escola_da_sessao())
+rede = len(ESCOLAS) > 1 and eh_admin()
+
+# ---- Menu principal ----
+menu = st.sidebar.selectbox("Menu", ["Dashboard", "Cadastrar", "Importar", "Listar / Buscar", "Presença", "Quiosque", "Análises", "Relatórios", "Usuários (admin)", "Desempenho (admin)"])
+
+# mede a execução da página (tempo total e quantidade de SQL) para a página Desempenho
+execucao_pagina = metricas.Execucao(f"pagina:{menu}").iniciar()
+try:
+    # ---- Dashboard ----
+    if menu == "Dashboard":
+        st.title("📊 Dashboard")
+        import pandas as pd
+        visao_rede = rede and st.checkbox("Toda a rede (somar todas as escolas)")
+        # Resumo rápido (agregado no banco; na rede, consultado em paralelo em cada escola)
+        stats = obter_estatisticas_rede() if visao_rede else obter_estatisticas()
+        total = stats["total_alunos"]
         col1, col2 = st.columns(2)
-        data_inicio = col1.date_input("Data entrada - início", value=None)
-        data_fim = col2.date_input("Data entrada - fim", value=None)
-        if data_inicio == date(1970,1,1):
-            data_inicio = None
-        if data_fim == date(1970,1,1):
-            data_fim = None
-        if st.button("Aplicar filtros"):
-            pass
-
-    filtros = {}
-    if nome_f:
-        filtros["nome"] = nome_f
-    if pais_f:
-        filtros["pais"] = pais_f
-    if serie_f:
-        filtros["serie"] = serie_f
-    if data_inicio:
-        filtros["data_inicio"] = data_inicio
-    if data_fim:
-        filtros["data_fim"] = data_fim
-
-    alunos = listar_alunos(filtros=filtros if filtros else None)
-
-    if alunos:
-        df = pd.DataFrame([{
-            "ID": a.id,
-            "Nome": a.nome,
-            "Idade": a.idade,
-            "País": a.pais,
-            "Passaporte": a.passaporte,
-            "Série": a.serie,
-            "Data Entrada": a.data_entrada,
-            "Responsável": a.responsavel
-        } for a in alunos])
-        st.dataframe(df)
+        col1.metric("Total de alunos cadastrados", total)
+        col2.metric("Presenças em aberto", stats["presencas_abertas"])
+        if visao_rede:
+            st.subheader("Alunos por Escola")
+            st.dataframe(pd.DataFrame(list(stats["por_escola"].items()), columns=["Escola", "Quantidade"]))
 
-        st.write("---")
-        st.subheader("Ações rápidas")
-        id_selecionado = st.number_input("ID do aluno para ações", min_value=0, step=1)
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            if st.button("Ver detalhes / Editar"):
-                if id_selecionado <= 0:
-                    st.warning("Informe um ID válido.")
-                else:
-                    a = obter_aluno_por_id(int(id_selecionado))
-                    if not a:
-                        st.error("Aluno não encontrado.")
-                    else:
-                        with st.form("editar_form"):
-                            nome_e = st.text_input("Nome", value=a.nome)
-                            idade_e = st.number_input("Idade", min_value=1, max_value=120, value=a.idade or 1)
-                            pais_e = st.text_input("País", value=a.pais or "")
-                            pass_e = st.text_input("Passaporte", value=a.passaporte or "")
-                            serie_e = st.text_input("Série", value=a.serie or "")
-                            data_e = st.date_input("Data entrada", value=a.data_entrada or date.today())
-                            resp_e = st.text_input("Responsável", value=a.responsavel or "")
-                            obs_e = st.text_area("Observações", value=a.observacoes or "")
-                            btn_ed = st.form_submit_button("Salvar alterações")
-                            if btn_ed:
-                                atualizado = atualizar_aluno(a.id, {
-                                    "nome": nome_e,
-                                    "idade": int(idade_e),
-                                    "pais": pais_e,
-                                    "passaporte": pass_e,
-                                    "serie": serie_e,
-                                    "data_entrada": data_e,
-                                    "responsavel": resp_e,
-                                    "observacoes": obs_e
-                                })
-                                if atualizado:
-                                    st.success("Aluno atualizado.")
-                                else:
-                                    st.error("Erro ao atualizar.")
-        with col2:
-            if st.button("Deletar aluno"):
-                if id_selecionado <= 0:
-                    st.warning("Informe um ID válido.")
-                else:
-                    ok = deletar_aluno(int(id_selecionado))
-                    if ok:
-                        st.success("Aluno deletado.")
-                    else:
-                        st.error("Aluno não encontrado ou erro.")
-        with col3:
-            if st.button("Ver histórico de presenças"):
-                if id_selecionado <= 0:
-                    st.warning("Informe um ID válido.")
-                else:
-                    pres = listar_presencas(aluno_id=int(id_selecionado))
-                    if pres:
-                        dfp = pd.DataFrame([{
-                            "ID": p.id,
-                            "Data": p.data,
-                            "Entrada": p.hora_entrada,
-                            "Saída": p.hora_saida,
-                            "Observação": p.observacao
-                        } for p in pres])
-                        st.dataframe(dfp)
-                    else:
-                        st.info("Nenhuma presença registrada para esse aluno.")
-    else:
-        st.info("Nenhum aluno encontrado com os filtros informados.")
+        # Alunos por país e por série (tabelas)
+        if total:
+            st.subheader("Alunos por País")
+            pais_count = pd.DataFrame(stats["por_pais"], columns=["País", "Quantidade"])
+            st.dataframe(pais_count)
 
-# ---- Presença ----
-elif menu == "Presença":
-    st.title("🕘 Registro de Presença")
+            st.subheader("Alunos por Série")
+            serie_count = pd.DataFrame(stats["por_serie"], columns=["Série", "Quantidade"])
+            st.dataframe(serie_count)
 
-    col1, col2 = st.columns([2,1])
-    with col1:
-        alunos = listar_alunos()
-        options = {a.id: f"{a.id} - {a.nome}" for a in alunos}
-        id_sel = st.selectbox("Escolha o aluno", options=[0] + list(options.keys()), format_func=lambda x: "Selecione um aluno" if x==0 else options[x])
-        if id_sel and id_sel != 0:
-            st.write("Aluno:", options[id_sel])
-    with col2:
-        now = datetime.now()
-        st.write("Agora:", now.strftime("%Y-%m-%d %H:%M:%S"))
-
-    if id_sel and id_sel != 0:
-        col_e, col_s = st.columns(2)
-        with col_e:
-            if st.button("Registrar ENTRADA"):
-                p = registrar_presenca_entrada(aluno_id=int(id_sel))
-                st.success(f"Entrada registrada (ID pres.: {p.id}) às {p.hora_entrada}")
-        with col_s:
-            pres_list = listar_presencas(aluno_id=int(id_sel), data_inicio=date.today(), data_fim=date.today())
-            # tentar fechar a última com hora_saida vazia
-            ultima_aberta = None
-            for p in pres_list:
-                if p.hora_saida is None:
-                    ultima_aberta = p
-                    break
-            if st.button("Registrar SAÍDA"):
-                if ultima_aberta:
-                    p2 = registrar_presenca_saida(ultima_aberta.id)
-                    st.success(f"Saída registrada: {p2.hora_saida}")
+            st.subheader("Entradas por dia (últimos 30 dias)")
+            entradas_dia = pd.DataFrame(stats["entradas_por_dia"], columns=["Data", "Entradas"])
+            st.dataframe(entradas_dia)
+
+            if not visao_rede:
+                st.subheader("Na escola agora")
+                presentes = listar_presentes()
+                if presentes:
+                    st.dataframe(pd.DataFrame(presentes, columns=["ID", "Nome", "Série", "Entrada"]))
                 else:
-                    st.warning("Nenhuma entrada aberta encontrada para hoje (não há presenças sem saída).")
-
-    st.write("---")
-    st.subheader("Histórico geral de presenças")
-    filtro_aluno_hist = st.number_input("Filtrar por ID do aluno (0 para todos)", min_value=0, value=0)
-    dt_inicio = st.date_input("Data início", value=date.today())
-    dt_fim = st.date_input("Data fim", value=date.today())
-    if st.button("Carregar histórico"):
-        pres = listar_presencas(aluno_id=(filtro_aluno_hist if filtro_aluno_hist != 0 else None), data_inicio=dt_inicio, data_fim=dt_fim)
-        if pres:
-            dfp = pd.DataFrame([{
-                "ID": p.id,
-                "Aluno ID": p.aluno_id,
-                "Data": p.data,
-                "Entrada": p.hora_entrada,
-                "Saída": p.hora_saida,
-                "Observação": p.observacao
-            } for p in pres])
-            st.dataframe(dfp)
+                    st.info("Nenhum aluno com entrada aberta hoje.")
         else:
-            st.info("Nenhum registro encontrado.")
-
-# ---- Relatórios (export Excel) ----
-elif menu == "Relatórios":
-    st.title("📥 Exportar Relatórios (Excel)")
-    st.write("Escolha filtros e clique em *Gerar Excel* para baixar os dados.")
-
-    nome_f = st.text_input("Nome contém (filtro)")
-    pais_f = st.text_input("País (filtro exato)")
-    serie_f = st.text_input("Série (filtro exato)")
-    col1, col2 = st.columns(2)
-    data_inicio = col1.date_input("Data entrada - início", value=None)
-    data_fim = col2.date_input("Data entrada - fim", value=None)
-
-    filtros = {}
-    if nome_f:
-        filtros["nome"] = nome_f
-    if pais_f:
-        filtros["pais"] = pais_f
-    if serie_f:
-        filtros["serie"] = serie_f
-    if data_inicio:
-        filtros["data_inicio"] = data_inicio
-    if data_fim:
-        filtros["data_fim"] = data_fim
-
-    if st.button("Gerar Excel"):
-        alunos = listar_alunos(filtros=filtros if filtros else None)
-        if not alunos:
-            st.warning("Nenhum aluno com esses filtros.")
+            st.info("Nenhum aluno cadastrado ainda.")
+
+    # ---- Cadastro ----
+    elif menu == "Cadastrar":
+        st.title("➕ Cadastrar Aluno")
+        with st.form("form_cadastrar"):
+            nome = st.text_input("Nome completo", max_chars=200)
+            idade = st.number_input("Idade", min_value=1, max_value=120, value=15)
+            pais = st.text_input("País de origem")
+            passaporte = st.text_input("Passaporte / Documento")
+            serie = st.text_input("Série / Ano")
+            data_entrada = st.date_input("Data de entrada", value=date.today())
+            responsavel = st.text_input("Responsável")
+            observacoes = st.text_area("Observações")
+            btn = st.form_submit_button("Salvar")
+            if btn:
+                aluno = inserir_aluno(
+                    nome=nome,
+                    idade=int(idade),
+                    pais=pais,
+                    passaporte=passaporte,
+                    serie=serie,
+                    data_entrada=data_entrada,
+                    responsavel=responsavel,
+                    observacoes=observacoes,
+                )
+                st.success(f"Aluno '{aluno.nome}' cadastrado (ID {aluno.id}).")
+                if aluno.possiveis_duplicados:
+                    st.warning("Parece já estar cadastrado: " + "; ".join(
+                        f"ID {p.aluno_b.id} - {p.aluno_b.nome}" + (f" ({p.aluno_b.passaporte})" if p.aluno_b.passaporte else "")
+                        + f" [{p.motivo}]" for p in aluno.possiveis_duplicados[:5]
+                    ) + ". Confira em Listar / Buscar > Possíveis duplicados.")
+
+    # ---- Importação em lote (CSV / XLSX) ----
+    elif menu == "Importar":
+        st.title("📤 Importar Alunos (CSV / Excel)")
+        import pandas as pd
+        st.write("Colunas reconhecidas: Nome, Idade, País, Passaporte, Série, Data Entrada, Responsável, Observações. "
+                 "Alunos com passaporte já cadastrado são ignorados.")
+        arquivo = st.file_uploader("Planilha de alunos", type=["csv", "xlsx"])
+        if arquivo is not None and st.button("Importar"):
+            with st.spinner("Importando..."):
+                resumo = importar_alunos(arquivo, nome_arquivo=arquivo.name)
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Inseridos", resumo["inseridos"])
+            col2.metric("Duplicados", resumo["duplicados"])
+            col3.metric("Com erro", len(resumo["erros"]))
+            col4.metric("Linhas/s", f"{resumo['linhas_por_segundo']:.0f}")
+            st.caption(f"{resumo['lidas']} linha(s) lidas em {resumo['segundos']:.2f}s")
+            if resumo["erros"]:
+                st.subheader("Linhas com erro")
+                st.dataframe(pd.DataFrame(resumo["erros"], columns=["Linha", "Erro"]))
+
+    # ---- Listar / Buscar / Editar / Deletar ----
+    elif menu == "Listar / Buscar":
+        st.title("🔎 Buscar e Gerenciar Alunos")
+        import pandas as pd
+
+        with st.expander("Filtros"):
+            busca_f = st.text_input("Nome ou documento (busca por prefixo, sem acentos)")
+            pais_f = st.text_input("País (exato)")
+            serie_f = st.text_input("Série (exato)")
+            col1, col2 = st.columns(2)
+            data_inicio = col1.date_input("Data entrada - início", value=None)
+            data_fim = col2.date_input("Data entrada - fim", value=None)
+            if data_inicio == date(1970,1,1):
+                data_inicio = None
+            if data_fim == date(1970,1,1):
+                data_fim = None
+            if st.button("Aplicar filtros"):
+                pass
+
+        filtros = {}
+        if busca_f:
+            filtros["busca"] = busca_f
+        if pais_f:
+            filtros["pais"] = pais_f
+        if serie_f:
+            filtros["serie"] = serie_f
+        if data_inicio:
+            filtros["data_inicio"] = data_inicio
+        if data_fim:
+            filtros["data_fim"] = data_fim
+
+        tamanho_pagina = st.selectbox("Alunos por página", [25, 50, 100, 200], index=1)
+        if busca_f:
+            # com termo de busca a lista vem por relevância (rank do FTS5): só os mais relevantes, sem páginas
+            alunos, proximo = buscar_alunos(busca_f, limite=tamanho_pagina, filtros=filtros), None
         else:
+            pag = paginador("pag_alunos", (escola_da_sessao(), tuple(sorted(filtros.items())), tamanho_pagina))
+            alunos, proximo = listar_alunos_pagina(filtros=filtros if filtros else None, tamanho=tamanho_pagina,
+                                                   cursor=pag["cursores"][-1])
+
+        if alunos:
             df = pd.DataFrame([{
                 "ID": a.id,
                 "Nome": a.nome,
@@ -321,36 +317,441 @@ elif menu == "Relatórios":
                 "Passaporte": a.passaporte,
                 "Série": a.serie,
                 "Data Entrada": a.data_entrada,
-                "Responsável": a.responsavel,
-                "Observações": a.observacoes
+                "Responsável": a.responsavel
             } for a in alunos])
+            df.insert(0, "Selecionar", False)
+            # a marcação reinicia sozinha quando a página muda (outros dados = outro editor)
+            editado = st.data_editor(df, hide_index=True, disabled=[c for c in df.columns if c != "Selecionar"])
+            selecionados = [int(i) for i in editado.loc[editado["Selecionar"], "ID"]]
+            if busca_f:
+                total_busca = contar_alunos(filtros)
+                if total_busca > len(alunos):
+                    st.caption(f"Os {len(alunos)} mais relevantes de {total_busca} encontrados; refine a busca para ver outros.")
+            else:
+                controles_paginacao("pag_alunos", pag, proximo, contar_alunos(filtros if filtros else None), tamanho_pagina)
 
-            towrite = BytesIO()
-            df.to_excel(towrite, index=False, engine="openpyxl")
-            towrite.seek(0)
-            today_str = datetime.now().strftime("%Y%m%d_%H%M%S")
-            st.download_button(label="Download Excel", data=towrite, file_name=f"alunos_export_{today_str}.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-# ---- Usuários (admin) ----
-elif menu == "Usuários (admin)":
-    st.title("👥 Gerenciar Usuários")
-    if st.session_state.user is None or st.session_state.user.get("role") != "admin":
-        st.error("Acesso restrito: somente administradores podem gerenciar usuários.")
-    else:
-        st.subheader("Criar novo usuário")
-        with st.form("form_user"):
-            uname = st.text_input("Nome de usuário")
-            pwd = st.text_input("Senha", type="password")
-            role = st.selectbox("Papel", ["user", "admin"])
-            btn = st.form_submit_button("Criar usuário")
-            if btn:
-                u = criar_usuario(uname, pwd, role=role)
-                if u:
-                    st.success(f"Usuário '{u.username}' criado.")
-                else:
-                    st.error("Já existe usuário com esse nome.")
+            # ações sobre os marcados: uma instrução UPDATE/DELETE para todos, não uma por aluno
+            if selecionados:
+                st.subheader(f"Ações em lote ({len(selecionados)} selecionado(s))")
+                col1, col2 = st.columns(2)
+                with col1:
+                    nova_serie = st.text_input("Nova série para os selecionados")
+                    if st.button("Alterar série") and nova_serie:
+                        alterados = atualizar_alunos(selecionados, {"serie": nova_serie})
+                        st.success(f"{alterados} aluno(s) movido(s) para '{nova_serie}'.")
+                with col2:
+                    confirmar = st.checkbox("Confirmo a exclusão dos selecionados e de todas as suas presenças")
+                    if st.button("Excluir selecionados", disabled=not confirmar):
+                        removidos = deletar_alunos(selecionados)
+                        st.success(f"{removidos} aluno(s) excluído(s).")
+
+            st.write("---")
+            st.subheader("Ações rápidas")
+            id_selecionado = st.number_input("ID do aluno para ações", min_value=0, step=1)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                if st.button("Ver detalhes / Editar"):
+                    if id_selecionado <= 0:
+                        st.warning("Informe um ID válido.")
+                    else:
+                        a = obter_aluno_por_id(int(id_selecionado))
+                        if not a:
+                            st.error("Aluno não encontrado.")
+                        else:
+                            with st.form("editar_form"):
+                                nome_e = st.text_input("Nome", value=a.nome)
+                                idade_e = st.number_input("Idade", min_value=1, max_value=120, value=a.idade or 1)
+                                pais_e = st.text_input("País", value=a.pais or "")
+                                pass_e = st.text_input("Passaporte", value=a.passaporte or "")
+                                serie_e = st.text_input("Série", value=a.serie or "")
+                                data_e = st.date_input("Data entrada", value=a.data_entrada or date.today())
+                                resp_e = st.text_input("Responsável", value=a.responsavel or "")
+                                obs_e = st.text_area("Observações", value=a.observacoes or "")
+                                btn_ed = st.form_submit_button("Salvar alterações")
+                                if btn_ed:
+                                    atualizado = atualizar_aluno(a.id, {
+                                        "nome": nome_e,
+                                        "idade": int(idade_e),
+                                        "pais": pais_e,
+                                        "passaporte": pass_e,
+                                        "serie": serie_e,
+                                        "data_entrada": data_e,
+                                        "responsavel": resp_e,
+                                        "observacoes": obs_e
+                                    })
+                                    if atualizado:
+                                        st.success("Aluno atualizado.")
+                                    else:
+                                        st.error("Erro ao atualizar.")
+            with col2:
+                if st.button("Deletar aluno"):
+                    if id_selecionado <= 0:
+                        st.warning("Informe um ID válido.")
+                    else:
+                        ok = deletar_aluno(int(id_selecionado))
+                        if ok:
+                            st.success("Aluno deletado.")
+                        else:
+                            st.error("Aluno não encontrado ou erro.")
+            with col3:
+                if st.button("Ver histórico de presenças"):
+                    if id_selecionado <= 0:
+                        st.warning("Informe um ID válido.")
+                    else:
+                        pres = listar_presencas(aluno_id=int(id_selecionado))
+                        if pres:
+                            dfp = pd.DataFrame([{
+                                "ID": p.id,
+                                "Data": p.data,
+                                "Entrada": p.hora_entrada,
+                                "Saída": p.hora_saida,
+                                "Observação": p.observacao
+                            } for p in pres])
+                            st.dataframe(dfp)
+                        else:
+                            st.info("Nenhuma presença registrada para esse aluno.")
+        else:
+            st.info("Nenhum aluno encontrado com os filtros informados.")
+
+        if eh_admin():
+            with st.expander("Promoção de fim de ano / mover turma"):
+                st.caption("Cada série vai para a série ao lado, todas de uma vez (em branco: não muda). "
+                           "As sugestões seguem a nomenclatura usual; confira antes de aplicar.")
+                mapa = {}
+                for serie_atual, qtd in contar_alunos_por_serie():
+                    mapa[serie_atual] = st.text_input(f"{serie_atual or '(sem série)'} — {qtd} aluno(s)",
+                                                      value=proxima_serie(serie_atual) or "", key=f"promover_{serie_atual}")
+                if st.button("Aplicar promoção"):
+                    st.success(f"{promover_series(mapa)} aluno(s) mudaram de série.")
+
+            with st.expander("Possíveis duplicados"):
+                st.caption("Mesmo passaporte (ignorando espaços e pontuação) ou nomes com grafia parecida. "
+                           "Mesclar passa as presenças (inclusive as arquivadas) para o cadastro mantido e exclui o outro.")
+                chave_duplicados = f"duplicados_{escola_da_sessao()}"
+                if st.button("Procurar duplicados"):
+                    with st.spinner("Comparando cadastros..."):
+                        st.session_state[chave_duplicados] = encontrar_duplicados()
+                pares = st.session_state.get(chave_duplicados)
+                if pares is not None and not pares:
+                    st.info("Nenhum possível duplicado encontrado.")
+                elif pares:
+                    st.dataframe(pd.DataFrame([{
+                        "ID A": p.aluno_a.id, "Nome A": p.aluno_a.nome, "Passaporte A": p.aluno_a.passaporte,
+                        "ID B": p.aluno_b.id, "Nome B": p.aluno_b.nome, "Passaporte B": p.aluno_b.passaporte,
+                        "Semelhança": p.pontuacao, "Motivo": p.motivo,
+                    } for p in pares]), hide_index=True)
+                    indice = st.selectbox("Par", range(len(pares)),
+                                          format_func=lambda i: f"{pares[i].aluno_a.id} x {pares[i].aluno_b.id} ({pares[i].aluno_a.nome})")
+                    par = pares[indice]
+                    manter = st.radio("Manter o cadastro", [par.aluno_a.id, par.aluno_b.id], horizontal=True,
+                                      format_func=lambda i: f"ID {i}")
+                    remover = par.aluno_b.id if manter == par.aluno_a.id else par.aluno_a.id
+                    if st.button(f"Mesclar ID {remover} em ID {manter}"):
+                        try:
+                            movidas = mesclar_alunos(manter, remover)
+                        except ValueError as erro:
+                            st.error(str(erro))
+                        else:
+                            st.session_state[chave_duplicados] = [p for p in pares if remover not in (p.aluno_a.id, p.aluno_b.id)]
+                            st.success(f"Mesclado: {movidas['presencas']} presença(s) e {movidas['arquivadas']} "
+                                       f"arquivada(s) passaram para o ID {manter}.")
+
+    # ---- Presença ----
+    elif menu == "Presença":
+        st.title("🕘 Registro de Presença")
+        import pandas as pd
+
+        col1, col2 = st.columns([2,1])
+        with col1:
+            termo = st.text_input("Buscar aluno (nome, passaporte ou ID)")
+            encontrados = diretorio_alunos.buscar(termo) if termo else []
+            options = {a.id: f"{a.id} - {a.nome}" + (f" ({a.passaporte})" if a.passaporte else "") for a in encontrados}
+            id_sel = st.selectbox("Escolha o aluno", options=[0] + list(options.keys()), format_func=lambda x: "Selecione um aluno" if x==0 else options[x])
+            if termo and not encontrados:
+                st.info("Nenhum aluno encontrado.")
+            if id_sel and id_sel != 0:
+                st.write("Aluno:", options[id_sel])
+        with col2:
+            now = datetime.now()
+            st.write("Agora:", now.strftime("%Y-%m-%d %H:%M:%S"))
+
+        if id_sel and id_sel != 0:
+            col_e, col_s = st.columns(2)
+            with col_e:
+                if st.button("Registrar ENTRADA"):
+                    p = registrar_presenca_entrada(aluno_id=int(id_sel))
+                    st.success(f"Entrada registrada (ID pres.: {p.id}) às {p.hora_entrada}")
+            with col_s:
+                if st.button("Registrar SAÍDA"):
+                    p2 = registrar_presenca_saida_por_aluno(int(id_sel))
+                    if p2:
+                        st.success(f"Saída registrada: {p2.hora_saida}")
+                    else:
+                        st.warning("Nenhuma entrada aberta hoje para este aluno.")
 
         st.write("---")
-        st.subheader("Aviso de segurança")
-        st.info("Mude a senha do usuário `admin` retirando o padrão `admin123` após o primeiro login.")
+        st.subheader("Histórico geral de presenças")
+        filtro_aluno_hist = st.number_input("Filtrar por ID do aluno (0 para todos)", min_value=0, value=0)
+        dt_inicio = st.date_input("Data início", value=date.today())
+        dt_fim = st.date_input("Data fim", value=date.today())
+        if st.button("Carregar histórico"):
+            st.session_state.hist_params = {
+                "aluno_id": filtro_aluno_hist if filtro_aluno_hist != 0 else None,
+                "data_inicio": dt_inicio,
+                "data_fim": dt_fim,
+            }
+        hist_params = st.session_state.get("hist_params")
+        if hist_params:
+            tamanho_hist = 100
+            pag = paginador("pag_hist", (escola_da_sessao(), tuple(hist_params.items())))
+            pres, proximo = listar_presencas_pagina(**hist_params, tamanho=tamanho_hist, cursor=pag["cursores"][-1])
+            if pres:
+                dfp = pd.DataFrame([{
+                    "ID": p.id,
+                    "Aluno ID": p.aluno_id,
+                    "Data": p.data,
+                    "Entrada": p.hora_entrada,
+                    "Saída": p.hora_saida,
+                    "Observação": p.observacao
+                } for p in pres])
+                st.dataframe(dfp)
+                controles_paginacao("pag_hist", pag, proximo, contar_presencas(**hist_params), tamanho_hist)
+            else:
+                st.info("Nenhum registro encontrado.")
+
+    # ---- Quiosque (entrada rápida por crachá / digitação) ----
+    elif menu == "Quiosque":
+        st.title("🚪 Quiosque de Entrada")
+        st.write("Passe o crachá ou digite o ID / passaporte e tecle Enter. A entrada é registrada na hora.")
+        fila = obter_fila_presencas()
+
+        def registrar_leitura():
+            codigo = st.session_state.quiosque_codigo
+            st.session_state.quiosque_codigo = ""
+            # o callback roda antes do script: usa a escola da fila, não a do contexto
+            with usar_escola(fila.escola):
+                aluno = resolver_aluno(codigo)
+            if aluno is None:
+                st.session_state.quiosque_msg = ("erro", f"Aluno não encontrado: {codigo}")
+            else:
+                quando = fila.registrar_entrada(aluno.id)
+                st.session_state.quiosque_msg = ("ok", f"{aluno.nome} — entrada às {quando.strftime('%H:%M:%S')}")
+
+        st.text_input("ID ou passaporte", key="quiosque_codigo", on_change=registrar_leitura)
+        msg = st.session_state.get("quiosque_msg")
+        if msg:
+            (st.success if msg[0] == "ok" else st.error)(msg[1])
+        st.caption(f"Gravadas: {fila.gravadas} — aguardando gravação: {fila.pendentes}")
+
+    # ---- Análises de frequência (lê só o resumo diário) ----
+    elif menu == "Análises":
+        st.title("📈 Análises de Frequência")
+        import pandas as pd
+        col1, col2 = st.columns(2)
+        a_inicio = col1.date_input("Período - início", value=date.today() - timedelta(weeks=12))
+        a_fim = col2.date_input("Período - fim", value=date.today())
+
+        st.subheader("Taxa de presença por série e semana")
+        taxas = taxa_presenca_por_serie_semana(a_inicio, a_fim)
+        if taxas:
+            df_taxa = pd.DataFrame(taxas)
+            tabela = df_taxa.pivot(index="semana", columns="serie", values="taxa").fillna(0)
+            st.dataframe((tabela * 100).round(1))
+            st.line_chart(tabela)
+        else:
+            st.info("Sem presenças no período.")
+
+        st.subheader("Tempo médio na escola por país")
+        tempos = tempo_medio_por_pais(a_inicio, a_fim)
+        if tempos:
+            df_tempo = pd.DataFrame(tempos).rename(columns={
+                "pais": "País", "minutos_medios": "Minutos/dia (média)", "alunos": "Alunos", "dias": "Dias",
+            })
+            df_tempo["Minutos/dia (média)"] = df_tempo["Minutos/dia (média)"].round(0)
+            st.dataframe(df_tempo)
+        else:
+            st.info("Sem saídas registradas no período.")
+
+        if st.session_state.user is not None and st.session_state.user.get("role") == "admin":
+            st.write("---")
+            if st.button("Reconstruir resumo diário do período"):
+                linhas = reconstruir_presenca_diaria(a_inicio, a_fim)
+                st.success(f"Resumo recalculado ({linhas} aluno(s)/dia).")
+
+    # ---- Relatórios (export Excel / CSV) ----
+    elif menu == "Relatórios":
+        st.title("📥 Exportar Relatórios (Excel)")
+        st.write("Escolha filtros e clique em *Gerar arquivo* para baixar os dados.")
 
+        tipo = st.radio("Relatório", ["Alunos", "Presenças", "Mudanças (incremental)"], horizontal=True)
+        formato = st.radio("Formato", ["xlsx", "csv"], horizontal=True)
+        export_rede = rede and tipo != "Mudanças (incremental)" and st.checkbox("Toda a rede (com a coluna Escola)")
+
+        if tipo == "Alunos":
+            nome_f = st.text_input("Nome contém (filtro)")
+            pais_f = st.text_input("País (filtro exato)")
+            serie_f = st.text_input("Série (filtro exato)")
+            col1, col2 = st.columns(2)
+            data_inicio = col1.date_input("Data entrada - início", value=None)
+            data_fim = col2.date_input("Data entrada - fim", value=None)
+
+            filtros = {}
+            if nome_f:
+                filtros["nome"] = nome_f
+            if pais_f:
+                filtros["pais"] = pais_f
+            if serie_f:
+                filtros["serie"] = serie_f
+            if data_inicio:
+                filtros["data_inicio"] = data_inicio
+            if data_fim:
+                filtros["data_fim"] = data_fim
+        elif tipo == "Mudanças (incremental)":
+            st.caption("Só o que mudou (inclusões, alterações e exclusões) depois do seq informado. "
+                       f"Último seq atual: {ultimo_seq_mudancas()}. Guarde o seq final de cada exportação "
+                       "para pedir a próxima a partir dele.")
+            desde_seq = st.number_input("Desde o seq (0 para todo o log)", min_value=0, value=0, step=1)
+        else:
+            # IDs de aluno são por escola: na rede só o período filtra
+            aluno_f = 0 if export_rede else st.number_input("ID do aluno (0 para todos)", min_value=0, value=0)
+            col1, col2 = st.columns(2)
+            data_inicio = col1.date_input("Data - início", value=None)
+            data_fim = col2.date_input("Data - fim", value=None)
+
+        if st.button("Gerar arquivo"):
+            with st.spinner("Gerando arquivo..."):
+                if tipo == "Alunos" and export_rede:
+                    arquivo, linhas = exportar_alunos_rede(filtros=filtros if filtros else None, formato=formato)
+                    prefixo = "alunos_rede"
+                elif tipo == "Alunos":
+                    arquivo, linhas = exportar_alunos(filtros=filtros if filtros else None, formato=formato)
+                    prefixo = "alunos"
+                elif tipo == "Mudanças (incremental)":
+                    arquivo, linhas, ate_seq = exportar_mudancas(int(desde_seq), formato=formato)
+                    prefixo = f"mudancas_{int(desde_seq)}_a_{ate_seq}"
+                elif export_rede:
+                    arquivo, linhas = exportar_presencas_rede(data_inicio=data_inicio, data_fim=data_fim, formato=formato)
+                    prefixo = "presencas_rede"
+                else:
+                    arquivo, linhas = exportar_presencas(aluno_id=aluno_f or None, data_inicio=data_inicio,
+                                                         data_fim=data_fim, formato=formato)
+                    prefixo = "presencas"
+            if not linhas:
+                st.warning("Nenhum registro com esses filtros.")
+            else:
+                # o download_button precisa dos bytes; o arquivo já está compactado (xlsx) e
+                # foi montado fora da memória, sem DataFrame intermediário
+                with arquivo:
+                    conteudo = arquivo.read()
+                today_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+                mime = ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" if formato == "xlsx"
+                        else "text/csv")
+                st.caption(f"{linhas} linha(s) exportada(s).")
+                st.download_button(label=f"Download {formato.upper()}", data=conteudo,
+                                   file_name=f"{prefixo}_export_{today_str}.{formato}", mime=mime)
+
+    # ---- Usuários (admin) ----
+    elif menu == "Usuários (admin)":
+        st.title("👥 Gerenciar Usuários")
+        if st.session_state.user is None or st.session_state.user.get("role") != "admin":
+            st.error("Acesso restrito: somente administradores podem gerenciar usuários.")
+        else:
+            st.subheader("Criar novo usuário")
+            with st.form("form_user"):
+                uname = st.text_input("Nome de usuário")
+                pwd = st.text_input("Senha", type="password")
+                role = st.selectbox("Papel", ["user", "admin"])
+                escola_u = st.selectbox("Escola (usuários comuns só acessam a sua)", ESCOLAS,
+                                        index=ESCOLAS.index(escola_da_sessao()))
+                btn = st.form_submit_button("Criar usuário")
+                if btn:
+                    u = criar_usuario(uname, pwd, role=role, escola=escola_u if role == "user" else None)
+                    if u:
+                        st.success(f"Usuário '{u.username}' criado.")
+                    else:
+                        st.error("Já existe usuário com esse nome.")
+
+            st.write("---")
+            st.subheader("Aviso de segurança")
+            st.info("Mude a senha do usuário `admin` retirando o padrão `admin123` após o primeiro login.")
+
+    # ---- Desempenho (admin) ----
+    elif menu == "Desempenho (admin)":
+        st.title("⏱️ Desempenho")
+        import pandas as pd
+        if st.session_state.user is None or st.session_state.user.get("role") != "admin":
+            st.error("Acesso restrito: somente administradores.")
+        else:
+            st.caption(f"Últimas {metricas.TAMANHO_BUFFER} medições deste processo (tempos em ms).")
+
+            def tabela_resumo(tipo):
+                linhas = metricas.resumo(tipo)
+                if not linhas:
+                    st.info("Sem medições ainda.")
+                    return
+                df_r = pd.DataFrame(linhas).drop(columns=["tipo"])
+                for col in ("total", "p50", "p95", "p99", "max"):
+                    df_r[col] = (df_r[col] * 1000).round(2)
+                if tipo != "pagina":
+                    df_r = df_r.drop(columns=["consultas_media"])
+                st.dataframe(df_r)
+
+            st.subheader("Por página (execução do script)")
+            tabela_resumo("pagina")
+            st.subheader("Por função de database.py")
+            tabela_resumo("funcao")
+            st.subheader("Por comando SQL")
+            tabela_resumo("sql")
+
+            st.subheader("SQL mais lentos")
+            lentos = metricas.sql_mais_lentos(20)
+            if lentos:
+                st.dataframe(pd.DataFrame([{
+                    "ms": round(m.segundos * 1000, 2),
+                    "Linhas alteradas": m.linhas,
+                    "SQL": m.sql,
+                    "Parâmetros": m.parametros,
+                    "Quando": datetime.fromtimestamp(m.momento),
+                } for m in lentos]))
+
+            st.write("---")
+            col1, col2, col3 = st.columns(3)
+            caminho_json = col1.text_input("Arquivo JSON", value="metricas.json")
+            if col1.button("Salvar JSON"):
+                st.success(f"Métricas salvas em {metricas.exportar_json(caminho_json)}")
+            caminho_prom = col2.text_input("Arquivo Prometheus", value="metricas.prom")
+            if col2.button("Salvar Prometheus"):
+                st.success(f"Métricas salvas em {metricas.exportar_prometheus(caminho_prom)}")
+            if col3.button("Limpar medições"):
+                metricas.limpar()
+                st.success("Medições apagadas.")
+
+            st.write("---")
+            st.subheader("Manutenção do banco")
+            st.caption("Anos letivos encerrados saem do banco principal para um arquivo por ano; "
+                       "as consultas de presença os incluem quando o período pedido alcança esses anos.")
+            arquivados = listar_arquivos_presencas()
+            if arquivados:
+                st.dataframe(pd.DataFrame(arquivados).rename(columns={
+                    "ano": "Ano", "arquivo": "Arquivo", "linhas": "Presenças", "arquivado_em": "Arquivado em", "bytes": "Bytes",
+                }))
+            col_a, col_v, col_f = st.columns(3)
+            if col_a.button("Arquivar anos encerrados"):
+                with st.spinner("Arquivando..."):
+                    movidos = arquivar_anos_encerrados()
+                if movidos:
+                    st.success("; ".join(f"{r['ano']}: {r['linhas']} presença(s)" for r in movidos))
+                else:
+                    st.info("Nada a arquivar.")
+            if col_v.button("VACUUM / ANALYZE"):
+                with st.spinner("Compactando e atualizando estatísticas..."):
+                    tamanhos = manter_banco()
+                if tamanhos["antes"] is not None:
+                    st.success(f"Banco: {tamanhos['antes'] / 1024 / 1024:.1f} MB -> {tamanhos['depois'] / 1024 / 1024:.1f} MB")
+                else:
+                    st.success("Estatísticas atualizadas.")
+            if col_f.button("Fechar entradas de dias anteriores"):
+                fechadas = fechar_presencas_abertas_anteriores()
+                st.success(f"{fechadas} presença(s) fechada(s), marcadas como \"{SAIDA_NAO_REGISTRADA}\".")
+finally:
+    execucao_pagina.finalizar()
@@ -0,0 +1,113 @@
+# bench/bench_api.py
+# Teste de carga do serviço ASGI (api.py): requisições/s e latência p50/p95/p99 por rota.
+#   ALUNOS_API_TOKEN=segredo uvicorn api:app --port 8000 &
+#   ALUNOS_API_TOKEN=segredo python bench/bench_api.py --url http://127.0.0.1:8000 --requisicoes 2000 --concorrencia 32
+# Com --iniciar o script sobe um uvicorn local sobre um banco temporário com alunos sintéticos.
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from dados import RAIZ, preparar_banco_temporario, popular_alunos
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+async def carga(url, token, nome, gerar_requisicao, total, concorrencia):
+    latencias, erros, recusadas = [], 0, 0
+    fila = iter(range(total))
+
+    async def trabalhador(cliente):
+        nonlocal erros, recusadas
+        for i in fila:
+            metodo, caminho, corpo = gerar_requisicao(i)
+            t0 = time.perf_counter()
+            resposta = await cliente.request(metodo, caminho, json=corpo)
+            latencias.append(time.perf_counter() - t0)
+            if resposta.status_code >= 500:
+                erros += 1
+            elif resposta.status_code >= 400:
+                recusadas += 1  # ex.: saída sem entrada aberta (404)
+
+    limites = httpx.Limits(max_connections=concorrencia)
+    cabecalhos = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=url, limits=limites, headers=cabecalhos, timeout=30) as cliente:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador(cliente) for _ in range(concorrencia)))
+        segundos = time.perf_counter() - inicio
+
+    ms = [x * 1000 for x in latencias]
+    print(f"{nome:<26}{len(ms) / segundos:>10.0f}{statistics.median(ms):>9.1f}"
+          f"{percentil(ms, 95):>9.1f}{percentil(ms, 99):>9.1f}{recusadas:>7}{erros:>7}")
+
+
+def aguardar_servidor(url, segundos=15):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        try:
+            httpx.get(f"{url}/presentes", timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"servidor não respondeu em {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--alunos", type=int, default=1000, help="quantidade de IDs usados (e gerados com --iniciar)")
+    parser.add_argument("--lote", type=int, default=50, help="entradas por requisição no check-in em lote")
+    parser.add_argument("--iniciar", action="store_true", help="sobe um uvicorn local num banco temporário")
+    parser.add_argument("--token", default=os.environ.get("ALUNOS_API_TOKEN"), help="padrão: ALUNOS_API_TOKEN")
+    args = parser.parse_args()
+    if args.iniciar and not args.token:
+        args.token = secrets.token_hex(16)
+    if not args.token:
+        parser.error("informe --token ou ALUNOS_API_TOKEN")
+
+    servidor = None
+    if args.iniciar:
+        database = preparar_banco_temporario()
+        popular_alunos(database, args.alunos)
+        porta = args.url.rsplit(":", 1)[-1].strip("/")
+        servidor = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--port", porta, "--log-level", "warning"],
+            cwd=RAIZ, env={**os.environ, "ALUNOS_API_TOKEN": args.token},
+        )
+    try:
+        aguardar_servidor(args.url)
+        rnd = random.Random(7)
+        aluno = lambda: rnd.randint(1, args.alunos)  # noqa: E731
+        cenarios = [
+            ("POST /presencas/entrada", lambda i: ("POST", "/presencas/entrada", {"aluno_id": aluno()})),
+            ("POST /presencas/saida", lambda i: ("POST", "/presencas/saida", {"aluno_id": aluno()})),
+            ("GET /alunos/{id}", lambda i: ("GET", f"/alunos/{aluno()}", None)),
+            ("GET /presentes", lambda i: ("GET", "/presentes", None)),
+            (f"POST entrada/lote x{args.lote}", lambda i: (
+                "POST", "/presencas/entrada/lote", {"entradas": [{"aluno_id": aluno()} for _ in range(args.lote)]}
+            )),
+        ]
+        print(f"{args.requisicoes} requisições por rota, concorrência {args.concorrencia}\n")
+        print(f"{'rota':<26}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'4xx':>7}{'5xx':>7}")
+        for nome, gerar in cenarios:
+            asyncio.run(carga(args.url, args.token, nome, gerar, args.requisicoes, args.concorrencia))
+    finally:
+        if servidor is not None:
+            servidor.terminate()
+            servidor.wait()
+
+
+if __name__ == "__main__":
+    main()
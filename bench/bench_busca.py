@@ -0,0 +1,42 @@
+# bench/bench_busca.py
+# Compara a busca FTS5 (buscar_alunos / filtro "busca") com o caminho antigo ILIKE '%...%'.
+#   python bench/bench_busca.py --alunos 100000
+import argparse
+import statistics
+import time
+
+from dados import preparar_banco_temporario, popular_alunos
+
+TERMOS = ["jose", "gonz", "maria silva", "AL000012", "müll", "ozturk", "nguyen tran", "zzz"]
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = funcao()
+        tempos.append(time.perf_counter() - t0)
+    return statistics.median(tempos) * 1000, len(resultado)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alunos", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    database = preparar_banco_temporario()
+    t0 = time.perf_counter()
+    popular_alunos(database, args.alunos)
+    print(f"{args.alunos} alunos gerados em {time.perf_counter() - t0:.1f}s\n")
+
+    print(f"{'termo':<14}{'ILIKE ms':>10}{'linhas':>8}{'FTS ms':>10}{'linhas':>8}{'FTS top50 ms':>14}")
+    for termo in TERMOS:
+        ilike_ms, ilike_n = cronometrar(lambda: database.listar_alunos({"nome": termo}), args.repeticoes)
+        fts_ms, fts_n = cronometrar(lambda: database.listar_alunos({"busca": termo}), args.repeticoes)
+        top_ms, _ = cronometrar(lambda: database.buscar_alunos(termo), args.repeticoes)
+        print(f"{termo:<14}{ilike_ms:>10.1f}{ilike_n:>8}{fts_ms:>10.1f}{fts_n:>8}{top_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
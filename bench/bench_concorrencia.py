@@ -0,0 +1,79 @@
+# bench/bench_concorrencia.py
+# N threads leitoras (listar_alunos) e M escritoras (registrar_presenca_entrada) ao mesmo
+# tempo, com a configuração antiga (journal DELETE, sem busy_timeout) e com a atual
+# (WAL + PRAGMAS_SQLITE). Mostra operações/s e quantos "database is locked" ocorreram.
+#   python bench/bench_concorrencia.py --leitores 8 --escritores 4 --segundos 5
+import argparse
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from dados import preparar_banco_temporario, popular_alunos, PAISES
+
+CONFIGURACOES = {
+    "antes (DELETE, padrão)": {"journal_mode": "DELETE"},
+    "depois (WAL + PRAGMAs)": None,  # None = PRAGMAS_SQLITE / ambiente
+}
+
+
+def rodar(database, leitores, escritores, segundos, alunos):
+    fim = time.perf_counter() + segundos
+    contagem = {"leituras": 0, "escritas": 0, "bloqueios": 0}
+    trava = threading.Lock()
+
+    def somar(chave):
+        with trava:
+            contagem[chave] += 1
+
+    def leitor(n):
+        i = n
+        while time.perf_counter() < fim:
+            try:
+                database.listar_alunos({"pais": PAISES[i % len(PAISES)], "serie": "5º ano"})
+                somar("leituras")
+            except OperationalError:
+                somar("bloqueios")
+            i += 1
+
+    def escritor(n):
+        i = n
+        while time.perf_counter() < fim:
+            try:
+                database.registrar_presenca_entrada(1 + i % alunos)
+                somar("escritas")
+            except OperationalError:
+                somar("bloqueios")
+            i += 1
+
+    threads = [threading.Thread(target=leitor, args=(n,)) for n in range(leitores)]
+    threads += [threading.Thread(target=escritor, args=(n,)) for n in range(escritores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--escritores", type=int, default=4)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--alunos", type=int, default=20_000)
+    args = parser.parse_args()
+
+    database = preparar_banco_temporario()
+    popular_alunos(database, args.alunos)
+    url = str(database.engine.url)
+
+    print(f"{args.leitores} leitores / {args.escritores} escritores, {args.segundos:.0f}s cada\n")
+    print(f"{'configuração':<26}{'leituras/s':>12}{'escritas/s':>12}{'bloqueios':>11}")
+    for nome, pragmas in CONFIGURACOES.items():
+        database.configurar_banco(url, pragmas=pragmas, pool_size=args.leitores + args.escritores)
+        c = rodar(database, args.leitores, args.escritores, args.segundos, args.alunos)
+        print(f"{nome:<26}{c['leituras'] / args.segundos:>12.0f}{c['escritas'] / args.segundos:>12.0f}{c['bloqueios']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench/bench_inicio.py
+# Custo de subir o app e de cada rerun do Streamlit: importação a frio (processo novo)
+# dos módulos do topo do app.py e preparação do banco — criar_banco() num banco novo,
+# num banco já migrado (atalho pela versão do schema) e o caminho completo que todo
+# rerun fazia antes (create_all + migrações + consulta do admin).
+#   python bench/bench_inicio.py --repeticoes 10
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+from dados import RAIZ, preparar_banco_temporario
+
+
+def importar_a_frio(modulos, repeticoes):
+    """Mediana (ms) de importar `modulos` num interpretador novo (sem cache de módulos)."""
+    codigo = (
+        "import sys, time\n"
+        f"sys.path.insert(0, {RAIZ!r})\n"
+        "t0 = time.perf_counter()\n"
+        f"import {', '.join(modulos)}\n"
+        "print((time.perf_counter() - t0) * 1000)\n"
+    )
+    tempos = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, cwd=RAIZ)
+        if saida.returncode != 0:
+            return None
+        tempos.append(float(saida.stdout.strip().splitlines()[-1]))
+    return statistics.median(tempos)
+
+
+def cronometrar(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    print("importação a frio (processo novo)")
+    for modulos in (["database"], ["pandas"], ["openpyxl"], ["streamlit"]):
+        ms = importar_a_frio(modulos, max(1, args.repeticoes // 2))
+        print(f"  {', '.join(modulos):<30}{'não instalado' if ms is None else f'{ms:>10.1f} ms'}")
+
+    t0 = time.perf_counter()
+    database = preparar_banco_temporario()  # banco novo: create_all + todas as migrações + admin
+    primeira = (time.perf_counter() - t0) * 1000
+
+    def caminho_completo():
+        # o que cada rerun do app.py fazia antes: reflete todas as tabelas, confere as
+        # migrações e procura o admin, mesmo com o banco pronto
+        database.Base.metadata.create_all(bind=database.engine)
+        database.migrar_banco()
+        session = database.SessionLocal()
+        try:
+            session.query(database.User).first()
+        finally:
+            session.close()
+
+    completo = cronometrar(caminho_completo, args.repeticoes)
+    atalho = cronometrar(database.criar_banco, args.repeticoes)
+    print("\npreparação do banco (por execução do script)")
+    print(f"  {'banco novo (1ª vez)':<30}{primeira:>10.1f} ms")
+    print(f"  {'caminho completo (antes)':<30}{completo:>10.1f} ms")
+    print(f"  {'criar_banco já migrado':<30}{atalho:>10.1f} ms")
+    print(f"  {'st.cache_resource (app.py)':<30}{'~0':>10} ms  (só a 1ª execução do processo chama criar_banco)")
+
+
+if __name__ == "__main__":
+    main()
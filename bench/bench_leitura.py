@@ -0,0 +1,78 @@
+# bench/bench_leitura.py
+# Tempo e pico de memória para ler N alunos/presenças: objetos ORM (caminho antigo),
+# DTOs (listar_alunos / listar_presencas) e DataFrame direto do select() via pandas.read_sql.
+#   python bench/bench_leitura.py --linhas 100000
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from dados import preparar_banco_temporario, popular_alunos
+
+
+def medir(funcao):
+    # tempo sem tracemalloc (que deixa tudo mais lento) e memória numa segunda execução
+    t0 = time.perf_counter()
+    resultado = funcao()
+    segundos = time.perf_counter() - t0
+    quantidade = len(resultado)
+    del resultado
+    tracemalloc.start()
+    resultado = funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del resultado
+    return segundos, pico, quantidade
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=100_000)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    database = preparar_banco_temporario()
+    popular_alunos(database, args.linhas)
+    inicio = datetime(2025, 2, 3, 7, 0)
+    with database.engine.begin() as conn:
+        conn.execute(insert(database.Presenca), [
+            {"aluno_id": 1 + i % args.linhas, "data": (inicio + timedelta(minutes=i)).date(),
+             "hora_entrada": inicio + timedelta(minutes=i)}
+            for i in range(args.linhas)
+        ])
+
+    def orm(modelo):
+        def ler():
+            session = database.SessionLocal()
+            try:
+                return session.query(modelo).all()
+            finally:
+                session.close()
+        return ler
+
+    def dataframe(modelo):
+        def ler():
+            with database.engine.connect() as conn:
+                return pd.read_sql(select(*modelo.__table__.columns), conn)
+        return ler
+
+    casos = [
+        ("alunos ORM", orm(database.Aluno)),
+        ("alunos DTO", database.listar_alunos),
+        ("alunos read_sql", dataframe(database.Aluno)),
+        ("presencas ORM", orm(database.Presenca)),
+        ("presencas DTO", database.listar_presencas),
+        ("presencas read_sql", dataframe(database.Presenca)),
+    ]
+    print(f"{'caminho':<22}{'linhas':>9}{'ms':>10}{'ms/100k':>10}{'pico MB':>10}")
+    for nome, funcao in casos:
+        segundos, pico, quantidade = medir(funcao)
+        por_100k = segundos * 1000 * 100_000 / max(quantidade, 1)
+        print(f"{nome:<22}{quantidade:>9}{segundos * 1000:>10.0f}{por_100k:>10.0f}{pico / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
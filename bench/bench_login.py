@@ -0,0 +1,84 @@
+# bench/bench_login.py
+# Login sob ataque: T threads errando a senha do admin (de vários "clientes") por alguns
+# segundos, sem e com o LimitadorLogin. Mostra tentativas/s, quantos hashes foram de fato
+# verificados e o tempo de CPU gasto. Compara também login com senha x token de sessão.
+#   python bench/bench_login.py --threads 8 --segundos 5
+import argparse
+import threading
+import time
+
+from dados import preparar_banco_temporario
+
+
+def ataque(database, limitador, threads, segundos, clientes):
+    contagem = {"tentativas": 0, "bloqueadas": 0, "hashes": 0}
+    trava = threading.Lock()
+    original = database.User.check_password
+
+    def contar_hash(self, password):
+        with trava:
+            contagem["hashes"] += 1
+        return original(self, password)
+
+    database.User.check_password = contar_hash
+    fim = time.perf_counter() + segundos
+
+    def atacante(n):
+        i = 0
+        while time.perf_counter() < fim:
+            try:
+                database.autenticar_usuario("admin", f"errada{i}", cliente=f"10.0.0.{(n + i) % clientes}",
+                                            limitador=limitador)
+            except database.LoginBloqueado:
+                with trava:
+                    contagem["bloqueadas"] += 1
+            with trava:
+                contagem["tentativas"] += 1
+            i += 1
+
+    cpu0 = time.process_time()
+    lista = [threading.Thread(target=atacante, args=(n,)) for n in range(threads)]
+    for t in lista:
+        t.start()
+    for t in lista:
+        t.join()
+    database.User.check_password = original
+    contagem["cpu"] = time.process_time() - cpu0
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--clientes", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=20)
+    args = parser.parse_args()
+
+    database = preparar_banco_temporario()
+
+    print(f"ataque: {args.threads} threads, {args.clientes} clientes, {args.segundos:.0f}s\n")
+    print(f"{'cenário':<20}{'tentativas/s':>14}{'bloqueadas':>12}{'hashes':>9}{'CPU s':>8}")
+    cenarios = [
+        ("sem limitação", database.LimitadorLogin(tentativas_livres=10 ** 9)),
+        ("com LimitadorLogin", database.LimitadorLogin()),
+    ]
+    for nome, limitador in cenarios:
+        c = ataque(database, limitador, args.threads, args.segundos, args.clientes)
+        print(f"{nome:<20}{c['tentativas'] / args.segundos:>14.0f}{c['bloqueadas']:>12}{c['hashes']:>9}{c['cpu']:>8.1f}")
+
+    limitador = database.LimitadorLogin()
+    t0 = time.perf_counter()
+    for _ in range(args.logins):
+        user = database.autenticar_usuario("admin", "admin123", limitador=limitador)
+    senha_ms = (time.perf_counter() - t0) * 1000 / args.logins
+    token = database.emitir_token_sessao(user)
+    t0 = time.perf_counter()
+    for _ in range(args.logins):
+        database.validar_token_sessao(token)
+    token_ms = (time.perf_counter() - t0) * 1000 / args.logins
+    print(f"\nlogin com senha: {senha_ms:.1f} ms   reconexão com token: {token_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
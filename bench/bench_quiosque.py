@@ -0,0 +1,59 @@
+# bench/bench_quiosque.py
+# Entradas por segundo e latência (p50/p99) do commit por linha (registrar_presenca_entrada)
+# comparado com a fila do modo quiosque (FilaPresencas).
+#   python bench/bench_quiosque.py --entradas 5000
+import argparse
+import statistics
+import time
+
+from dados import preparar_banco_temporario, popular_alunos
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def relatorio(nome, latencias, segundos):
+    ms = [x * 1000 for x in latencias]
+    print(f"{nome:<28}{len(latencias) / segundos:>12.0f}{statistics.median(ms):>10.3f}{percentil(ms, 99):>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entradas", type=int, default=5000)
+    parser.add_argument("--alunos", type=int, default=1000)
+    parser.add_argument("--intervalo", type=float, default=0.2)
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+
+    database = preparar_banco_temporario()
+    popular_alunos(database, args.alunos)
+    ids = [1 + i % args.alunos for i in range(args.entradas)]
+
+    print(f"{'caminho':<28}{'entradas/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+
+    latencias = []
+    inicio = time.perf_counter()
+    for aluno_id in ids:
+        t0 = time.perf_counter()
+        database.registrar_presenca_entrada(aluno_id)
+        latencias.append(time.perf_counter() - t0)
+    relatorio("commit por linha", latencias, time.perf_counter() - inicio)
+
+    fila = database.FilaPresencas(intervalo=args.intervalo, tamanho_lote=args.lote)
+    latencias = []
+    inicio = time.perf_counter()
+    for aluno_id in ids:
+        t0 = time.perf_counter()
+        fila.registrar_entrada(aluno_id)
+        latencias.append(time.perf_counter() - t0)
+    fila.esvaziar()  # throughput sustentado: conta até a última entrada gravada
+    relatorio("fila (gravação em lote)", latencias, time.perf_counter() - inicio)
+    fila.parar()
+
+    print(f"\npresenças gravadas: {database.contar_presencas()}")
+
+
+if __name__ == "__main__":
+    main()
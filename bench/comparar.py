@@ -0,0 +1,43 @@
+# bench/comparar.py
+# Compara dois resultados de bench/suite.py (mediana por caso e cenário).
+#   python bench/comparar.py antes.json depois.json [--limiar 10]
+import argparse
+import json
+
+
+def carregar(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("antes")
+    parser.add_argument("depois")
+    parser.add_argument("--limiar", type=float, default=10.0, help="variação (%%) destacada como melhora/piora")
+    args = parser.parse_args()
+
+    antes, depois = carregar(args.antes), carregar(args.depois)
+    print(f"antes:  {antes['meta'].get('commit')} ({antes['meta'].get('data')})")
+    print(f"depois: {depois['meta'].get('commit')} ({depois['meta'].get('data')})")
+
+    for cenario, dados in depois["cenarios"].items():
+        base = antes["cenarios"].get(cenario, {}).get("casos", {})
+        print(f"\n== {cenario}")
+        print(f"{'caso':<40}{'antes ms':>11}{'depois ms':>11}{'variação':>10}")
+        for caso, medicao in dados["casos"].items():
+            if caso not in base:
+                print(f"{caso:<40}{'-':>11}{medicao['mediana_ms']:>11.2f}{'novo':>10}")
+                continue
+            a, d = base[caso]["mediana_ms"], medicao["mediana_ms"]
+            variacao = (d - a) / a * 100 if a else 0.0
+            marca = ""
+            if variacao <= -args.limiar:
+                marca = "  melhor"
+            elif variacao >= args.limiar:
+                marca = "  PIOR"
+            print(f"{caso:<40}{a:>11.2f}{d:>11.2f}{variacao:>+9.1f}%{marca}")
+
+
+if __name__ == "__main__":
+    main()
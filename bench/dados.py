@@ -0,0 +1,148 @@
+# bench/dados.py
+# Gerador determinístico de dados sintéticos de escola para os benchmarks.
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRIMEIROS_NOMES = [
+    "José", "María", "João", "Ana", "Luis", "Sofía", "Mohammed", "Fatima", "Yuki", "Hiroshi",
+    "Olga", "Dmitri", "Chloé", "Zoë", "Jürgen", "Agnieszka", "Nguyễn", "Ayşe", "Ömer", "Łukasz",
+    "Amélie", "François", "Inês", "Ángel", "Björn", "Søren", "Mei", "Wei", "Priya", "Arjun",
+]
+SOBRENOMES = [
+    "Álvarez", "González", "Silva", "Santos", "Müller", "Schröder", "Kowalski", "Nowak", "Tanaka",
+    "Sato", "Ivanov", "Petrova", "Dubois", "Lefèvre", "Yılmaz", "Öztürk", "Trần", "Phạm", "García",
+    "Pérez", "Martínez", "Rossi", "Bianchi", "Kim", "Park", "Chen", "Wang", "Patel", "Sharma", "Haddad",
+]
+PAISES = [
+    "Venezuela", "Bolívia", "Haiti", "Paraguai", "Argentina", "Colômbia", "Peru", "Angola",
+    "Japão", "China", "Síria", "Ucrânia", "Portugal", "Estados Unidos", "Coreia do Sul",
+]
+SERIES = [f"{n}º ano" for n in range(1, 10)] + ["1ª série EM", "2ª série EM", "3ª série EM"]
+
+
+def preparar_banco_temporario():
+    """Aponta ALUNOS_DB_PATH para um arquivo temporário, importa database e cria o schema.
+
+    Chamadas seguintes no mesmo processo (vários cenários da suíte) trocam o engine global
+    para o novo arquivo.
+    """
+    os.environ["ALUNOS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_alunos_"), "alunos.db")
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    ja_importado = "database" in sys.modules
+    import database
+    if ja_importado:
+        database.configurar_banco(database.url_banco())
+    database.criar_banco()
+    return database
+
+
+def gerar_alunos(n: int, seed: int = 42):
+    rnd = random.Random(seed)
+    inicio = date(2020, 1, 1)
+    for i in range(n):
+        yield {
+            "nome": f"{rnd.choice(PRIMEIROS_NOMES)} {rnd.choice(SOBRENOMES)} {rnd.choice(SOBRENOMES)}",
+            "idade": rnd.randint(6, 18),
+            "pais": rnd.choice(PAISES),
+            "passaporte": f"{rnd.choice('ABCDEFGHJK')}{rnd.choice('LMNPRSTUVX')}{i:07d}",
+            "serie": rnd.choice(SERIES),
+            "data_entrada": inicio + timedelta(days=rnd.randint(0, 5 * 365)),
+            "responsavel": f"{rnd.choice(PRIMEIROS_NOMES)} {rnd.choice(SOBRENOMES)}",
+            "observacoes": None,
+        }
+
+
+def popular_alunos(database, n: int, seed: int = 42, lote: int = 10_000):
+    """Insere n alunos sintéticos em lotes (executemany)."""
+    from sqlalchemy import insert
+
+    buffer = []
+    with database.engine.begin() as conn:
+        for linha in gerar_alunos(n, seed):
+            buffer.append(linha)
+            if len(buffer) >= lote:
+                conn.execute(insert(database.Aluno), buffer)
+                buffer = []
+        if buffer:
+            conn.execute(insert(database.Aluno), buffer)
+
+
+# -------- Presenças --------
+# Cenários da suíte (bench/suite.py): alunos, anos de histórico e total de presenças.
+CENARIOS = {
+    "1k": {"alunos": 20, "anos": 1, "presencas": 1_000},
+    "100k": {"alunos": 600, "anos": 1, "presencas": 100_000},
+    "1M": {"alunos": 3_000, "anos": 2, "presencas": 1_000_000},
+}
+DATA_FINAL = date(2025, 11, 28)  # fixa, para os resultados serem comparáveis entre execuções
+
+
+def dias_letivos(anos: int, data_final: date = DATA_FINAL):
+    """Dias úteis de fevereiro a dezembro (sem janeiro e julho) dos últimos `anos` anos letivos."""
+    dia = date(data_final.year - anos + 1, 2, 1)
+    while dia <= data_final:
+        if dia.weekday() < 5 and dia.month not in (1, 7):
+            yield dia
+        dia += timedelta(days=1)
+
+
+def gerar_presencas(n_alunos: int, anos: int, limite: int = None, seed: int = 7, data_final: date = DATA_FINAL):
+    """Presenças realistas dos alunos 1..n_alunos terminando em data_final.
+
+    Cada aluno tem uma assiduidade própria (80%-98%) e um turno (manhã/tarde); a entrada
+    varia em torno do horário do turno, a permanência em torno de 5h e ~2% das entradas
+    ficam sem saída (esqueceram de registrar). Com `limite`, usa só os dias mais recentes
+    necessários para chegar a esse total.
+    """
+    rnd = random.Random(seed)
+    assiduidade = [rnd.uniform(0.80, 0.98) for _ in range(n_alunos)]
+    turno_manha = [rnd.random() < 0.6 for _ in range(n_alunos)]
+    dias = list(dias_letivos(anos, data_final))
+    if limite:
+        necessarios = -(-limite // max(1, int(n_alunos * 0.85)))
+        dias = dias[-necessarios:]
+    gerados = 0
+    for dia in dias:
+        for i in range(n_alunos):
+            if rnd.random() >= assiduidade[i]:
+                continue
+            inicio_turno = datetime.combine(dia, datetime.min.time()).replace(hour=7 if turno_manha[i] else 13)
+            entrada = inicio_turno + timedelta(minutes=max(-30.0, rnd.gauss(10, 12)))
+            saida = None if rnd.random() < 0.02 else entrada + timedelta(minutes=max(30.0, rnd.gauss(300, 25)))
+            yield {"aluno_id": i + 1, "data": dia, "hora_entrada": entrada, "hora_saida": saida, "observacao": None}
+            gerados += 1
+            if limite and gerados >= limite:
+                return
+
+
+def popular_presencas(database, n_alunos: int, anos: int, limite: int = None, seed: int = 7, lote: int = 20_000):
+    """Insere as presenças sintéticas em lotes e reconstrói o resumo diário."""
+    from sqlalchemy import insert
+
+    buffer = []
+    with database.engine.begin() as conn:
+        for linha in gerar_presencas(n_alunos, anos, limite, seed):
+            buffer.append(linha)
+            if len(buffer) >= lote:
+                conn.execute(insert(database.Presenca), buffer)
+                buffer = []
+        if buffer:
+            conn.execute(insert(database.Presenca), buffer)
+    database.reconstruir_presenca_diaria()
+    with database.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def preparar_cenario(nome: str):
+    """Banco temporário com os alunos e presenças do cenário `nome` (ver CENARIOS)."""
+    cenario = CENARIOS[nome]
+    database = preparar_banco_temporario()
+    popular_alunos(database, cenario["alunos"])
+    popular_presencas(database, cenario["alunos"], cenario["anos"], cenario["presencas"])
+    return database
@@ -0,0 +1,164 @@
+# bench/suite.py
+# Suíte reprodutível: cria um banco sintético por cenário (1k, 100k, 1M presenças — ver
+# dados.CENARIOS), cronometra as funções de database.py, o agregado do Dashboard e as
+# exportações, e grava tudo em JSON para comparar entre commits (bench/comparar.py).
+#   python bench/suite.py --cenarios 1k,100k --saida bench_resultados.json
+#   python bench/comparar.py antes.json depois.json
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from dados import CENARIOS, DATA_FINAL, RAIZ, gerar_alunos, preparar_cenario
+
+
+def casos(database, alunos):
+    """(nome, função, repetições relativas) de cada medição; as funções recebem o índice da repetição."""
+    ids = [a.id for a in alunos[:: max(1, len(alunos) // 50)]]
+    passaportes = [a.passaporte for a in alunos[:: max(1, len(alunos) // 50)]]
+    aluno = lambda i: ids[i % len(ids)]  # noqa: E731
+    um_mes = {"data_inicio": DATA_FINAL - timedelta(days=30), "data_fim": DATA_FINAL}
+    uma_semana = {"data_inicio": DATA_FINAL - timedelta(days=7), "data_fim": DATA_FINAL}
+    ano = (DATA_FINAL - timedelta(days=365), DATA_FINAL)
+    token = database.emitir_token_sessao(database.autenticar_usuario("admin", "admin123"))
+
+    def importar(i):
+        linhas = list(gerar_alunos(500, seed=1000 + i))
+        saida = io.StringIO()
+        saida.write("Nome;Idade;País;Passaporte;Série\n")
+        for n, a in enumerate(linhas):
+            saida.write(f"{a['nome']};{a['idade']};{a['pais']};IMP{i:03d}{n:05d};{a['serie']}\n")
+        return database.importar_alunos(io.BytesIO(saida.getvalue().encode()), "bench.csv")
+
+    def fila(i):
+        f = database.FilaPresencas(intervalo=0.05, tamanho_lote=500)
+        for n in range(500):
+            f.registrar_entrada(aluno(i + n))
+        f.esvaziar()
+        f.parar()
+
+    return [
+        # alunos
+        ("listar_alunos", lambda i: database.listar_alunos(), 1),
+        ("listar_alunos[nome]", lambda i: database.listar_alunos({"nome": "gonz"}), 1),
+        ("listar_alunos[busca]", lambda i: database.listar_alunos({"busca": "gonz"}), 1),
+        ("listar_alunos[pais]", lambda i: database.listar_alunos({"pais": "Haiti"}), 1),
+        ("listar_alunos[serie]", lambda i: database.listar_alunos({"serie": "5º ano"}), 1),
+        ("listar_alunos[data_entrada]", lambda i: database.listar_alunos(
+            {"data_inicio": datetime(2022, 1, 1).date(), "data_fim": datetime(2022, 12, 31).date()}), 1),
+        ("listar_alunos_pagina", lambda i: database.listar_alunos_pagina(tamanho=50), 1),
+        ("buscar_alunos", lambda i: database.buscar_alunos("maria silva"), 1),
+        ("obter_aluno_por_id", lambda i: database.obter_aluno_por_id(aluno(i)), 4),
+        ("resolver_aluno[passaporte]", lambda i: database.resolver_aluno(passaportes[i % len(passaportes)]), 4),
+        ("possiveis_duplicados", lambda i: database.possiveis_duplicados(alunos[i % len(alunos)].nome), 4),
+        ("encontrar_duplicados", lambda i: database.encontrar_duplicados(), 1),
+        # presenças
+        ("listar_presencas[aluno]", lambda i: database.listar_presencas(aluno_id=aluno(i)), 2),
+        ("listar_presencas[periodo 7d]", lambda i: database.listar_presencas(**uma_semana), 1),
+        ("listar_presencas[aluno+periodo 30d]", lambda i: database.listar_presencas(aluno_id=aluno(i), **um_mes), 2),
+        ("listar_presencas_pagina", lambda i: database.listar_presencas_pagina(tamanho=100), 1),
+        ("contar_presencas[periodo 30d]", lambda i: database.contar_presencas(**um_mes), 1),
+        # Dashboard / análises
+        ("obter_estatisticas (Dashboard)", lambda i: database.obter_estatisticas(), 1),
+        ("listar_presentes", lambda i: database.listar_presentes(DATA_FINAL), 1),
+        ("taxa_presenca_por_serie_semana[1 ano]", lambda i: database.taxa_presenca_por_serie_semana(*ano), 1),
+        ("tempo_medio_por_pais[1 ano]", lambda i: database.tempo_medio_por_pais(*ano), 1),
+        # escritas
+        ("inserir_aluno", lambda i: database.inserir_aluno(nome=f"Bench {i}", pais="Peru", serie="1º ano"), 4),
+        ("atualizar_aluno", lambda i: database.atualizar_aluno(aluno(i), {"observacoes": f"bench {i}"}), 4),
+        ("registrar_presenca_entrada", lambda i: database.registrar_presenca_entrada(aluno(i)), 4),
+        ("registrar_presenca_saida_por_aluno", lambda i: database.registrar_presenca_saida_por_aluno(aluno(i)), 4),
+        ("FilaPresencas[500 entradas]", fila, 1),
+        ("importar_alunos[500 linhas]", importar, 1),
+        # autenticação
+        ("autenticar_usuario", lambda i: database.autenticar_usuario("admin", "admin123"), 1),
+        ("validar_token_sessao", lambda i: database.validar_token_sessao(token), 4),
+        # exportações
+        ("exportar_alunos[xlsx]", lambda i: database.exportar_alunos(formato="xlsx"), 1),
+        ("exportar_presencas[xlsx 30d]", lambda i: database.exportar_presencas(formato="xlsx", **um_mes), 1),
+        ("exportar_presencas[csv 30d]", lambda i: database.exportar_presencas(formato="csv", **um_mes), 1),
+    ]
+
+
+def _linhas(resultado):
+    if isinstance(resultado, tuple) and len(resultado) == 2 and isinstance(resultado[1], int):
+        return resultado[1]  # exportar_*: (arquivo, linhas)
+    if isinstance(resultado, tuple) and resultado and isinstance(resultado[0], list):
+        return len(resultado[0])  # *_pagina: (itens, cursor)
+    if isinstance(resultado, (list, dict)):
+        return len(resultado)
+    return None
+
+
+def medir(funcao, repeticoes):
+    tempos, linhas = [], None
+    for i in range(repeticoes):
+        t0 = time.perf_counter()
+        resultado = funcao(i)
+        tempos.append((time.perf_counter() - t0) * 1000)
+        linhas = _linhas(resultado)
+    tempos.sort()
+    return {
+        "mediana_ms": round(statistics.median(tempos), 3),
+        "p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3),
+        "min_ms": round(tempos[0], 3),
+        "repeticoes": repeticoes,
+        "linhas": linhas,
+    }
+
+
+def metadados():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "metricas": os.environ.get("ALUNOS_METRICAS", "1") != "0",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cenarios", default="1k,100k", help=f"separados por vírgula: {','.join(CENARIOS)}")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", default="bench_resultados.json")
+    parser.add_argument("--filtro", default="", help="só casos cujo nome contém este texto")
+    args = parser.parse_args()
+
+    resultado = {"meta": metadados(), "cenarios": {}}
+    for nome in args.cenarios.split(","):
+        t0 = time.perf_counter()
+        database = preparar_cenario(nome)
+        carga = time.perf_counter() - t0
+        print(f"\n== cenário {nome}: {CENARIOS[nome]} (carga {carga:.1f}s)")
+        alunos = database.listar_alunos()
+        medicoes = {}
+        for caso, funcao, peso in casos(database, alunos):
+            if args.filtro and args.filtro not in caso:
+                continue
+            medicoes[caso] = medir(funcao, max(1, args.repeticoes * peso))
+            m = medicoes[caso]
+            print(f"{caso:<40}{m['mediana_ms']:>11.2f} ms  (p95 {m['p95_ms']:.2f}, linhas {m['linhas']})")
+        resultado["cenarios"][nome] = {"parametros": CENARIOS[nome], "carga_s": round(carga, 2), "casos": medicoes}
+        database.engine.dispose()
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"\nresultados em {os.path.abspath(args.saida)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,244 @@
 # database.py
-from datetime import datetime, date
-from sqlalchemy import create_engine, Column, Integer, String, Text, Date, DateTime, ForeignKey
-from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-from werkzeug.security import generate_password_hash, check_password_hash
+import atexit
+import base64
+import codecs
+import contextlib
+import contextvars
+import csv
+import functools
+import hashlib
+import hmac
+import io
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from itertools import combinations
+from sqlalchemy import create_engine, event, bindparam, case, delete, insert, select, text, update, union_all, Column, Integer, String, Text, Boolean, Date, DateTime, ForeignKey, Index, MetaData, Table, distinct, func, inspect, and_, or_
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.sql import Executable, column, table
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, declarative_base, sessionmaker, relationship
+from sqlalchemy.pool import QueuePool, StaticPool
 
-engine = create_engine("sqlite:///alunos.db", echo=False, connect_args={"check_same_thread": False})
+import metricas
+
+logger = logging.getLogger(__name__)
+
+# -------- Engine --------
+# Configurável pelo ambiente:
+#   ALUNOS_DB_URL            URL SQLAlchemy completa (tem prioridade)
+#   ALUNOS_DB_PATH           arquivo SQLite (padrão: alunos.db)
+#   ALUNOS_DB_POOL_SIZE      conexões mantidas no pool (padrão: 5)
+#   ALUNOS_DB_JOURNAL_MODE, ALUNOS_DB_SYNCHRONOUS, ALUNOS_DB_BUSY_TIMEOUT,
+#   ALUNOS_DB_CACHE_SIZE, ALUNOS_DB_MMAP_SIZE, ALUNOS_DB_FOREIGN_KEYS   sobrescrevem os PRAGMAs abaixo
+PRAGMAS_SQLITE = {
+    "journal_mode": "WAL",       # leitores não bloqueiam o escritor (e vice-versa)
+    "synchronous": "NORMAL",     # seguro com WAL; fsync só no checkpoint
+    "busy_timeout": 5000,        # ms esperando o lock em vez de "database is locked"
+    "cache_size": -20000,        # ~20 MB de page cache por conexão
+    "mmap_size": 268435456,      # 256 MB de leitura via mmap
+    "foreign_keys": "ON",        # ON DELETE CASCADE: excluir o aluno leva presenças e resumo diário
+}
+
+
+def url_banco():
+    url = os.environ.get("ALUNOS_DB_URL")
+    if url:
+        return url
+    return f"sqlite:///{os.environ.get('ALUNOS_DB_PATH', 'alunos.db')}"
+
+
+def _pragmas_do_ambiente():
+    pragmas = dict(PRAGMAS_SQLITE)
+    for nome in pragmas:
+        valor = os.environ.get(f"ALUNOS_DB_{nome.upper()}")
+        if valor:
+            pragmas[nome] = valor
+    return pragmas
+
+
+def criar_engine(url: str = None, pragmas: dict = None, pool_size: int = None, echo: bool = False):
+    """Cria o engine do banco. Em SQLite aplica `pragmas` (padrão: PRAGMAS_SQLITE) a cada conexão nova."""
+    url = url or url_banco()
+    pool_size = pool_size or int(os.environ.get("ALUNOS_DB_POOL_SIZE", 5))
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=echo, pool_size=pool_size, pool_pre_ping=True)
+
+    pragmas = _pragmas_do_ambiente() if pragmas is None else pragmas
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # banco em memória só existe dentro de uma conexão: todos compartilham a mesma
+        novo = create_engine(url, echo=echo, poolclass=StaticPool, connect_args={"check_same_thread": False})
+    else:
+        novo = create_engine(
+            url, echo=echo, poolclass=QueuePool, pool_size=pool_size, max_overflow=pool_size * 2,
+            connect_args={"check_same_thread": False},
+        )
+
+    registrar_pragmas(novo, pragmas)
+    return novo
+
+
+def registrar_pragmas(engine_sqlite, pragmas: dict = None):
+    """Aplica `pragmas` (padrão: PRAGMAS_SQLITE / ambiente) a cada conexão nova do engine."""
+    pragmas = _pragmas_do_ambiente() if pragmas is None else pragmas
+
+    @event.listens_for(engine_sqlite, "connect")
+    def _aplicar_pragmas(dbapi_conn, _registro):
+        cursor = dbapi_conn.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nome} = {valor}")
+        finally:
+            cursor.close()
+
+
+# Parâmetros do hash de senha no formato do werkzeug (ex.: "scrypt:32768:8:1",
+# "pbkdf2:sha256:600000"). Ao mudar, as senhas são refeitas no próximo login.
+METODO_HASH = os.environ.get("ALUNOS_HASH_METODO", "scrypt:32768:8:1")
+
+# -------- Escolas (um banco por escola) --------
+# Cada escola da rede tem o próprio banco: um arquivo SQLite por escola (as migrações,
+# a busca FTS5 e os gatilhos são do SQLite).
+#   ALUNOS_ESCOLAS   "centro,norte,sul" ou "centro=alunos.db,norte=/dados/norte.db"
+#   ALUNOS_REDE_THREADS   threads das consultas da rede inteira (padrão: 8)
+# A primeira escola é a padrão: fica no banco de url_banco() e guarda os usuários. As
+# demais ficam ao lado dela (alunos.db -> alunos_norte.db). Sem ALUNOS_ESCOLAS há uma
+# única escola, "principal", como antes.
+ESCOLA_UNICA = "principal"
+
+
+def _escolas_do_ambiente():
+    escolas = {}
+    for item in os.environ.get("ALUNOS_ESCOLAS", "").split(","):
+        nome, _, destino = item.partition("=")
+        if nome.strip():
+            escolas[nome.strip()] = destino.strip() or None
+    return escolas
+
+
+class RoteadorEscolas:
+    """Engine de cada escola, criado na primeira vez e reaproveitado (trocar de escola não reconecta)."""
+
+    def __init__(self, escolas: dict = None, url: str = None, **opcoes):
+        self._lock = threading.Lock()
+        self._engines = {}
+        self.configurar(escolas, url, **opcoes)
+
+    def configurar(self, escolas: dict = None, url: str = None, **opcoes):
+        """`escolas`: {nome: arquivo/URL ou None para derivar}; padrão: ALUNOS_ESCOLAS."""
+        self.descartar()
+        self.url = url or url_banco()
+        self.opcoes = opcoes
+        self.destinos = dict(escolas) if escolas is not None else _escolas_do_ambiente()
+        if not self.destinos:
+            self.destinos = {ESCOLA_UNICA: None}
+        self.padrao = next(iter(self.destinos))
+        for escola in self.destinos:
+            self.url_escola(escola)  # destino inválido falha agora, não na primeira consulta
+
+    @property
+    def escolas(self):
+        return list(self.destinos)
+
+    def _validar(self, escola: str):
+        if escola not in self.destinos:
+            raise ValueError(f"escola desconhecida: {escola!r}")
+
+    def url_escola(self, escola: str) -> str:
+        self._validar(escola)
+        destino = self.destinos[escola]
+        if destino:
+            return destino if "://" in destino else f"sqlite:///{destino}"
+        if escola == self.padrao:
+            return self.url
+        url = make_url(self.url)
+        if not url.drivername.startswith("sqlite"):
+            raise ValueError(f"escola {escola!r}: informe o arquivo SQLite dela em ALUNOS_ESCOLAS "
+                             "(só a escola padrão pode vir de ALUNOS_DB_URL)")
+        if not url.database or url.database == ":memory:":
+            return "sqlite://"
+        raiz, extensao = os.path.splitext(url.database)
+        return f"sqlite:///{raiz}_{escola}{extensao or '.db'}"
+
+    def engine(self, escola: str = None):
+        escola = escola or self.padrao
+        existente = self._engines.get(escola)
+        if existente is not None:
+            return existente
+        with self._lock:
+            if escola not in self._engines:
+                self._engines[escola] = criar_engine(self.url_escola(escola), **self.opcoes)
+            return self._engines[escola]
+
+    def descartar(self):
+        with self._lock:
+            for existente in self._engines.values():
+                existente.dispose()
+            self._engines = {}
+
+
+roteador = RoteadorEscolas()
+_escola_atual = contextvars.ContextVar("escola_atual", default=None)
+
+
+def escola_atual() -> str:
+    return _escola_atual.get() or roteador.padrao
+
+
+def definir_escola(escola: str = None):
+    """Escola usada pelas funções deste módulo no contexto atual (thread/execução do Streamlit)."""
+    if escola is not None:
+        roteador._validar(escola)
+    _escola_atual.set(escola)
+
+
+@contextlib.contextmanager
+def usar_escola(escola: str):
+    roteador._validar(escola)
+    token = _escola_atual.set(escola)
+    try:
+        yield escola
+    finally:
+        _escola_atual.reset(token)
+
+
+def engine_atual():
+    return roteador.engine(escola_atual())
+
+
+class SessaoEscola(Session):
+    """Session que grava/lê no banco da escola atual; usuários ficam sempre na escola padrão."""
+
+    def get_bind(self, mapper=None, **kwargs):
+        if mapper is not None and mapper.class_ is User:
+            return roteador.engine(roteador.padrao)
+        return engine_atual()
+
+
+engine = roteador.engine()  # escola padrão (ferramentas e benchmarks de uma escola só)
 Base = declarative_base()
-SessionLocal = sessionmaker(bind=engine)
+SessionLocal = sessionmaker(class_=SessaoEscola)
+
+
+def configurar_banco(url: str = None, escolas: dict = None, **opcoes):
+    """Troca os bancos das escolas (e o engine global) — usado por benchmarks e ferramentas."""
+    global engine
+    roteador.configurar(escolas, url, **opcoes)
+    engine = roteador.engine()
+    diretorio_alunos.invalidar(todas=True)
+    return engine
 
 
 class User(Base):
@@ -15,13 +247,32 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     password_hash = Column(String, nullable=False)
     role = Column(String, default="user")  # 'admin' or 'user'
+    escola = Column(String, nullable=True)  # escola do usuário; admin troca de escola livremente
+    versao_token = Column(Integer, nullable=False, default=0, server_default="0")  # +1 no logout: revoga os tokens
+
+    def set_password(self, password: str, metodo: str = None):
+        from werkzeug.security import generate_password_hash  # importado só no login/cadastro, não ao subir
 
-    def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=metodo or METODO_HASH)
 
     def check_password(self, password: str) -> bool:
+        from werkzeug.security import check_password_hash
+
         return check_password_hash(self.password_hash, password)
 
+    def precisa_rehash(self, metodo: str = None) -> bool:
+        # o hash do werkzeug começa com os parâmetros usados, ex.: "scrypt:32768:8:1$sal$hash"
+        return self.password_hash.split("$", 1)[0] != _prefixo_hash(metodo or METODO_HASH)
+
+
+@functools.lru_cache(maxsize=8)
+def _prefixo_hash(metodo: str) -> str:
+    """Parâmetros como o werkzeug os grava no hash: formas curtas ("scrypt", "pbkdf2")
+    viram a completa ("scrypt:32768:8:1"), então o jeito seguro é gerar um hash e ler."""
+    from werkzeug.security import generate_password_hash
+
+    return generate_password_hash("", method=metodo).split("$", 1)[0]
+
 
 class Aluno(Base):
     __tablename__ = "alunos"
@@ -35,13 +286,21 @@ class Aluno(Base):
     responsavel = Column(String)
     observacoes = Column(Text)
 
-    presencas = relationship("Presenca", back_populates="aluno", cascade="all, delete-orphan")
+    # passive_deletes: quem remove as presenças é o ON DELETE CASCADE do banco, não o ORM
+    presencas = relationship("Presenca", back_populates="aluno", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index("ix_alunos_pais", "pais"),
+        Index("ix_alunos_serie", "serie"),
+        Index("ix_alunos_data_entrada", "data_entrada"),
+        Index("ix_alunos_passaporte", "passaporte"),
+    )
 
 
 class Presenca(Base):
     __tablename__ = "presencas"
     id = Column(Integer, primary_key=True, index=True)
-    aluno_id = Column(Integer, ForeignKey("alunos.id"))
+    aluno_id = Column(Integer, ForeignKey("alunos.id", ondelete="CASCADE"))
     data = Column(Date, default=date.today)
     hora_entrada = Column(DateTime, nullable=True)
     hora_saida = Column(DateTime, nullable=True)
@@ -49,9 +308,282 @@ class Presenca(Base):
 
     aluno = relationship("Aluno", back_populates="presencas")
 
+    __table_args__ = (
+        # histórico por aluno: WHERE aluno_id = ? [AND data BETWEEN ...] ORDER BY data, hora_entrada
+        Index("ix_presencas_aluno_data_entrada", "aluno_id", "data", "hora_entrada"),
+        # histórico geral / relatórios: WHERE data BETWEEN ... ORDER BY data, hora_entrada
+        Index("ix_presencas_data_entrada", "data", "hora_entrada"),
+        # presenças em aberto (sem saída): índice parcial, só contém quem está na escola
+        Index("ix_presencas_abertas", "aluno_id", "hora_entrada", sqlite_where=text("hora_saida IS NULL")),
+        # AUTOINCREMENT: um id nunca volta a ser usado, nem depois que o arquivo anual esvazia
+        # a tabela (ver arquivar_presencas e o log de mudanças)
+        {"sqlite_autoincrement": True},
+    )
+
+
+class PresencaDiaria(Base):
+    """Resumo por aluno/dia mantido junto com as presenças (ver atualizar_presenca_diaria)."""
+    __tablename__ = "presenca_diaria"
+    aluno_id = Column(Integer, ForeignKey("alunos.id", ondelete="CASCADE"), primary_key=True)
+    data = Column(Date, primary_key=True)
+    primeira_entrada = Column(DateTime)
+    ultima_saida = Column(DateTime)
+    minutos = Column(Integer, default=0)  # soma das sessões fechadas (entrada -> saída)
+    presente = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index("ix_presenca_diaria_data", "data"),
+    )
+
+
+class ArquivoPresencas(Base):
+    """Anos letivos cujas presenças foram movidas para um arquivo frio (ver arquivar_presencas)."""
+    __tablename__ = "arquivos_presencas"
+    ano = Column(Integer, primary_key=True, autoincrement=False)
+    arquivo = Column(String, nullable=False)  # nome do arquivo, na pasta do banco da escola
+    linhas = Column(Integer, default=0)
+    arquivado_em = Column(DateTime, default=datetime.now)
+
+
+class Mudanca(Base):
+    """Log de mudanças (append-only) de alunos e presenças, gravado por gatilhos (migração 006)."""
+    __tablename__ = "mudancas"
+    seq = Column(Integer, primary_key=True)  # AUTOINCREMENT: nunca reaproveitado, nem após compactar
+    tabela = Column(String, nullable=False)
+    operacao = Column(String(1), nullable=False)  # I(nserção), U(pdate), D(elete)
+    registro_id = Column(Integer, nullable=False)
+    dados = Column(Text)  # JSON da linha nova (I/U) ou da removida (D)
+    momento = Column(DateTime)
+
+    __table_args__ = (
+        # compactação: última mudança de cada registro
+        Index("ix_mudancas_registro", "tabela", "registro_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class ControleMudancas(Base):
+    """Estado do log: 'pausado' (gatilhos desligados na transação) e 'compactado_ate' (seq)."""
+    __tablename__ = "mudancas_controle"
+    chave = Column(String, primary_key=True)
+    valor = Column(Integer)
+
+
+# -------- Resultados de leitura (DTOs) --------
+# As consultas devolvem tuplas nomeadas (acesso por atributo, como os modelos) projetadas
+# direto das colunas: sem identity map, sem instrumentação e sem lazy-load após fechar a sessão.
+AlunoDTO = namedtuple("AlunoDTO", [c.key for c in Aluno.__table__.columns])
+PresencaDTO = namedtuple("PresencaDTO", [c.key for c in Presenca.__table__.columns])
+# resultado de inserir_aluno: o aluno gravado e os cadastros parecidos (ver possiveis_duplicados)
+AlunoInseridoDTO = namedtuple("AlunoInseridoDTO", AlunoDTO._fields + ("possiveis_duplicados",))
+COLUNAS_ALUNO = tuple(Aluno.__table__.columns)
+_COLUNAS_PRESENCA = tuple(Presenca.__table__.columns)
+
+
+# -------- Migrações --------
+# Cada migração recebe uma conexão aberta (dentro de uma transação) e é aplicada
+# uma única vez; a versão atual do schema fica em PRAGMA user_version.
+def _migracao_001_indices(conn):
+    for tabela in (Aluno.__table__, Presenca.__table__):
+        for idx in tabela.indexes:
+            idx.create(conn, checkfirst=True)
+    conn.execute(text("ANALYZE"))
+
+
+def _migracao_002_busca_fts(conn):
+    # Índice de texto completo (FTS5) sobre alunos; remove_diacritics torna a busca
+    # insensível a acentos ("jose" encontra "José") e prefix acelera buscas por prefixo.
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS alunos_fts USING fts5("
+        "nome, passaporte, responsavel, pais, "
+        "content='alunos', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    colunas = "nome, passaporte, responsavel, pais"
+    novos = "new.nome, new.passaporte, new.responsavel, new.pais"
+    antigos = "old.nome, old.passaporte, old.responsavel, old.pais"
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS alunos_fts_ai AFTER INSERT ON alunos BEGIN "
+        f"INSERT INTO alunos_fts(rowid, {colunas}) VALUES (new.id, {novos}); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS alunos_fts_ad AFTER DELETE ON alunos BEGIN "
+        f"INSERT INTO alunos_fts(alunos_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos}); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS alunos_fts_au AFTER UPDATE ON alunos BEGIN "
+        f"INSERT INTO alunos_fts(alunos_fts, rowid, {colunas}) VALUES ('delete', old.id, {antigos}); "
+        f"INSERT INTO alunos_fts(rowid, {colunas}) VALUES (new.id, {novos}); END"
+    )
+    # indexa os alunos já existentes
+    conn.exec_driver_sql("INSERT INTO alunos_fts(alunos_fts) VALUES ('rebuild')")
+
+
+def _migracao_003_presencas_abertas(conn):
+    for idx in Presenca.__table__.indexes:
+        if idx.name == "ix_presencas_abertas":
+            idx.create(conn, checkfirst=True)
+    conn.execute(text("ANALYZE presencas"))
+
+
+def _migracao_004_presenca_diaria(conn):
+    # a tabela é criada pelo create_all; aqui só preenche o resumo com o histórico existente
+    reconstruir_presenca_diaria(conn=conn)
+
+
+def _migracao_005_usuarios_escola(conn):
+    # a tabela de usuários só existe no banco da escola padrão
+    inspetor = inspect(conn)
+    if inspetor.has_table("users") and "escola" not in {c["name"] for c in inspetor.get_columns("users")}:
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN escola VARCHAR")
+
+
+def _migracao_006_log_mudancas(conn):
+    # as tabelas vêm do create_all; os gatilhos registram toda escrita (ORM, lote, API)
+    for tabela in _TABELAS_COM_MUDANCAS:
+        for sql in _sql_gatilhos_mudancas(tabela):
+            conn.exec_driver_sql(sql)
+
+
+def _migracao_007_cascata_presencas(conn):
+    # SQLite não altera chaves estrangeiras: recria presencas e presenca_diaria com
+    # ON DELETE CASCADE (bancos novos já vêm assim do create_all) e copia as linhas.
+    # Presenças de alunos que não existem mais violariam a chave e ficam de fora.
+    inspetor = inspect(conn)
+    for tabela in (Presenca.__table__, PresencaDiaria.__table__):
+        chaves = inspetor.get_foreign_keys(tabela.name)
+        if chaves and all((c["options"].get("ondelete") or "").upper() == "CASCADE" for c in chaves):
+            continue
+        _recriar_tabela(conn, tabela, "WHERE aluno_id IN (SELECT id FROM alunos)")
+
+
+def _recriar_tabela(conn, tabela, filtro: str = ""):
+    """Recria `tabela` com o DDL atual do modelo (índices e gatilhos de mudanças inclusive)
+    e copia as linhas da antiga que passam em `filtro` (ex.: "WHERE ...")."""
+    for idx in inspect(conn).get_indexes(tabela.name):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {idx['name']}")
+    if tabela in _TABELAS_COM_MUDANCAS:
+        for operacao in "iud":
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {tabela.name}_mudancas_{operacao}")
+    antiga = f"_{tabela.name}_antiga"
+    conn.exec_driver_sql(f"ALTER TABLE {tabela.name} RENAME TO {antiga}")
+    tabela.create(conn)
+    colunas = ", ".join(c.name for c in tabela.columns)
+    copiadas = conn.exec_driver_sql(
+        f"INSERT INTO {tabela.name} ({colunas}) SELECT {colunas} FROM {antiga} {filtro}"
+    ).rowcount
+    total = conn.exec_driver_sql(f"SELECT count(*) FROM {antiga}").scalar()
+    if total != copiadas:
+        logger.warning("%s: %d linha(s) de alunos inexistentes descartada(s)", tabela.name, total - copiadas)
+    conn.exec_driver_sql(f"DROP TABLE {antiga}")
+    if tabela in _TABELAS_COM_MUDANCAS:
+        for sql in _sql_gatilhos_mudancas(tabela):
+            conn.exec_driver_sql(sql)
+    # só tabela com linhas: estatísticas de tabela vazia (ou um ANALYZE geral, que
+    # pega as tabelas internas do FTS) levam o planejador a planos ruins depois
+    if conn.exec_driver_sql(f"SELECT 1 FROM {tabela.name} LIMIT 1").first():
+        conn.exec_driver_sql(f"ANALYZE {tabela.name}")
+
+
+def _migracao_008_estatisticas_fts(conn):
+    # a 007 rodava um ANALYZE geral, que em banco novo gravou "alunos_fts_data tem 2
+    # linhas": os gatilhos do FTS passavam a usar planos ruins e as inserções ficavam
+    # dezenas de vezes mais lentas. Sem estatísticas o SQLite volta aos padrões.
+    if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").first():
+        conn.exec_driver_sql("DELETE FROM sqlite_stat1 WHERE tbl LIKE 'alunos_fts%'")
+        conn.exec_driver_sql("ANALYZE sqlite_master")  # recarrega as estatísticas nesta conexão
+
+
+def _migracao_009_usuarios_versao_token(conn):
+    inspetor = inspect(conn)
+    if inspetor.has_table("users") and "versao_token" not in {c["name"] for c in inspetor.get_columns("users")}:
+        conn.exec_driver_sql("ALTER TABLE users ADD COLUMN versao_token INTEGER NOT NULL DEFAULT 0")
+
+
+def _migracao_010_presencas_autoincrement(conn):
+    # sem AUTOINCREMENT o SQLite reaproveita ids quando a tabela esvazia (depois de um
+    # arquivamento), e uma presença nova com data antiga colidia com a arquivada de mesmo id
+    ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'presencas'").scalar()
+    if "AUTOINCREMENT" not in (ddl or "").upper():
+        _recriar_tabela(conn, Presenca.__table__)
+    # os ids que já foram para o arquivo também não voltam
+    _reservar_ids_presencas(conn, _maior_id_arquivado(conn))
+
+
+def _maior_id_arquivado(conn) -> int:
+    """Maior id de presença nos arquivos anuais (lidos à parte: ATTACH não roda na transação)."""
+    arquivos = conn.execute(select(ArquivoPresencas.arquivo)).scalars().all()
+    if not arquivos:
+        return 0
+    pasta = os.path.dirname(_base_banco_escola())
+    maior = 0
+    for arquivo in arquivos:
+        caminho = os.path.join(pasta, arquivo)
+        if not os.path.exists(caminho):
+            continue
+        with contextlib.closing(sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)) as externo:
+            maior = max(maior, externo.execute("SELECT COALESCE(MAX(id), 0) FROM presencas").fetchone()[0])
+    return maior
+
+
+def _reservar_ids_presencas(conn, maior_id: int):
+    """Garante que o próximo id de presencas (AUTOINCREMENT) seja maior que `maior_id`."""
+    if not maior_id:
+        return
+    atualizadas = conn.exec_driver_sql(
+        "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'presencas'", (maior_id,)
+    ).rowcount
+    if not atualizadas:
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('presencas', ?)", (maior_id,))
+
+
+MIGRACOES = [
+    _migracao_001_indices,
+    _migracao_002_busca_fts,
+    _migracao_003_presencas_abertas,
+    _migracao_004_presenca_diaria,
+    _migracao_005_usuarios_escola,
+    _migracao_006_log_mudancas,
+    _migracao_007_cascata_presencas,
+    _migracao_008_estatisticas_fts,
+    _migracao_009_usuarios_versao_token,
+    _migracao_010_presencas_autoincrement,
+]
+
+
+def versao_schema(conn=None):
+    if conn is None:
+        with engine_atual().connect() as c:
+            return c.execute(text("PRAGMA user_version")).scalar()
+    return conn.execute(text("PRAGMA user_version")).scalar()
+
+
+def migrar_banco():
+    """Aplica as migrações pendentes no banco da escola atual; retorna a versão final."""
+    with engine_atual().begin() as conn:
+        atual = versao_schema(conn)
+        for numero, migracao in enumerate(MIGRACOES, start=1):
+            if numero <= atual:
+                continue
+            migracao(conn)
+            conn.execute(text(f"PRAGMA user_version = {numero}"))
+            atual = numero
+    return atual
+
 
 def criar_banco():
-    Base.metadata.create_all(bind=engine)
+    """Cria/migra o banco de cada escola e o administrador padrão (na escola padrão).
+
+    Banco já na versão atual (PRAGMA user_version) não passa pelo create_all, que
+    reflete todas as tabelas: toda mudança de schema vem com uma migração.
+    """
+    for escola in roteador.escolas:
+        with usar_escola(escola):
+            if versao_schema() >= len(MIGRACOES):
+                continue
+            tabelas = [t for t in Base.metadata.sorted_tables if escola == roteador.padrao or t is not User.__table__]
+            Base.metadata.create_all(bind=engine_atual(), tables=tabelas)
+            migrar_banco()
     # criar usuário administrador padrão se não houver usuário
     session = SessionLocal()
     try:
@@ -66,84 +598,826 @@ def criar_banco():
 
 
 # -------- Alunos CRUD --------
-def inserir_aluno(**dados):
-    session = SessionLocal()
-    try:
-        aluno = Aluno(
-            nome=dados.get("nome"),
-            idade=dados.get("idade"),
-            pais=dados.get("pais"),
-            passaporte=dados.get("passaporte"),
-            serie=dados.get("serie"),
-            data_entrada=dados.get("data_entrada"),
-            responsavel=dados.get("responsavel"),
-            observacoes=dados.get("observacoes"),
-        )
-        session.add(aluno)
-        session.commit()
-        session.refresh(aluno)
-        return aluno
-    finally:
-        session.close()
+def inserir_aluno(**dados) -> AlunoInseridoDTO:
+    valores = {c.key: dados.get(c.key) for c in COLUNAS_ALUNO if c.key != "id"}
+    with engine_atual().begin() as conn:
+        aluno = AlunoDTO._make(conn.execute(insert(Aluno).values(valores).returning(*COLUNAS_ALUNO)).one())
+    diretorio_alunos.atualizar(aluno)
+    # avisa na hora se parece um aluno já cadastrado (nome com outra grafia, passaporte formatado)
+    duplicados = possiveis_duplicados(aluno.nome, aluno.passaporte, ignorar_id=aluno.id)
+    if duplicados:
+        logger.warning("aluno %d parece duplicado de %s", aluno.id, [p.aluno_b.id for p in duplicados])
+    return AlunoInseridoDTO(*aluno, duplicados)
+
+
+def consulta_fts(termo: str):
+    # cada palavra vira um prefixo entre aspas: "maria silv" -> "maria"* "silv"*
+    palavras = re.findall(r"\w+", termo or "")
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def _filtrar_alunos(q, filtros: dict = None):
+    if filtros:
+        if filtros.get("busca"):
+            consulta = consulta_fts(filtros["busca"])
+            if consulta:
+                ids_fts = text("SELECT rowid FROM alunos_fts WHERE alunos_fts MATCH :consulta").bindparams(consulta=consulta)
+                q = q.filter(Aluno.id.in_(ids_fts))
+        if filtros.get("nome"):
+            q = q.filter(Aluno.nome.ilike(f"%{filtros['nome']}%"))
+        if filtros.get("pais"):
+            q = q.filter(Aluno.pais == filtros["pais"])
+        if filtros.get("serie"):
+            q = q.filter(Aluno.serie == filtros["serie"])
+        if filtros.get("data_inicio"):
+            q = q.filter(Aluno.data_entrada >= filtros["data_inicio"])
+        if filtros.get("data_fim"):
+            q = q.filter(Aluno.data_entrada <= filtros["data_fim"])
+    return q
 
 
 def listar_alunos(filtros: dict = None):
     session = SessionLocal()
     try:
-        q = session.query(Aluno)
-        if filtros:
-            if filtros.get("nome"):
-                q = q.filter(Aluno.nome.ilike(f"%{filtros['nome']}%"))
-            if filtros.get("pais"):
-                q = q.filter(Aluno.pais == filtros["pais"])
-            if filtros.get("serie"):
-                q = q.filter(Aluno.serie == filtros["serie"])
-            if filtros.get("data_inicio"):
-                q = q.filter(Aluno.data_entrada >= filtros["data_inicio"])
-            if filtros.get("data_fim"):
-                q = q.filter(Aluno.data_entrada <= filtros["data_fim"])
-        return q.all()
+        stmt = _filtrar_alunos(select(*COLUNAS_ALUNO), filtros)
+        return [AlunoDTO._make(linha) for linha in session.execute(stmt)]
     finally:
         session.close()
 
 
-def obter_aluno_por_id(aluno_id: int):
+def listar_alunos_pagina(filtros: dict = None, tamanho: int = 50, cursor: int = None):
+    """Uma página de alunos ordenada por id (keyset); devolve (alunos, proximo_cursor ou None)."""
     session = SessionLocal()
     try:
-        return session.query(Aluno).get(aluno_id)
+        stmt = _filtrar_alunos(select(*COLUNAS_ALUNO), filtros)
+        if cursor is not None:
+            stmt = stmt.where(Aluno.id > cursor)
+        stmt = stmt.order_by(Aluno.id).limit(tamanho + 1)
+        alunos = [AlunoDTO._make(linha) for linha in session.execute(stmt)]
+        if len(alunos) > tamanho:
+            alunos = alunos[:tamanho]
+            return alunos, alunos[-1].id
+        return alunos, None
     finally:
         session.close()
 
 
-def atualizar_aluno(aluno_id: int, atualizacoes: dict):
+_ALUNOS_FTS = table("alunos_fts", column("rowid"), column("rank"))
+
+
+def stmt_busca_fts(consulta: str, limite: int, filtros: dict = None):
+    # os demais filtros (país, série, datas) restringem o resultado sem mudar a ordem do rank
+    outros = {chave: valor for chave, valor in (filtros or {}).items() if chave != "busca"}
+    stmt = (
+        select(*COLUNAS_ALUNO)
+        .select_from(_ALUNOS_FTS)
+        .join(Aluno, Aluno.id == _ALUNOS_FTS.c.rowid)
+        .where(text("alunos_fts MATCH :consulta").bindparams(consulta=consulta))
+    )
+    return _filtrar_alunos(stmt, outros).order_by(_ALUNOS_FTS.c.rank).limit(limite)
+
+
+def buscar_alunos(termo: str, limite: int = 50, filtros: dict = None):
+    """Busca por nome, passaporte, responsável ou país (prefixo, sem acentos), ordenada por relevância.
+
+    `filtros` (os mesmos de listar_alunos, menos "busca") restringem o resultado.
+    """
+    consulta = consulta_fts(termo)
+    if not consulta:
+        return []
     session = SessionLocal()
     try:
-        aluno = session.query(Aluno).get(aluno_id)
-        if not aluno:
-            return None
-        for chave, valor in atualizacoes.items():
-            if hasattr(aluno, chave) and valor is not None:
-                setattr(aluno, chave, valor)
-        session.commit()
-        session.refresh(aluno)
-        return aluno
+        return [AlunoDTO._make(linha) for linha in session.execute(stmt_busca_fts(consulta, limite, filtros))]
     finally:
         session.close()
 
 
-def deletar_aluno(aluno_id: int):
+def obter_aluno_por_id(aluno_id: int):
     session = SessionLocal()
     try:
-        aluno = session.query(Aluno).get(aluno_id)
-        if not aluno:
-            return False
-        session.delete(aluno)
-        session.commit()
-        return True
+        linha = session.execute(select(*COLUNAS_ALUNO).where(Aluno.id == aluno_id)).first()
+        return AlunoDTO._make(linha) if linha else None
     finally:
         session.close()
 
 
+_COLUNAS_EDITAVEIS = {c.key for c in COLUNAS_ALUNO} - {"id"}
+
+
+def _valores_aluno(atualizacoes: dict) -> dict:
+    # só colunas conhecidas; None significa "não alterar"
+    return {chave: valor for chave, valor in atualizacoes.items() if chave in _COLUNAS_EDITAVEIS and valor is not None}
+
+
+def atualizar_aluno(aluno_id: int, atualizacoes: dict):
+    valores = _valores_aluno(atualizacoes)
+    with engine_atual().begin() as conn:
+        if valores:
+            stmt = update(Aluno).where(Aluno.id == aluno_id).values(valores).returning(*COLUNAS_ALUNO)
+        else:
+            stmt = select(*COLUNAS_ALUNO).where(Aluno.id == aluno_id)
+        linha = conn.execute(stmt).first()
+    if linha is None:
+        return None
+    aluno = AlunoDTO._make(linha)
+    diretorio_alunos.atualizar(aluno)
+    return aluno
+
+
+def deletar_aluno(aluno_id: int):
+    return deletar_alunos([aluno_id]) == 1
+
+
+# -------- Edição em lote --------
+# Uma instrução por operação (UPDATE/DELETE ... WHERE id IN (...)), sem carregar os
+# alunos no ORM; o diretório é atualizado com as linhas devolvidas pelo RETURNING.
+def atualizar_alunos(ids, atualizacoes: dict) -> int:
+    """Aplica as mesmas `atualizacoes` (ex.: {"serie": "6º ano"}) aos alunos `ids`; retorna quantos mudaram."""
+    ids, valores = list(ids), _valores_aluno(atualizacoes)
+    if not ids or not valores:
+        return 0
+    with engine_atual().begin() as conn:
+        linhas = conn.execute(
+            update(Aluno).where(Aluno.id.in_(ids)).values(valores)
+            .returning(Aluno.id, Aluno.nome, Aluno.passaporte, Aluno.serie)
+        ).all()
+    for linha in linhas:
+        diretorio_alunos.atualizar(ItemDiretorio(*linha))
+    return len(linhas)
+
+
+def deletar_alunos(ids) -> int:
+    """Exclui os alunos `ids`; retorna quantos existiam.
+
+    Presenças e resumo diário saem pelo ON DELETE CASCADE; as presenças já arquivadas
+    (sem chave estrangeira) são removidas por aluno_id em cada arquivo anual, em rodadas
+    de até MAX_ARQUIVOS_ANEXADOS arquivos (uma transação por rodada).
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    with engine_atual().connect() as conn:
+        removidos = None
+        for rodada in _rodadas_de_arquivos(_anos_arquivados(conn)):
+            _anexar_arquivos(conn, rodada)  # antes do primeiro DELETE: ATTACH não roda dentro de transação
+            if removidos is None:
+                removidos = conn.execute(delete(Aluno).where(Aluno.id.in_(ids)).returning(Aluno.id)).scalars().all()
+            if not removidos:
+                break
+            for ano, _ in rodada:
+                tabela = _tabela_arquivo(ano)
+                conn.execute(tabela.delete().where(tabela.c.aluno_id.in_(removidos)))
+            conn.commit()
+    for aluno_id in removidos:
+        diretorio_alunos.remover(aluno_id)
+    return len(removidos)
+
+
+_SERIE_NUMERADA = re.compile(r"^(\d+)\s*([ºª°]?)\s*(.*)$")
+
+
+def proxima_serie(serie: str):
+    """Série do ano seguinte ("5º ano" -> "6º ano", "9º ano" -> "1ª série EM"); None sem sugestão (fim do EM, texto livre)."""
+    achado = _SERIE_NUMERADA.match((serie or "").strip())
+    if not achado:
+        return None
+    numero, ordinal, resto = int(achado.group(1)), achado.group(2), achado.group(3)
+    resto_normalizado = _sem_acentos(resto).lower()
+    if resto_normalizado.startswith("ano"):
+        return f"{numero + 1}{ordinal or 'º'} {resto}" if numero < 9 else "1ª série EM"
+    if resto_normalizado.startswith("serie"):
+        return f"{numero + 1}{ordinal or 'ª'} {resto}" if numero < 3 else None
+    return None
+
+
+def promover_series(mapa: dict) -> int:
+    """Troca a série conforme `mapa` ({série atual: nova série}) num único UPDATE; retorna quantos mudaram.
+
+    Serve à promoção de fim de ano e a mover uma turma inteira. O CASE lê a série de
+    antes da instrução, então cada aluno muda uma vez só ("1º ano" -> "2º ano" e
+    "2º ano" -> "3º ano" no mesmo mapa não levam o 1º ano ao 3º). "" é a série vazia.
+    """
+    mapa = {de or "": para for de, para in mapa.items() if para and para != de}
+    if not mapa:
+        return 0
+    atual = func.coalesce(Aluno.serie, "")
+    with engine_atual().begin() as conn:
+        linhas = conn.execute(
+            update(Aluno).where(atual.in_(list(mapa))).values(serie=case(mapa, value=atual))
+            .returning(Aluno.id, Aluno.nome, Aluno.passaporte, Aluno.serie)
+        ).all()
+    for linha in linhas:
+        diretorio_alunos.atualizar(ItemDiretorio(*linha))
+    return len(linhas)
+
+
+# -------- Diretório de alunos (cache) --------
+ItemDiretorio = namedtuple("ItemDiretorio", ["id", "nome", "passaporte", "serie"])
+
+
+def _normalizar_busca(texto: str) -> str:
+    return _sem_acentos(texto or "").lower()
+
+
+class DiretorioAlunos:
+    """Cache do processo com (id, nome, passaporte, serie) de todos os alunos.
+
+    Carregado na primeira consulta; inserir/atualizar/deletar_aluno o mantêm em dia
+    incrementalmente e operações em lote chamam invalidar(). Um por escola. O índice
+    de identidade (blocos da detecção de duplicados) só é montado quando pedido.
+
+    Escritas de outros processos (API, outra instância do app, sqlite3 direto) chegam
+    pelo log de mudanças: a cada consulta compara o último seq com o da carga e aplica
+    as mudanças de alunos do intervalo (ou recarrega tudo, se forem muitas).
+    """
+
+    MAX_MUDANCAS_APLICADAS = 1000  # acima disso recarregar sai mais barato
+
+    def __init__(self, escola: str = None):
+        self.escola = escola
+        self._lock = threading.Lock()
+        self._itens = None          # id -> ItemDiretorio
+        self._chaves = None         # id -> " nome passaporte" normalizado, para busca por prefixo
+        self._por_passaporte = None  # passaporte -> id
+        self._identidades = None    # id -> Identidade (ver identidade_aluno)
+        self._blocos = None         # chave de bloco -> {ids}
+        self._versao = None         # último seq do log de mudanças já refletido
+
+    def _carregar(self):
+        with roteador.engine(self.escola).connect() as conn:
+            # o seq vem antes da leitura: o que entrar no meio é reaplicado depois, sem efeito
+            self._versao = conn.execute(select(func.max(Mudanca.seq))).scalar() or 0
+            linhas = conn.execute(select(Aluno.id, Aluno.nome, Aluno.passaporte, Aluno.serie).order_by(Aluno.nome))
+            self._itens, self._chaves, self._por_passaporte = {}, {}, {}
+            self._identidades = self._blocos = None
+            for linha in linhas:
+                self._guardar(ItemDiretorio(*linha))
+
+    def _guardar(self, item):
+        anterior = self._itens.get(item.id)
+        if anterior is not None and anterior.passaporte:
+            self._por_passaporte.pop(anterior.passaporte, None)
+        self._itens[item.id] = item
+        self._chaves[item.id] = " " + _normalizar_busca(f"{item.nome} {item.passaporte or ''}")
+        if item.passaporte:
+            self._por_passaporte[item.passaporte] = item.id
+        if self._blocos is not None:
+            self._desindexar(item.id)
+            self._indexar(item)
+
+    def _indexar(self, item):
+        identidade = identidade_aluno(item.nome, item.passaporte)
+        self._identidades[item.id] = identidade
+        for chave in identidade.blocos:
+            self._blocos.setdefault(chave, set()).add(item.id)
+
+    def _desindexar(self, aluno_id: int):
+        identidade = self._identidades.pop(aluno_id, None)
+        if identidade is not None:
+            for chave in identidade.blocos:
+                ids = self._blocos.get(chave)
+                if ids is not None:
+                    ids.discard(aluno_id)
+                    if not ids:
+                        del self._blocos[chave]
+
+    def _garantir_blocos(self):
+        self._garantir()
+        if self._blocos is None:
+            self._identidades, self._blocos = {}, {}
+            for item in self._itens.values():
+                self._indexar(item)
+
+    def _garantir(self):
+        if self._itens is None:
+            self._carregar()
+            return
+        with roteador.engine(self.escola).connect() as conn:
+            ultimo = conn.execute(select(func.max(Mudanca.seq))).scalar() or 0
+            if ultimo == self._versao:
+                return
+            mudancas = [] if ultimo < self._versao else conn.execute(
+                stmt_mudancas(self._versao, ["alunos"], ultimo).limit(self.MAX_MUDANCAS_APLICADAS + 1)
+            ).all()
+        if ultimo < self._versao or len(mudancas) > self.MAX_MUDANCAS_APLICADAS:
+            self._carregar()  # banco restaurado/trocado, ou carga grande em outro processo
+            return
+        for mudanca in mudancas:
+            if mudanca.operacao == "D":
+                self._tirar(mudanca.registro_id)
+            else:
+                dados = json.loads(mudanca.dados)
+                self._guardar(ItemDiretorio(dados["id"], dados["nome"], dados["passaporte"], dados["serie"]))
+        self._versao = ultimo
+
+    def itens(self):
+        with self._lock:
+            self._garantir()
+            return list(self._itens.values())
+
+    def obter(self, aluno_id: int):
+        with self._lock:
+            self._garantir()
+            return self._itens.get(aluno_id)
+
+    def obter_por_passaporte(self, passaporte: str):
+        with self._lock:
+            self._garantir()
+            aluno_id = self._por_passaporte.get(passaporte)
+            return self._itens.get(aluno_id) if aluno_id is not None else None
+
+    def buscar(self, termo: str, limite: int = 20):
+        """Alunos cujo nome/passaporte tem palavras começando com os termos (sem acentos), ou o ID exato."""
+        termos = [" " + t for t in _normalizar_busca(termo).split()]
+        if not termos:
+            return []
+        with self._lock:
+            self._garantir()
+            resultado = []
+            if len(termos) == 1 and termos[0][1:].isdigit() and int(termos[0]) in self._itens:
+                resultado.append(self._itens[int(termos[0])])
+            for aluno_id, chave in self._chaves.items():
+                if all(t in chave for t in termos) and (not resultado or resultado[0].id != aluno_id):
+                    resultado.append(self._itens[aluno_id])
+                    if len(resultado) >= limite:
+                        break
+            return resultado
+
+    def vizinhos(self, identidade, limite_bloco: int = None):
+        """[(ItemDiretorio, Identidade)] dos alunos que dividem algum bloco com `identidade`."""
+        with self._lock:
+            self._garantir_blocos()
+            ids = set()
+            for chave in identidade.blocos:
+                bloco = self._blocos.get(chave, ())
+                if not limite_bloco or len(bloco) <= limite_bloco or chave.startswith("p:"):
+                    ids.update(bloco)
+            return [(self._itens[i], self._identidades[i]) for i in ids]
+
+    def blocos(self):
+        """Cópia de (itens, identidades, [ids de cada bloco com 2+ alunos]) para a busca em lote."""
+        with self._lock:
+            self._garantir_blocos()
+            blocos = [(chave, tuple(ids)) for chave, ids in self._blocos.items() if len(ids) > 1]
+            return dict(self._itens), dict(self._identidades), blocos
+
+    def atualizar(self, aluno):
+        with self._lock:
+            if self._itens is not None:
+                self._guardar(ItemDiretorio(aluno.id, aluno.nome, aluno.passaporte, aluno.serie))
+
+    def _tirar(self, aluno_id: int):
+        item = self._itens.pop(aluno_id, None)
+        self._chaves.pop(aluno_id, None)
+        if item is not None and item.passaporte and self._por_passaporte.get(item.passaporte) == aluno_id:
+            self._por_passaporte.pop(item.passaporte, None)
+        if self._blocos is not None:
+            self._desindexar(aluno_id)
+
+    def remover(self, aluno_id: int):
+        with self._lock:
+            if self._itens is not None:
+                self._tirar(aluno_id)
+
+    def invalidar(self):
+        with self._lock:
+            self._itens = self._chaves = self._por_passaporte = None
+            self._identidades = self._blocos = self._versao = None
+
+
+class DiretoriosEscolas:
+    """Um DiretorioAlunos por escola; cada método atua no diretório da escola atual."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._por_escola = {}
+
+    def da_escola(self, escola: str = None) -> DiretorioAlunos:
+        escola = escola or escola_atual()
+        with self._lock:
+            if escola not in self._por_escola:
+                self._por_escola[escola] = DiretorioAlunos(escola)
+            return self._por_escola[escola]
+
+    def itens(self):
+        return self.da_escola().itens()
+
+    def obter(self, aluno_id: int):
+        return self.da_escola().obter(aluno_id)
+
+    def obter_por_passaporte(self, passaporte: str):
+        return self.da_escola().obter_por_passaporte(passaporte)
+
+    def buscar(self, termo: str, limite: int = 20):
+        return self.da_escola().buscar(termo, limite)
+
+    def vizinhos(self, identidade, limite_bloco: int = None):
+        return self.da_escola().vizinhos(identidade, limite_bloco)
+
+    def blocos(self):
+        return self.da_escola().blocos()
+
+    def atualizar(self, aluno):
+        self.da_escola().atualizar(aluno)
+
+    def remover(self, aluno_id: int):
+        self.da_escola().remover(aluno_id)
+
+    def invalidar(self, todas: bool = False):
+        if todas:
+            with self._lock:
+                self._por_escola = {}
+        else:
+            self.da_escola().invalidar()
+
+
+diretorio_alunos = DiretoriosEscolas()
+
+
+# -------- Duplicados (o mesmo aluno cadastrado duas vezes) --------
+# Cada aluno ganha chaves de bloco: o passaporte normalizado, o "esqueleto" fonético do
+# nome inteiro (sem ordem) e o de cada par de palavras do nome. Só alunos que dividem
+# um bloco são comparados, então a busca não é O(n²); blocos maiores que LIMITE_BLOCO
+# (sobrenomes muito comuns, por exemplo) são ignorados, menos os de passaporte.
+LIMITE_BLOCO = 100
+LIMIAR_DUPLICADO = 0.85
+_PARTICULAS_NOME = {"de", "da", "do", "das", "dos", "del", "la", "las", "los", "y", "e", "van", "von", "der", "di", "du", "le"}
+_TRANSLITERAR = str.maketrans({"ø": "o", "ł": "l", "ß": "ss", "æ": "ae", "œ": "oe", "đ": "d", "ı": "i", "þ": "th"})
+_FONETICA = str.maketrans({"k": "c", "q": "c", "z": "s", "x": "s", "w": "v", "y": "i", "j": "g"})
+_NAO_ALFANUMERICO = re.compile(r"[^0-9A-Z]")
+_PALAVRA = re.compile(r"[a-z0-9]+")
+_VOGAIS = re.compile(r"[aeiou]")
+_REPETIDAS = re.compile(r"(.)\1+")
+
+Identidade = namedtuple("Identidade", ["palavras", "trigramas", "passaporte", "blocos"])
+ParDuplicado = namedtuple("ParDuplicado", ["aluno_a", "aluno_b", "pontuacao", "motivo"])
+
+
+def chave_passaporte(passaporte: str) -> str:
+    """Passaporte comparável: só letras e dígitos, maiúsculas ("ab 123.456-7" -> "AB1234567")."""
+    return _NAO_ALFANUMERICO.sub("", _sem_acentos((passaporte or "").upper()))
+
+
+@functools.lru_cache(maxsize=65536)
+def _normalizar_palavra(palavra: str):
+    texto = _sem_acentos(palavra.lower().translate(_TRANSLITERAR))
+    return tuple(p for p in _PALAVRA.findall(texto) if p not in _PARTICULAS_NOME)
+
+
+def _palavras_nome(nome: str):
+    # nomes repetem muito as mesmas palavras: normaliza cada uma uma vez só (cache)
+    return [p for palavra in (nome or "").split() for p in _normalizar_palavra(palavra)]
+
+
+@functools.lru_cache(maxsize=65536)
+def _esqueleto(palavra: str) -> str:
+    # primeira letra + consoantes, com grafias parecidas unificadas: gonzalez/gonsales -> gnsls
+    palavra = palavra.replace("ph", "f").replace("th", "t").replace("h", "").translate(_FONETICA)
+    if not palavra:
+        return ""
+    return _REPETIDAS.sub(r"\1", palavra[0] + _VOGAIS.sub("", palavra[1:]))[:6]
+
+
+@functools.lru_cache(maxsize=65536)
+def _trigramas(palavra: str) -> frozenset:
+    marcada = f" {palavra} "
+    return frozenset(marcada[i:i + 3] for i in range(len(marcada) - 2))
+
+
+def identidade_aluno(nome: str, passaporte: str = None) -> Identidade:
+    palavras = _palavras_nome(nome)
+    esqueletos = sorted({e for e in map(_esqueleto, palavras) if e})
+    blocos = [f"t:{a} {b}" for i, a in enumerate(esqueletos) for b in esqueletos[i + 1:]]
+    if esqueletos:
+        blocos.append("n:" + " ".join(esqueletos))
+    chave = chave_passaporte(passaporte) if passaporte else ""
+    if len(chave) >= 5:
+        blocos.append("p:" + chave)
+    trigramas = frozenset().union(*map(_trigramas, palavras))
+    return Identidade(frozenset(palavras), trigramas, chave, frozenset(blocos))
+
+
+def _comparar_identidades(a: Identidade, b: Identidade, limiar: float = LIMIAR_DUPLICADO):
+    """(pontuação 0-1, motivo) se `a` e `b` parecem o mesmo aluno; senão None.
+
+    Nome: coeficiente de Dice dos trigramas das palavras (ordem e acentos não contam).
+    """
+    if a.passaporte and a.passaporte == b.passaporte:
+        return 1.0, "mesmo passaporte"
+    if not a.trigramas or not b.trigramas:
+        return None
+    if a.palavras == b.palavras:
+        nome, motivo = 1.0, "mesmo nome"
+    elif len(a.palavras) >= 2 and len(b.palavras) >= 2 and (a.palavras <= b.palavras or b.palavras <= a.palavras):
+        nome, motivo = 0.9, "nome contido no outro"
+    else:
+        nome = 2 * len(a.trigramas & b.trigramas) / (len(a.trigramas) + len(b.trigramas))
+        motivo = "nome parecido"
+    if nome < limiar:
+        return None
+    if a.passaporte and b.passaporte:
+        # passaportes diferentes: só é o mesmo aluno se a diferença parecer erro de digitação
+        if not _uma_edicao(a.passaporte, b.passaporte):
+            return None
+        return round(nome * 0.95, 3), motivo + ", passaporte parecido"
+    return round(nome, 3), motivo
+
+
+def _uma_edicao(a: str, b: str) -> bool:
+    """True se `b` sai de `a` com no máximo uma troca, inclusão, exclusão ou inversão de vizinhos."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    inicio = 0
+    while inicio < min(len(a), len(b)) and a[inicio] == b[inicio]:
+        inicio += 1
+    resto_a, resto_b = a[inicio:], b[inicio:]
+    return (
+        resto_a[1:] == resto_b[1:] or resto_a[1:] == resto_b or resto_a == resto_b[1:]
+        or (resto_a[:2] == resto_b[1::-1] and resto_a[2:] == resto_b[2:])
+    )
+
+
+def possiveis_duplicados(nome: str, passaporte: str = None, ignorar_id: int = None,
+                         limiar: float = LIMIAR_DUPLICADO):
+    """Alunos já cadastrados (da escola atual) que parecem ser esta pessoa: [ParDuplicado], mais provável primeiro.
+
+    aluno_a é o próprio (nome, passaporte) pedido, como ItemDiretorio com id None (ou `ignorar_id`).
+    """
+    identidade = identidade_aluno(nome, passaporte)
+    consulta = ItemDiretorio(ignorar_id, nome, passaporte, None)
+    pares = []
+    for item, outra in diretorio_alunos.vizinhos(identidade, LIMITE_BLOCO):
+        if item.id == ignorar_id:
+            continue
+        resultado = _comparar_identidades(identidade, outra, limiar)
+        if resultado:
+            pares.append(ParDuplicado(consulta, item, *resultado))
+    pares.sort(key=lambda p: (-p.pontuacao, p.aluno_b.id))
+    return pares
+
+
+def encontrar_duplicados(limiar: float = LIMIAR_DUPLICADO, limite_bloco: int = LIMITE_BLOCO):
+    """Pares de alunos da escola atual que parecem a mesma pessoa: [ParDuplicado], mais provável primeiro.
+
+    Compara só alunos do mesmo bloco (ver identidade_aluno), a partir do diretório em
+    memória: não lê o banco além da carga do diretório.
+    """
+    itens, identidades, blocos = diretorio_alunos.blocos()
+    vistos, pares = set(), []
+    for chave, ids in blocos:
+        if len(ids) > limite_bloco and not chave.startswith("p:"):
+            continue
+        for a, b in combinations(sorted(ids), 2):
+            if (a, b) in vistos:
+                continue
+            vistos.add((a, b))
+            resultado = _comparar_identidades(identidades[a], identidades[b], limiar)
+            if resultado:
+                pares.append(ParDuplicado(itens[a], itens[b], *resultado))
+    pares.sort(key=lambda p: (-p.pontuacao, p.aluno_a.id, p.aluno_b.id))
+    return pares
+
+
+def mesclar_alunos(manter_id: int, remover_id: int):
+    """Junta o aluno `remover_id` em `manter_id` e o exclui; retorna {"presencas", "arquivadas"} movidas.
+
+    As presenças (também as dos anos arquivados) passam para `manter_id`, o resumo diário
+    dos dias afetados é recalculado e os campos vazios de `manter_id` recebem os valores
+    do outro cadastro. No log de mudanças aparecem como U das presenças e D do aluno.
+    """
+    if manter_id == remover_id:
+        raise ValueError("escolha dois alunos diferentes")
+    with engine_atual().connect() as conn:
+        arquivos = _anos_arquivados(conn)
+        rodadas = _rodadas_de_arquivos(arquivos)
+        _anexar_arquivos(conn, rodadas[0])  # antes da primeira escrita: ATTACH não roda dentro de transação
+        linhas = {linha.id: linha for linha in conn.execute(
+            select(*COLUNAS_ALUNO).where(Aluno.id.in_([manter_id, remover_id]))
+        )}
+        if len(linhas) != 2:
+            raise ValueError("aluno não encontrado")
+        manter, remover = linhas[manter_id], linhas[remover_id]
+        vazios = {
+            chave: getattr(remover, chave) for chave in _COLUNAS_EDITAVEIS
+            if getattr(manter, chave) in (None, "") and getattr(remover, chave) not in (None, "")
+        }
+        if vazios:
+            conn.execute(update(Aluno).where(Aluno.id == manter_id).values(vazios))
+        dias = conn.execute(select(PresencaDiaria.data).where(PresencaDiaria.aluno_id == remover_id)).scalars().all()
+        movidas = conn.execute(
+            update(Presenca).where(Presenca.aluno_id == remover_id).values(aluno_id=manter_id)
+        ).rowcount
+        conn.execute(delete(PresencaDiaria).where(PresencaDiaria.aluno_id == remover_id))
+        # cada rodada move os anos arquivados que anexou e recalcula os dias desses anos; o
+        # aluno removido só sai na última, então uma mescla interrompida pode ser refeita
+        anos_arquivados = {ano for ano, _ in arquivos}
+        arquivadas = 0
+        for n, rodada in enumerate(rodadas):
+            if n:
+                conn.commit()
+                _anexar_arquivos(conn, rodada)
+            anos = {ano for ano, _ in rodada}
+            for ano in sorted(anos):
+                tabela = _tabela_arquivo(ano)
+                arquivadas += conn.execute(
+                    tabela.update().where(tabela.c.aluno_id == remover_id).values(aluno_id=manter_id)
+                ).rowcount
+            pares = {(manter_id, dia) for dia in dias if dia.year in anos or (n == 0 and dia.year not in anos_arquivados)}
+            atualizar_presenca_diaria(conn, pares, origem=_origem_presencas(rodada))
+        conn.execute(delete(Aluno).where(Aluno.id == remover_id))
+        conn.commit()
+        atualizado = conn.execute(select(*COLUNAS_ALUNO).where(Aluno.id == manter_id)).first()
+    diretorio_alunos.remover(remover_id)
+    diretorio_alunos.atualizar(AlunoDTO._make(atualizado))
+    return {"presencas": movidas, "arquivadas": arquivadas}
+
+
+# -------- Importação em lote --------
+# Cabeçalhos aceitos na planilha (sem acento, minúsculos) -> coluna de Aluno.
+# Inclui os cabeçalhos usados na exportação de Relatórios.
+_COLUNAS_IMPORTACAO = {
+    "nome": "nome", "nome completo": "nome",
+    "idade": "idade",
+    "pais": "pais", "pais de origem": "pais",
+    "passaporte": "passaporte", "documento": "passaporte", "passaporte / documento": "passaporte",
+    "serie": "serie", "serie / ano": "serie",
+    "data entrada": "data_entrada", "data_entrada": "data_entrada", "data de entrada": "data_entrada",
+    "responsavel": "responsavel",
+    "observacoes": "observacoes",
+}
+
+
+def _sem_acentos(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+
+
+def _ler_linhas_importacao(arquivo, nome_arquivo: str):
+    """Gera dicts (cabeçalho -> valor) lendo CSV ou XLSX em streaming."""
+    if nome_arquivo.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            linhas = wb.active.iter_rows(values_only=True)
+            cabecalho = next(linhas, None) or ()
+            for valores in linhas:
+                yield dict(zip(cabecalho, valores))
+        finally:
+            wb.close()
+    else:
+        binario = open(arquivo, "rb") if isinstance(arquivo, str) else arquivo
+        texto = io.TextIOWrapper(binario, encoding=_codificacao_csv(binario), newline="")
+        try:
+            amostra = texto.read(4096)
+            texto.seek(0)
+            try:
+                dialeto = csv.Sniffer().sniff(amostra, delimiters=",;\t") if amostra else csv.excel
+            except csv.Error:  # uma coluna só (ou nenhum delimitador reconhecível na amostra)
+                dialeto = csv.excel
+            yield from csv.DictReader(texto, dialect=dialeto)
+        finally:
+            if isinstance(arquivo, str):
+                texto.close()
+            else:
+                texto.detach()  # não fecha o arquivo do chamador
+
+
+def _codificacao_csv(binario) -> str:
+    """utf-8-sig se o arquivo inteiro é UTF-8 válido; senão cp1252 (o "CSV" do Excel no Windows em português).
+
+    Lê o arquivo uma vez em blocos (sem guardá-lo) e volta à posição inicial.
+    """
+    inicio = binario.tell()
+    decodificador = codecs.getincrementaldecoder("utf-8")()
+    try:
+        for bloco in iter(lambda: binario.read(1 << 16), b""):
+            decodificador.decode(bloco)
+        decodificador.decode(b"", final=True)
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "cp1252"
+    finally:
+        binario.seek(inicio)
+
+
+@functools.lru_cache(maxsize=256)
+def _coluna_importacao(cabecalho):
+    if cabecalho is None:
+        return None
+    return _COLUNAS_IMPORTACAO.get(_sem_acentos(str(cabecalho)).strip().lower())
+
+
+def _converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    texto = str(valor)
+    try:
+        if "/" in texto:  # dd/mm/aaaa
+            dia, mes, ano = texto.split("/")
+            return date(int(ano), int(mes), int(dia))
+        return date.fromisoformat(texto[:10])
+    except ValueError:
+        raise ValueError(f"data de entrada inválida: {valor!r}")
+
+
+def _validar_linha_importacao(bruta: dict):
+    """Converte uma linha da planilha em dados de Aluno; levanta ValueError se inválida."""
+    dados = {}
+    for cabecalho, valor in bruta.items():
+        coluna = _coluna_importacao(cabecalho)
+        if coluna:
+            if isinstance(valor, str):
+                valor = valor.strip() or None
+            dados[coluna] = valor
+
+    if not dados.get("nome"):
+        raise ValueError("nome obrigatório")
+    dados["nome"] = str(dados["nome"])
+    if dados.get("idade") is not None:
+        try:
+            dados["idade"] = int(float(dados["idade"]))
+        except (TypeError, ValueError):
+            raise ValueError(f"idade inválida: {dados['idade']!r}")
+        if not 1 <= dados["idade"] <= 120:
+            raise ValueError(f"idade fora do intervalo: {dados['idade']}")
+    if dados.get("data_entrada") is not None:
+        dados["data_entrada"] = _converter_data(dados["data_entrada"])
+    for coluna in ("pais", "passaporte", "serie", "responsavel", "observacoes"):
+        if dados.get(coluna) is not None:
+            dados[coluna] = str(dados[coluna])
+    return dados
+
+
+def importar_alunos(arquivo, nome_arquivo: str = None, lote: int = 5000):
+    """Importa alunos de CSV/XLSX em lotes, cada lote numa única transação (executemany).
+
+    Linhas com passaporte já cadastrado (ou repetido no arquivo) são ignoradas.
+    Retorna um resumo com inseridos, duplicados, erros [(linha, mensagem)] e linhas/s;
+    um arquivo que deixa de ser legível no meio entra em erros e as linhas lidas até ali
+    são gravadas.
+    """
+    nome_arquivo = nome_arquivo or (arquivo if isinstance(arquivo, str) else getattr(arquivo, "name", ""))
+    inicio = time.perf_counter()
+    resumo = {"lidas": 0, "inseridos": 0, "duplicados": 0, "erros": []}
+    vistos = set()
+
+    def gravar(pendentes):
+        passaportes = {d["passaporte"] for _, d in pendentes if d.get("passaporte")}
+        with engine_atual().begin() as conn:
+            existentes = set()
+            if passaportes:
+                existentes = set(conn.execute(
+                    select(Aluno.passaporte).where(Aluno.passaporte.in_(passaportes))
+                ).scalars())
+            novos = []
+            for _, d in pendentes:
+                if d.get("passaporte") in existentes:
+                    resumo["duplicados"] += 1
+                else:
+                    novos.append(d)
+            if novos:
+                conn.execute(insert(Aluno), novos)
+            resumo["inseridos"] += len(novos)
+
+    pendentes = []
+    numero = 1
+    try:
+        try:
+            for numero, bruta in enumerate(_ler_linhas_importacao(arquivo, nome_arquivo), start=2):
+                if not any(v not in (None, "") for v in bruta.values()):
+                    continue  # linha em branco
+                resumo["lidas"] += 1
+                try:
+                    dados = _validar_linha_importacao(bruta)
+                except ValueError as e:
+                    resumo["erros"].append((numero, str(e)))
+                    continue
+                passaporte = dados.get("passaporte")
+                if passaporte:
+                    if passaporte in vistos:
+                        resumo["duplicados"] += 1
+                        continue
+                    vistos.add(passaporte)
+                pendentes.append((numero, dados))
+                if len(pendentes) >= lote:
+                    gravar(pendentes)
+                    pendentes = []
+        except (UnicodeDecodeError, csv.Error) as e:
+            resumo["erros"].append((numero + 1, f"arquivo ilegível a partir desta linha: {e}"))
+        if pendentes:
+            gravar(pendentes)
+    finally:
+        # lotes já gravados valem mesmo se um lote seguinte falhar
+        if resumo["inseridos"]:
+            diretorio_alunos.invalidar()
+            _otimizar_estatisticas()
+    resumo["segundos"] = time.perf_counter() - inicio
+    resumo["linhas_por_segundo"] = resumo["lidas"] / resumo["segundos"] if resumo["segundos"] else 0.0
+    return resumo
+
+
 # -------- Presença --------
 def registrar_presenca_entrada(aluno_id: int, quando: datetime = None, observacao: str = None):
     session = SessionLocal()
@@ -151,6 +1425,8 @@ def registrar_presenca_entrada(aluno_id: int, quando: datetime = None, observaca
         agora = quando or datetime.now()
         pres = Presenca(aluno_id=aluno_id, data=agora.date(), hora_entrada=agora, observacao=observacao)
         session.add(pres)
+        session.flush()
+        atualizar_presenca_diaria(session, [(aluno_id, pres.data)])
         session.commit()
         session.refresh(pres)
         return pres
@@ -165,6 +1441,8 @@ def registrar_presenca_saida(presenca_id: int, quando: datetime = None):
         if not pres:
             return None
         pres.hora_saida = quando or datetime.now()
+        session.flush()
+        atualizar_presenca_diaria(session, [(pres.aluno_id, pres.data)])
         session.commit()
         session.refresh(pres)
         return pres
@@ -172,29 +1450,870 @@ def registrar_presenca_saida(presenca_id: int, quando: datetime = None):
         session.close()
 
 
-def listar_presencas(aluno_id: int = None, data_inicio: date = None, data_fim: date = None):
+def stmt_fechar_presenca_aberta(aluno_id: int, quando: datetime = None):
+    # só a entrada do próprio dia: uma esquecida aberta ontem não recebe a saída de hoje
+    # (essas são fechadas à parte, por fechar_presencas_abertas_anteriores)
+    quando = quando or datetime.now()
+    aberta = (
+        select(Presenca.id)
+        .where(Presenca.aluno_id == aluno_id, Presenca.hora_saida.is_(None), Presenca.data == quando.date())
+        .order_by(Presenca.hora_entrada.desc(), Presenca.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return update(Presenca).where(Presenca.id == aberta).values(hora_saida=quando)
+
+
+def registrar_presenca_saida_por_aluno(aluno_id: int, quando: datetime = None):
+    """Fecha a entrada aberta mais recente do aluno no dia com um único UPDATE; None se não houver."""
     session = SessionLocal()
     try:
-        q = session.query(Presenca)
-        if aluno_id:
-            q = q.filter(Presenca.aluno_id == aluno_id)
-        if data_inicio:
-            q = q.filter(Presenca.data >= data_inicio)
-        if data_fim:
-            q = q.filter(Presenca.data <= data_fim)
-        return q.order_by(Presenca.data.desc(), Presenca.hora_entrada.desc()).all()
+        stmt = stmt_fechar_presenca_aberta(aluno_id, quando)
+        pres = session.scalars(stmt.returning(Presenca)).first()
+        if pres is not None:
+            session.expunge(pres)  # já veio completo do RETURNING; evita o refresh pós-commit
+            atualizar_presenca_diaria(session, [(pres.aluno_id, pres.data)])
+        session.commit()
+        return pres
     finally:
         session.close()
 
 
-# -------- Usuários --------
-def criar_usuario(username: str, password: str, role: str = "user"):
-    session = SessionLocal()
+SAIDA_NAO_REGISTRADA = "saída não registrada"
+
+
+def fechar_presencas_abertas_anteriores(antes_de: date = None):
+    """Fecha as entradas que ficaram sem saída em dias anteriores a `antes_de` (padrão: hoje).
+
+    A hora da saída não é conhecida: a presença fecha com saída = entrada (conta como
+    presente, sem tempo na escola) e a observação ganha a marca SAIDA_NAO_REGISTRADA.
+    Retorna quantas presenças foram fechadas.
+    """
+    observacao = func.coalesce(Presenca.observacao + " | ", "") + SAIDA_NAO_REGISTRADA
+    stmt = (
+        update(Presenca)
+        .where(Presenca.hora_saida.is_(None), Presenca.hora_entrada.isnot(None), Presenca.data < (antes_de or date.today()))
+        .values(hora_saida=Presenca.hora_entrada, observacao=observacao)
+        .returning(Presenca.aluno_id, Presenca.data)
+    )
+    session = SessionLocal()
+    try:
+        fechadas = session.execute(stmt).all()
+        atualizar_presenca_diaria(session, {(aluno_id, dia) for aluno_id, dia in fechadas})
+        session.commit()
+        return len(fechadas)
+    finally:
+        session.close()
+
+
+def listar_presentes(dia: date = None):
+    """Quem está na escola agora: alunos com entrada aberta (sem saída) no dia (padrão: hoje)."""
+    session = SessionLocal()
+    try:
+        return session.execute(stmt_presentes(dia)).all()
+    finally:
+        session.close()
+
+
+def stmt_presentes(dia: date = None):
+    return (
+        select(Aluno.id, Aluno.nome, Aluno.serie, func.max(Presenca.hora_entrada).label("hora_entrada"))
+        .join(Presenca, Presenca.aluno_id == Aluno.id)
+        .where(Presenca.hora_saida.is_(None), Presenca.hora_entrada.isnot(None), Presenca.data == (dia or date.today()))
+        .group_by(Aluno.id, Aluno.nome, Aluno.serie)
+        .order_by(Aluno.nome)
+    )
+
+
+def _filtrar_presencas(q, aluno_id: int = None, data_inicio: date = None, data_fim: date = None, tabela=None):
+    c = (Presenca.__table__ if tabela is None else tabela).c
+    if aluno_id:
+        q = q.filter(c.aluno_id == aluno_id)
+    if data_inicio:
+        q = q.filter(c.data >= data_inicio)
+    if data_fim:
+        q = q.filter(c.data <= data_fim)
+    return q
+
+
+def _colunas_presenca(tabela):
+    return select(*(tabela.c[nome] for nome in PresencaDTO._fields))
+
+
+def _presencas_do_periodo(conn, montar, aluno_id: int = None, data_inicio: date = None, data_fim: date = None,
+                          cursor: tuple = None):
+    """SELECT das presenças filtradas; une (UNION ALL) os anos arquivados só se o período os alcança.
+
+    `montar(tabela)` devolve o SELECT base para uma tabela de presenças (a quente ou a de
+    um arquivo anual). Retorna (stmt, colunas para ORDER BY). O período precisa caber nos
+    anexos: quem pode receber qualquer período consulta por _trechos_do_periodo.
+    """
+    tabelas = [Presenca.__table__]
+    arquivos = _anos_arquivados(conn, data_inicio, data_fim)
+    if arquivos:
+        _anexar_arquivos(conn, arquivos)
+        tabelas += [_tabela_arquivo(ano) for ano, _ in arquivos]
+    partes = []
+    for tabela in tabelas:
+        parte = _filtrar_presencas(montar(tabela), aluno_id, data_inicio, data_fim, tabela=tabela)
+        if cursor is not None:
+            parte = parte.where(_apos_cursor_presenca(cursor, tabela))
+        partes.append(parte)
+    if len(partes) == 1:
+        return partes[0], Presenca.__table__.c
+    uniao = union_all(*partes).subquery("presencas")
+    return select(uniao), uniao.c
+
+
+def listar_presencas(aluno_id: int = None, data_inicio: date = None, data_fim: date = None):
+    session = SessionLocal()
+    try:
+        conn = session.connection()
+        presencas = []
+        # trechos do mais recente ao mais antigo: a concatenação já sai em data decrescente
+        for inicio, fim in reversed(_trechos_do_periodo(conn, data_inicio, data_fim)):
+            stmt, c = _presencas_do_periodo(conn, _colunas_presenca, aluno_id, inicio, fim)
+            stmt = stmt.order_by(c.data.desc(), c.hora_entrada.desc())
+            presencas += [PresencaDTO._make(linha) for linha in session.execute(stmt)]
+        return presencas
+    finally:
+        session.close()
+
+
+def _apos_cursor_presenca(cursor, tabela=None):
+    # cursor = (data, hora_entrada, id) da última linha da página anterior, em ordem decrescente.
+    # No SQLite NULL é o menor valor, então hora_entrada nula vem por último no DESC.
+    c = (Presenca.__table__ if tabela is None else tabela).c
+    data, hora_entrada, pres_id = cursor
+    if hora_entrada is None:
+        mesmo_dia = and_(c.hora_entrada.is_(None), c.id < pres_id)
+    else:
+        mesmo_dia = or_(
+            c.hora_entrada < hora_entrada,
+            c.hora_entrada.is_(None),
+            and_(c.hora_entrada == hora_entrada, c.id < pres_id),
+        )
+    return or_(c.data < data, and_(c.data == data, mesmo_dia))
+
+
+def listar_presencas_pagina(aluno_id: int = None, data_inicio: date = None, data_fim: date = None,
+                            tamanho: int = 50, cursor: tuple = None):
+    """Uma página de presenças em (data, hora_entrada, id) decrescente; devolve (presencas, proximo_cursor ou None)."""
+    session = SessionLocal()
+    try:
+        conn = session.connection()
+        presencas = []
+        for inicio, fim in reversed(_trechos_do_periodo(conn, data_inicio, data_fim)):
+            if cursor is not None and inicio is not None and inicio > cursor[0]:
+                continue  # trecho inteiro depois do cursor: já saiu em páginas anteriores
+            stmt, c = _presencas_do_periodo(conn, _colunas_presenca, aluno_id, inicio, fim, cursor=cursor)
+            stmt = stmt.order_by(c.data.desc(), c.hora_entrada.desc(), c.id.desc())
+            presencas += [PresencaDTO._make(linha) for linha in session.execute(stmt.limit(tamanho + 1 - len(presencas)))]
+            if len(presencas) > tamanho:
+                break
+        if len(presencas) > tamanho:
+            presencas = presencas[:tamanho]
+            ultima = presencas[-1]
+            return presencas, (ultima.data, ultima.hora_entrada, ultima.id)
+        return presencas, None
+    finally:
+        session.close()
+
+
+# -------- Modo quiosque (fila de presenças com gravação em lote) --------
+def resolver_aluno(codigo: str):
+    """Localiza o aluno pelo passaporte ou, se numérico, pelo ID (leitor de crachá / digitação)."""
+    codigo = (codigo or "").strip()
+    if not codigo:
+        return None
+    aluno = diretorio_alunos.obter_por_passaporte(codigo)
+    if aluno is None and codigo.isdigit():
+        aluno = diretorio_alunos.obter(int(codigo))
+    return aluno
+
+
+class FilaPresencas:
+    """Fila em memória de entradas gravadas por uma thread em transações em lote.
+
+    registrar_entrada() só enfileira (não toca o banco); a thread grava a cada
+    `intervalo` segundos ou quando `tamanho_lote` entradas se acumulam.
+    esvaziar() espera até tudo o que foi enfileirado estar gravado e parar()
+    grava o restante antes de encerrar (também chamado no atexit). Grava no
+    banco de `escola` (padrão: a escola atual ao criar a fila).
+
+    Um lote que falha é tentado de novo até gravar; depois de parar(), só
+    TENTATIVAS_AO_PARAR vezes, e o que sobrar vai para o log como perdido.
+    """
+
+    TENTATIVAS_AO_PARAR = 3
+    _PARAR = object()  # acorda a thread que espera na fila
+
+    def __init__(self, intervalo: float = 0.5, tamanho_lote: int = 500, escola: str = None):
+        self.escola = escola or escola_atual()
+        self.intervalo = intervalo
+        self.tamanho_lote = tamanho_lote
+        self.gravadas = 0
+        self._fila = queue.Queue()
+        self._parando = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="fila-presencas", daemon=True)
+        self._thread.start()
+
+    def registrar_entrada(self, aluno_id: int, quando: datetime = None, observacao: str = None):
+        if self._parando.is_set():
+            raise RuntimeError("fila de presenças encerrada")
+        agora = quando or datetime.now()
+        self._fila.put({"aluno_id": aluno_id, "data": agora.date(), "hora_entrada": agora, "observacao": observacao})
+        return agora
+
+    @property
+    def pendentes(self) -> int:
+        return self._fila.unfinished_tasks
+
+    def esvaziar(self):
+        self._fila.join()
+
+    def parar(self):
+        if not self._parando.is_set():
+            self._parando.set()
+            self._fila.put(self._PARAR)
+            self._thread.join()
+
+    def _coletar(self):
+        lote = []
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamanho_lote:
+            restante = limite - time.monotonic()
+            try:
+                if restante > 0 and not self._parando.is_set():
+                    item = self._fila.get(timeout=restante)
+                else:
+                    item = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._PARAR:
+                self._fila.task_done()  # daqui em diante _parando está ligado: só drena o que já está na fila
+            else:
+                lote.append(item)
+        return lote
+
+    def _executar(self):
+        while not (self._parando.is_set() and self._fila.empty()):
+            lote = self._coletar()
+            if not lote:
+                continue
+            self._gravar(lote)
+            for _ in lote:
+                self._fila.task_done()
+
+    def _gravar(self, lote):
+        pendentes, falhas = lote, 0
+        while pendentes:
+            try:
+                with roteador.engine(self.escola).begin() as conn:
+                    conn.execute(insert(Presenca), pendentes)
+                    atualizar_presenca_diaria(conn, {(p["aluno_id"], p["data"]) for p in pendentes})
+                self.gravadas += len(pendentes)
+                return
+            except IntegrityError:
+                # aluno excluído depois de enfileirado: descarta só as entradas dele
+                validas = self._de_alunos_existentes(pendentes)
+                if len(validas) < len(pendentes):
+                    pendentes = validas
+                    continue
+                logger.exception("falha ao gravar %d presença(s)", len(pendentes))
+            except Exception:
+                # mantém o lote e tenta de novo (ex.: "database is locked")
+                logger.exception("falha ao gravar %d presença(s)", len(pendentes))
+            falhas += 1
+            if self._parando.is_set() and falhas >= self.TENTATIVAS_AO_PARAR:
+                logger.error("fila encerrada: %d presença(s) perdidas depois de %d tentativas: %s",
+                             len(pendentes), falhas, pendentes)
+                return
+            time.sleep(min(self.intervalo, 1.0))
+
+    def _de_alunos_existentes(self, lote):
+        ids = {p["aluno_id"] for p in lote}
+        with roteador.engine(self.escola).connect() as conn:
+            existentes = set(conn.execute(select(Aluno.id).where(Aluno.id.in_(ids))).scalars())
+        if ids - existentes:
+            logger.warning("descartando entradas de aluno(s) inexistente(s): %s", sorted(ids - existentes))
+        return [p for p in lote if p["aluno_id"] in existentes]
+
+
+_filas_presencas = {}
+_fila_presencas_lock = threading.Lock()
+
+
+def obter_fila_presencas(intervalo: float = 0.5, tamanho_lote: int = 500, escola: str = None):
+    """Fila única por escola no processo (compartilhada entre as sessões do Streamlit)."""
+    escola = escola or escola_atual()
+    with _fila_presencas_lock:
+        if escola not in _filas_presencas:
+            fila = FilaPresencas(intervalo=intervalo, tamanho_lote=tamanho_lote, escola=escola)
+            atexit.register(fila.parar)
+            _filas_presencas[escola] = fila
+        return _filas_presencas[escola]
+
+
+# -------- Resumo diário de presença (rollup) --------
+# Recalcula as linhas de presenca_diaria a partir das presenças do(s) aluno(s)/dia(s).
+# Minutos = soma das sessões fechadas; julianday entende o formato gravado pelo SQLAlchemy.
+# Presenças de alunos já excluídos (bancos antigos, sem chave estrangeira ativa) ficam de
+# fora: o resumo tem chave estrangeira para alunos.
+_SQL_PRESENCA_DIARIA = """
+INSERT INTO presenca_diaria (aluno_id, data, primeira_entrada, ultima_saida, minutos, presente)
+SELECT aluno_id, data, MIN(hora_entrada), MAX(hora_saida),
+       CAST(ROUND(COALESCE(SUM((julianday(hora_saida) - julianday(hora_entrada)) * 1440), 0)) AS INTEGER),
+       MAX(hora_entrada IS NOT NULL)
+FROM {origem}
+WHERE aluno_id IN (SELECT id FROM alunos) AND {filtro}
+GROUP BY aluno_id, data
+ON CONFLICT (aluno_id, data) DO UPDATE SET
+    primeira_entrada = excluded.primeira_entrada,
+    ultima_saida = excluded.ultima_saida,
+    minutos = excluded.minutos,
+    presente = excluded.presente
+"""
+
+
+def _origem_presencas(arquivos) -> str:
+    """FROM do resumo: presencas e, se houver, os arquivos anuais [(ano, arquivo)] já anexados."""
+    if not arquivos:
+        return "presencas"
+    colunas = "aluno_id, data, hora_entrada, hora_saida"
+    return "(" + " UNION ALL ".join(
+        [f"SELECT {colunas} FROM main.presencas"]
+        + [f"SELECT {colunas} FROM {_esquema_arquivo(ano)}.presencas" for ano, _ in arquivos]
+    ) + ") AS presencas"
+
+
+def atualizar_presenca_diaria(conn, pares, origem: str = "presencas"):
+    """Atualiza o resumo dos pares (aluno_id, data) na transação de `conn` (Session ou Connection)."""
+    pares = [{"aluno_id": aluno_id, "data": dia} for aluno_id, dia in pares if aluno_id is not None]
+    if not pares:
+        return
+    stmt = text(_SQL_PRESENCA_DIARIA.format(origem=origem, filtro="aluno_id = :aluno_id AND data = :data")).bindparams(
+        bindparam("data", type_=Date)
+    )
+    conn.execute(stmt, pares)
+
+
+def reconstruir_presenca_diaria(data_inicio: date = None, data_fim: date = None, conn=None):
+    """Recria o resumo do período (ou de todo o histórico) a partir de presencas; retorna as linhas geradas.
+
+    Inclui os anos arquivados que o período alcança (`conn` não pode ter escrito nada ainda).
+    Sem `conn`, o período é refeito por trechos (_trechos_do_periodo), cada um na sua transação.
+    """
+    if conn is None:
+        with engine_atual().connect() as c:
+            trechos = _trechos_do_periodo(c, data_inicio, data_fim)
+        total = 0
+        for inicio, fim in trechos:
+            with engine_atual().begin() as c:
+                total += reconstruir_presenca_diaria(inicio, fim, conn=c)
+        return total
+    arquivos = _anos_arquivados(conn, data_inicio, data_fim)
+    _anexar_arquivos(conn, arquivos)
+    origem = _origem_presencas(arquivos)
+    # presenças sem aluno (o schema original permitia aluno_id NULL) não entram no resumo
+    filtros, params = ["aluno_id IS NOT NULL"], {}
+    if data_inicio:
+        filtros.append("data >= :data_inicio")
+        params["data_inicio"] = data_inicio.isoformat()
+    if data_fim:
+        filtros.append("data <= :data_fim")
+        params["data_fim"] = data_fim.isoformat()
+    filtro = " AND ".join(filtros)
+    conn.execute(text(f"DELETE FROM presenca_diaria WHERE {filtro}"), params)
+    conn.execute(text(_SQL_PRESENCA_DIARIA.format(origem=origem, filtro=filtro)), params)
+    return conn.execute(text(f"SELECT COUNT(*) FROM presenca_diaria WHERE {filtro}"), params).scalar()
+
+
+def _periodo_resumo(stmt, data_inicio: date = None, data_fim: date = None):
+    if data_inicio:
+        stmt = stmt.where(PresencaDiaria.data >= data_inicio)
+    if data_fim:
+        stmt = stmt.where(PresencaDiaria.data <= data_fim)
+    return stmt
+
+
+def taxa_presenca_por_serie_semana(data_inicio: date = None, data_fim: date = None):
+    """Taxa de presença por série e semana: dias presentes / (alunos da série x dias letivos da semana).
+
+    Dias letivos = dias em que houve alguma presença registrada. Lê só presenca_diaria.
+    """
+    semana = func.date(PresencaDiaria.data, "weekday 0", "-6 days")  # segunda-feira da semana
+    serie = func.coalesce(Aluno.serie, "")
+    with engine_atual().connect() as conn:
+        dias = dict(conn.execute(
+            _periodo_resumo(select(semana, func.count(distinct(PresencaDiaria.data))), data_inicio, data_fim)
+            .group_by(semana)
+        ).all())
+        alunos_serie = dict(conn.execute(select(serie, func.count(Aluno.id)).group_by(serie)).all())
+        presentes = conn.execute(
+            _periodo_resumo(select(semana, serie, func.count()), data_inicio, data_fim)
+            .join(Aluno, Aluno.id == PresencaDiaria.aluno_id)
+            .where(PresencaDiaria.presente.is_(True))
+            .group_by(semana, serie)
+            .order_by(semana, serie)
+        ).all()
+    resultado = []
+    for sem, ser, qtd in presentes:
+        possiveis = alunos_serie.get(ser, 0) * dias.get(sem, 0)
+        resultado.append({
+            "semana": sem,
+            "serie": ser,
+            "presencas": qtd,
+            "alunos": alunos_serie.get(ser, 0),
+            "dias_letivos": dias.get(sem, 0),
+            "taxa": qtd / possiveis if possiveis else 0.0,
+        })
+    return resultado
+
+
+def tempo_medio_por_pais(data_inicio: date = None, data_fim: date = None):
+    """Minutos médios por dia na escola (dias com saída registrada), por país. Lê só presenca_diaria."""
+    pais = func.coalesce(Aluno.pais, "")
+    with engine_atual().connect() as conn:
+        linhas = conn.execute(
+            _periodo_resumo(
+                select(pais, func.avg(PresencaDiaria.minutos), func.count(distinct(PresencaDiaria.aluno_id)), func.count()),
+                data_inicio, data_fim,
+            )
+            .join(Aluno, Aluno.id == PresencaDiaria.aluno_id)
+            .where(PresencaDiaria.minutos > 0)
+            .group_by(pais)
+            .order_by(func.avg(PresencaDiaria.minutos).desc())
+        ).all()
+    return [{"pais": p, "minutos_medios": media, "alunos": alunos, "dias": dias} for p, media, alunos, dias in linhas]
+
+
+# -------- Arquivo de presenças (anos letivos encerrados) --------
+# A tabela `presencas` só cresce. Anos letivos encerrados vão para um arquivo SQLite por
+# ano ao lado do banco da escola (alunos.db -> alunos_presencas_2024.db, compactado com
+# VACUUM) e saem da tabela quente. As consultas de presenças anexam (ATTACH) só os anos
+# que o período pedido alcança e fazem UNION ALL com a tabela quente; um período que
+# alcança mais anos do que cabem nos anexos é lido por trechos. Um ano só passa a
+# ser lido do arquivo depois de registrado em arquivos_presencas, na mesma transação que
+# o apaga da tabela quente; até lá a cópia no arquivo é ignorada (e refeita se preciso).
+MAX_ARQUIVOS_ANEXADOS = 9  # o SQLite anexa até 10 bancos por conexão (o principal conta)
+
+_metadata_arquivo = MetaData()
+_tabelas_arquivo = {}
+_tabelas_arquivo_lock = threading.Lock()
+
+
+def _esquema_arquivo(ano: int) -> str:
+    return f"arq_{int(ano)}"
+
+
+def _tabela_arquivo(ano: int):
+    """Tabela `presencas` do arquivo do ano (mesmas colunas, sem chaves estrangeiras)."""
+    esquema = _esquema_arquivo(ano)
+    with _tabelas_arquivo_lock:
+        if esquema not in _tabelas_arquivo:
+            _tabelas_arquivo[esquema] = Table(
+                "presencas", _metadata_arquivo,
+                *(Column(c.name, c.type, primary_key=c.primary_key) for c in Presenca.__table__.columns),
+                Index("ix_presencas_aluno_data_entrada", "aluno_id", "data", "hora_entrada"),
+                Index("ix_presencas_data_entrada", "data", "hora_entrada"),
+                schema=esquema,
+            )
+        return _tabelas_arquivo[esquema]
+
+
+def _base_banco_escola() -> str:
+    """Caminho do banco da escola atual sem a extensão (os arquivos anuais ficam ao lado)."""
+    url = make_url(roteador.url_escola(escola_atual()))
+    if not url.drivername.startswith("sqlite") or not url.database or url.database == ":memory:":
+        raise RuntimeError("o arquivo de presenças só existe para bancos SQLite em arquivo")
+    return os.path.splitext(os.path.abspath(url.database))[0]
+
+
+def _anos_arquivados(conn, data_inicio: date = None, data_fim: date = None):
+    """[(ano, arquivo)] arquivados que o período alcança (sem datas: todos)."""
+    stmt = select(ArquivoPresencas.ano, ArquivoPresencas.arquivo).order_by(ArquivoPresencas.ano)
+    if data_inicio:
+        stmt = stmt.where(ArquivoPresencas.ano >= data_inicio.year)
+    if data_fim:
+        stmt = stmt.where(ArquivoPresencas.ano <= data_fim.year)
+    return conn.execute(stmt).all()
+
+
+def _anexar_arquivos(conn, arquivos):
+    """ATTACH dos arquivos [(ano, arquivo)] que a conexão ainda não tem.
+
+    O anexo vale enquanto a conexão viver no pool. ATTACH/DETACH não rodam dentro de
+    uma transação de escrita, então chame antes de qualquer INSERT/UPDATE/DELETE.
+    """
+    if len(arquivos) > MAX_ARQUIVOS_ANEXADOS:
+        raise ValueError(
+            f"{len(arquivos)} anos arquivados numa só consulta: a conexão anexa no máximo "
+            f"{MAX_ARQUIVOS_ANEXADOS} (divida o período, ver _trechos_do_periodo)"
+        )
+    anexados = conn.info.setdefault("arquivos_anexados", set())
+    faltando = [(ano, arquivo) for ano, arquivo in arquivos if ano not in anexados]
+    if not faltando:
+        return
+    if len(anexados) + len(faltando) > MAX_ARQUIVOS_ANEXADOS:
+        for ano in sorted(anexados - {ano for ano, _ in arquivos}):
+            conn.exec_driver_sql(f"DETACH DATABASE {_esquema_arquivo(ano)}")
+            anexados.discard(ano)
+    pasta = os.path.dirname(_base_banco_escola())
+    for ano, arquivo in faltando:
+        conn.exec_driver_sql(f"ATTACH DATABASE ? AS {_esquema_arquivo(ano)}", (os.path.join(pasta, arquivo),))
+        anexados.add(ano)
+
+
+def _rodadas_de_arquivos(arquivos):
+    """Divide [(ano, arquivo)] em rodadas que cabem nos anexos de uma conexão (sempre ao menos uma).
+
+    Entre uma rodada e outra a transação precisa ser encerrada: DETACH não roda dentro dela.
+    """
+    passo = MAX_ARQUIVOS_ANEXADOS
+    return [arquivos[i:i + passo] for i in range(0, len(arquivos), passo)] or [[]]
+
+
+def _trechos_do_periodo(conn, data_inicio: date = None, data_fim: date = None):
+    """Divide o período em trechos consecutivos [(inicio, fim)], do mais antigo ao mais recente,
+    que alcançam cada um no máximo MAX_ARQUIVOS_ANEXADOS anos arquivados (um UNION ALL por trecho).
+    """
+    rodadas = _rodadas_de_arquivos(_anos_arquivados(conn, data_inicio, data_fim))
+    trechos = []
+    for n, rodada in enumerate(rodadas):
+        inicio = date(rodadas[n - 1][-1][0] + 1, 1, 1) if n else data_inicio
+        fim = date(rodada[-1][0], 12, 31) if n < len(rodadas) - 1 else data_fim
+        trechos.append((inicio, fim))
+    return trechos
+
+
+def listar_arquivos_presencas():
+    """Anos arquivados da escola atual: [{"ano", "arquivo", "linhas", "arquivado_em", "bytes"}]."""
+    with engine_atual().connect() as conn:
+        linhas = conn.execute(select(ArquivoPresencas).order_by(ArquivoPresencas.ano)).all()
+    if not linhas:
+        return []
+    pasta = os.path.dirname(_base_banco_escola())
+    resultado = []
+    for linha in linhas:
+        caminho = os.path.join(pasta, linha.arquivo)
+        resultado.append({
+            "ano": linha.ano,
+            "arquivo": linha.arquivo,
+            "linhas": linha.linhas,
+            "arquivado_em": linha.arquivado_em,
+            "bytes": os.path.getsize(caminho) if os.path.exists(caminho) else None,
+        })
+    return resultado
+
+
+def arquivar_presencas(ano: int):
+    """Move as presenças do ano letivo encerrado `ano` da tabela quente para o arquivo do ano.
+
+    Pode ser repetido (ex.: presenças lançadas depois com data antiga): as linhas já
+    copiadas são ignoradas. O resumo diário (presenca_diaria) continua no banco quente.
+    Retorna {"ano", "arquivo", "linhas"} com as linhas movidas nesta execução.
+    """
+    ano = int(ano)
+    if ano >= date.today().year:
+        raise ValueError(f"o ano letivo {ano} ainda não foi encerrado")
+    arquivo = f"{os.path.basename(_base_banco_escola())}_presencas_{ano}.db"
+    esquema = _esquema_arquivo(ano)
+    tabela = _tabela_arquivo(ano)
+    periodo = (date(ano, 1, 1).isoformat(), date(ano, 12, 31).isoformat())
+    colunas = ", ".join(c.name for c in Presenca.__table__.columns)
+    with engine_atual().connect() as conn:
+        quentes = conn.exec_driver_sql(
+            "SELECT COUNT(*) FROM main.presencas WHERE data BETWEEN ? AND ?", periodo
+        ).scalar()
+        if not quentes:
+            return {"ano": ano, "arquivo": arquivo, "linhas": 0}
+        _anexar_arquivos(conn, [(ano, arquivo)])
+        tabela.create(conn, checkfirst=True)
+        conn.commit()
+
+        # 1) copia (e grava) no arquivo; 2) apaga do banco quente e registra o ano juntos.
+        # Com WAL, transações entre bancos anexados não são atômicas no conjunto: por isso
+        # dois passos, e a cópia é idempotente (mesmos IDs).
+        conn.exec_driver_sql(
+            f"INSERT OR IGNORE INTO {esquema}.presencas ({colunas}) "
+            f"SELECT {colunas} FROM main.presencas WHERE data BETWEEN ? AND ?", periodo
+        )
+        conn.commit()
+        # compara a linha inteira: um id já arquivado com outro conteúdo (o INSERT OR IGNORE
+        # o pulou) não é cópia, e apagá-lo perderia a presença
+        iguais = " AND ".join(f"a.{c.name} IS p.{c.name}" for c in Presenca.__table__.columns)
+        faltando = conn.exec_driver_sql(
+            f"SELECT COUNT(*) FROM main.presencas p WHERE p.data BETWEEN ? AND ? "
+            f"AND NOT EXISTS (SELECT 1 FROM {esquema}.presencas a WHERE {iguais})", periodo
+        ).scalar()
+        if faltando:
+            raise RuntimeError(f"{faltando} presença(s) de {ano} não chegaram ao arquivo (ou o arquivo já tem "
+                               "outra presença com o mesmo id); nada foi apagado")
+        # o arquivo não é exclusão para quem sincroniza: pausa o log de mudanças nesta transação
+        conn.exec_driver_sql("INSERT INTO mudancas_controle (chave, valor) VALUES ('pausado', 1)")
+        conn.exec_driver_sql("DELETE FROM main.presencas WHERE data BETWEEN ? AND ?", periodo)
+        conn.exec_driver_sql("DELETE FROM mudancas_controle WHERE chave = 'pausado'")
+        total = conn.exec_driver_sql(f"SELECT COUNT(*) FROM {esquema}.presencas").scalar()
+        conn.execute(
+            sqlite_insert(ArquivoPresencas)
+            .values(ano=ano, arquivo=arquivo, linhas=total, arquivado_em=datetime.now())
+            .on_conflict_do_update(index_elements=["ano"], set_={"linhas": total, "arquivado_em": datetime.now()})
+        )
+        conn.commit()
+        conn.exec_driver_sql(f"VACUUM {esquema}")
+    return {"ano": ano, "arquivo": arquivo, "linhas": quentes}
+
+
+def arquivar_anos_encerrados(anos_quentes: int = 1):
+    """Arquiva todos os anos anteriores aos `anos_quentes` mais recentes (o ano atual conta como um)."""
+    limite = date.today().year - max(1, anos_quentes) + 1
+    with engine_atual().connect() as conn:
+        primeira = conn.execute(select(func.min(Presenca.data))).scalar()
+    if primeira is None:
+        return []
+    return [r for r in (arquivar_presencas(ano) for ano in range(primeira.year, limite)) if r["linhas"]]
+
+
+def _tamanho_banco(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA page_count").scalar() * conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+
+def _otimizar_estatisticas():
+    """PRAGMA optimize depois de cargas grandes: refaz as estatísticas que ficaram defasadas."""
+    with engine_atual().connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA optimize")
+
+
+def manter_banco(vacuum: bool = True):
+    """Manutenção do banco da escola atual: ANALYZE (estatísticas do planejador) e, com
+    `vacuum`, VACUUM e checkpoint do WAL, devolvendo ao disco o espaço das linhas apagadas
+    (ex.: depois de arquivar). Retorna {"antes", "depois"} em bytes (SQLite).
+    """
+    with engine_atual().connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")  # VACUUM não roda em transação
+        if conn.dialect.name != "sqlite":
+            conn.exec_driver_sql("VACUUM ANALYZE" if vacuum else "ANALYZE")
+            return {"antes": None, "depois": None}
+        antes = _tamanho_banco(conn)
+        conn.exec_driver_sql("ANALYZE")
+        conn.exec_driver_sql("PRAGMA optimize")
+        if vacuum:
+            conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"antes": antes, "depois": _tamanho_banco(conn)}
+
+
+# -------- Log de mudanças (sincronização incremental) --------
+# Cada inserção/alteração/exclusão em alunos e presencas gera uma linha em `mudancas` com
+# seq crescente (gatilhos do SQLite, então vale para todo caminho de escrita). Quem
+# sincroniza guarda o último seq recebido e pede só o que veio depois (mudancas_desde).
+# Começando do zero: ultimo_seq_mudancas(), exportação completa e depois mudancas_desde.
+_TABELAS_COM_MUDANCAS = (Aluno.__table__, Presenca.__table__)
+MudancaDTO = namedtuple("MudancaDTO", ["seq", "tabela", "operacao", "registro_id", "dados", "momento"])
+CABECALHOS_MUDANCAS = ["Seq", "Tabela", "Operação", "Registro ID", "Dados", "Momento"]
+
+
+def _sql_gatilhos_mudancas(tabela):
+    def como_json(linha):
+        return "json_object(" + ", ".join(f"'{c.name}', {linha}.{c.name}" for c in tabela.columns) + ")"
+
+    quando = "WHEN NOT EXISTS (SELECT 1 FROM mudancas_controle WHERE chave = 'pausado')"
+    agora = "strftime('%Y-%m-%d %H:%M:%f', 'now', 'localtime')"
+    for evento, operacao, linha in (("INSERT", "I", "new"), ("UPDATE", "U", "new"), ("DELETE", "D", "old")):
+        yield (
+            f"CREATE TRIGGER IF NOT EXISTS {tabela.name}_mudancas_{operacao.lower()} "
+            f"AFTER {evento} ON {tabela.name} {quando} BEGIN "
+            "INSERT INTO mudancas (tabela, operacao, registro_id, dados, momento) "
+            f"VALUES ('{tabela.name}', '{operacao}', {linha}.id, {como_json(linha)}, {agora}); END"
+        )
+
+
+def ultimo_seq_mudancas() -> int:
+    with engine_atual().connect() as conn:
+        return conn.execute(select(func.max(Mudanca.seq))).scalar() or 0
+
+
+def stmt_mudancas(seq: int, tabelas=None, ate_seq: int = None):
+    stmt = select(
+        Mudanca.seq, Mudanca.tabela, Mudanca.operacao, Mudanca.registro_id, Mudanca.dados, Mudanca.momento
+    ).where(Mudanca.seq > seq)
+    if ate_seq is not None:
+        stmt = stmt.where(Mudanca.seq <= ate_seq)
+    if tabelas:
+        stmt = stmt.where(Mudanca.tabela.in_(tabelas))
+    return stmt.order_by(Mudanca.seq)
+
+
+def mudancas_desde(seq: int = 0, tabelas=None, limite: int = None, lote: int = 1000):
+    """Gera, em ordem de seq e em streaming, as mudanças posteriores a `seq` (MudancaDTO, dados já em dict).
+
+    Se `seq` é anterior a compactado_ate (ver compactar_mudancas), cada registro vem com
+    a última mudança daquele trecho, não com todas.
+    """
+    stmt = stmt_mudancas(seq, tabelas)
+    if limite:
+        stmt = stmt.limit(limite)
+    alvo = engine_atual()  # resolve a escola agora, não quando o gerador for consumido
+
+    def _gerar():
+        with alvo.connect() as conn:
+            resultado = conn.execution_options(stream_results=True, yield_per=lote).execute(stmt)
+            for linha in resultado:
+                yield MudancaDTO(*linha[:4], json.loads(linha.dados) if linha.dados else None, linha.momento)
+
+    return _gerar()
+
+
+def exportar_mudancas(seq: int = 0, formato: str = "csv", tabelas=None, lote: int = 2000):
+    """Exporta as mudanças posteriores a `seq` (ver mudancas_desde); retorna (arquivo, linhas, ate_seq).
+
+    `ate_seq` é o seq a guardar para a próxima exportação incremental.
+    """
+    ate_seq = ultimo_seq_mudancas()
+    arquivo, total = _exportar(stmt_mudancas(seq, tabelas, ate_seq), CABECALHOS_MUDANCAS, formato, lote)
+    return arquivo, total, ate_seq
+
+
+def _controle_mudancas(conn, chave: str):
+    return conn.execute(select(ControleMudancas.valor).where(ControleMudancas.chave == chave)).scalar()
+
+
+def compactar_mudancas(manter_dias: int = 30):
+    """Compacta o log anterior a `manter_dias`: de cada registro fica só a última mudança
+    (exclusões ficam, para quem sincroniza saber o que apagar). Retorna {"removidas", "compactado_ate"}.
+    """
+    limite = datetime.now() - timedelta(days=manter_dias)
+    with engine_atual().begin() as conn:
+        ate = conn.execute(select(func.max(Mudanca.seq)).where(Mudanca.momento < limite)).scalar()
+        if ate is None:
+            return {"removidas": 0, "compactado_ate": _controle_mudancas(conn, "compactado_ate") or 0}
+        removidas = conn.exec_driver_sql(
+            "DELETE FROM mudancas WHERE seq <= ? AND EXISTS ("
+            "SELECT 1 FROM mudancas AS posterior WHERE posterior.tabela = mudancas.tabela "
+            "AND posterior.registro_id = mudancas.registro_id AND posterior.seq > mudancas.seq)",
+            (ate,),
+        ).rowcount
+        conn.execute(
+            sqlite_insert(ControleMudancas)
+            .values(chave="compactado_ate", valor=ate)
+            .on_conflict_do_update(index_elements=["chave"], set_={"valor": ate})
+        )
+    return {"removidas": removidas, "compactado_ate": ate}
+
+
+# -------- Exportação (streaming) --------
+CABECALHOS_ALUNOS = ["ID", "Nome", "Idade", "País", "Passaporte", "Série", "Data Entrada", "Responsável", "Observações"]
+CABECALHOS_PRESENCAS = ["ID", "Aluno ID", "Aluno", "Data", "Entrada", "Saída", "Observação"]
+
+
+_FORMATOS_EXPORTACAO = ("csv", "xlsx")
+
+
+def _gravar_exportacao(particoes, cabecalhos, formato: str):
+    """Grava os lotes de linhas em um arquivo temporário (xlsx write-only ou csv).
+
+    Retorna (arquivo posicionado no início, quantidade de linhas).
+    """
+    if formato not in _FORMATOS_EXPORTACAO:
+        raise ValueError(f"formato de exportação desconhecido: {formato}")
+    arquivo = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    total = 0
+    if formato == "csv":
+        texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+        escritor = csv.writer(texto, delimiter=";")
+        escritor.writerow(cabecalhos)
+        for linhas in particoes:
+            escritor.writerows(linhas)
+            total += len(linhas)
+        texto.flush()
+        texto.detach()
+    else:
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(cabecalhos)
+        for linhas in particoes:
+            for linha in linhas:
+                ws.append(list(linha))
+            total += len(linhas)
+        wb.save(arquivo)
+    arquivo.seek(0)
+    return arquivo, total
+
+
+def _exportar(stmt, cabecalhos, formato: str, lote: int):
+    """Exporta o resultado de `stmt` lote a lote (ver _gravar_exportacao).
+
+    As linhas vêm de um cursor do servidor (stream_results), então a memória não cresce
+    com o número de linhas. `stmt` pode ser uma função da conexão que devolve o SELECT
+    (ou vários, lidos em sequência; ver _particoes).
+    """
+    if formato not in _FORMATOS_EXPORTACAO:
+        raise ValueError(f"formato de exportação desconhecido: {formato}")
+    with engine_atual().connect() as conn:
+        return _gravar_exportacao(_particoes(conn, stmt, lote), cabecalhos, formato)
+
+
+def _particoes(conn, stmt, lote: int):
+    """Lotes de linhas de `stmt`: um SELECT ou função da conexão que devolve um ou vários."""
+    consultas = stmt(conn) if callable(stmt) else stmt
+    if isinstance(consultas, Executable):
+        consultas = [consultas]
+    for consulta in consultas:
+        yield from conn.execution_options(stream_results=True, yield_per=lote).execute(consulta).partitions()
+
+
+def _stmt_exportar_alunos(filtros: dict = None):
+    stmt = select(
+        Aluno.id, Aluno.nome, Aluno.idade, Aluno.pais, Aluno.passaporte, Aluno.serie,
+        Aluno.data_entrada, Aluno.responsavel, Aluno.observacoes,
+    )
+    return _filtrar_alunos(stmt, filtros).order_by(Aluno.id)
+
+
+def _stmt_exportar_presencas(aluno_id: int = None, data_inicio: date = None, data_fim: date = None):
+    """Função da conexão que monta os SELECTs, um por trecho do período (inclui os anos arquivados)."""
+
+    def montar(tabela):
+        c = tabela.c
+        return select(
+            c.id, c.aluno_id, Aluno.nome, c.data, c.hora_entrada, c.hora_saida, c.observacao,
+        ).outerjoin(Aluno, Aluno.id == c.aluno_id)
+
+    def _stmts(conn):
+        # gerador: cada trecho anexa os seus anos só quando o anterior já foi lido
+        for inicio, fim in reversed(_trechos_do_periodo(conn, data_inicio, data_fim)):
+            stmt, c = _presencas_do_periodo(conn, montar, aluno_id, inicio, fim)
+            yield stmt.order_by(c.data.desc(), c.hora_entrada.desc(), c.id.desc())
+
+    return _stmts
+
+
+def exportar_alunos(filtros: dict = None, formato: str = "xlsx", lote: int = 2000):
+    """Exporta os alunos (mesmos filtros de listar_alunos) para xlsx/csv sem montar DataFrame."""
+    return _exportar(_stmt_exportar_alunos(filtros), CABECALHOS_ALUNOS, formato, lote)
+
+
+def exportar_presencas(aluno_id: int = None, data_inicio: date = None, data_fim: date = None,
+                       formato: str = "xlsx", lote: int = 2000):
+    """Exporta presenças (mesmos filtros de listar_presencas) para xlsx/csv sem montar DataFrame."""
+    stmt = _stmt_exportar_presencas(aluno_id, data_inicio, data_fim)
+    return _exportar(stmt, CABECALHOS_PRESENCAS, formato, lote)
+
+
+# -------- Usuários --------
+def criar_usuario(username: str, password: str, role: str = "user", escola: str = None):
+    if escola is not None:
+        roteador._validar(escola)
+    session = SessionLocal()
     try:
         existente = session.query(User).filter(User.username == username).first()
         if existente:
             return None
-        u = User(username=username, role=role)
+        u = User(username=username, role=role, escola=escola)
         u.set_password(password)
         session.add(u)
         session.commit()
@@ -204,12 +2323,420 @@ def criar_usuario(username: str, password: str, role: str = "user"):
         session.close()
 
 
-def autenticar_usuario(username: str, password: str):
+class LoginBloqueado(Exception):
+    """Muitas tentativas erradas para o usuário ou cliente; tente após `segundos`."""
+
+    def __init__(self, segundos: float):
+        super().__init__(f"muitas tentativas de login; aguarde {segundos:.0f}s")
+        self.segundos = segundos
+
+
+class LimitadorLogin:
+    """Limita tentativas de login por usuário e por cliente com espera exponencial.
+
+    As `tentativas_livres` primeiras falhas não bloqueiam; depois cada falha bloqueia
+    por espera_base * 2^(excedentes - 1) segundos, até espera_maxima. Um login certo
+    zera os contadores. Enquanto bloqueado, a senha nem chega a ser verificada (hash).
+    """
+
+    def __init__(self, tentativas_livres: int = 3, espera_base: float = 1.0, espera_maxima: float = 900.0):
+        self.tentativas_livres = tentativas_livres
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._lock = threading.Lock()
+        self._estado = {}  # chave -> [falhas, bloqueado_ate]
+
+    def verificar(self, *chaves):
+        agora = time.monotonic()
+        with self._lock:
+            espera = max((self._estado.get(c, (0, 0.0))[1] - agora for c in chaves if c), default=0.0)
+        if espera > 0:
+            raise LoginBloqueado(espera)
+
+    def registrar_falha(self, *chaves):
+        agora = time.monotonic()
+        with self._lock:
+            if len(self._estado) > 10000:
+                self._limpar(agora)
+            for chave in filter(None, chaves):
+                falhas, _ = self._estado.get(chave, (0, 0.0))
+                falhas += 1
+                excedentes = falhas - self.tentativas_livres
+                bloqueado_ate = 0.0
+                if excedentes > 0:
+                    bloqueado_ate = agora + min(self.espera_base * 2 ** (excedentes - 1), self.espera_maxima)
+                self._estado[chave] = [falhas, bloqueado_ate]
+
+    def registrar_sucesso(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._estado.pop(chave, None)
+
+    def _limpar(self, agora):
+        for chave in [c for c, (_, ate) in self._estado.items() if ate + self.espera_maxima < agora]:
+            del self._estado[chave]
+
+
+limitador_login = LimitadorLogin()
+
+
+def autenticar_usuario(username: str, password: str, cliente: str = None, limitador: LimitadorLogin = None):
+    """Retorna o usuário se a senha confere, senão None; levanta LoginBloqueado se limitado.
+
+    `cliente` identifica a origem (ex.: IP) para o limite por cliente. Se os parâmetros
+    do hash mudaram (METODO_HASH), a senha é refeita de forma transparente.
+    """
+    limitador = limitador or limitador_login
+    chaves = (f"usuario:{username}", f"cliente:{cliente}" if cliente else None)
+    limitador.verificar(*chaves)
     session = SessionLocal()
     try:
         user = session.query(User).filter(User.username == username).first()
         if user and user.check_password(password):
+            limitador.registrar_sucesso(*chaves)
+            if user.precisa_rehash():
+                user.set_password(password)
+                session.commit()
+                session.refresh(user)
             return user
+        limitador.registrar_falha(*chaves)
+        return None
+    finally:
+        session.close()
+
+
+# -------- Tokens de sessão --------
+# Token assinado (HMAC-SHA256) emitido após o login, para que sessões do Streamlit que
+# reconectam não precisem verificar a senha (hash caro) de novo. A chave vem de
+# ALUNOS_SECRET_KEY; sem ela é gerada por processo (tokens valem até reiniciar).
+_CHAVE_TOKEN = (os.environ.get("ALUNOS_SECRET_KEY") or secrets.token_hex(32)).encode()
+VALIDADE_TOKEN = int(os.environ.get("ALUNOS_TOKEN_VALIDADE", 12 * 3600))
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode()
+
+
+def _de_b64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _impressao_senha(password_hash: str) -> str:
+    # muda quando a senha muda, invalidando tokens antigos
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+def emitir_token_sessao(user, validade: int = None) -> str:
+    carga = {
+        "uid": user.id,
+        "ph": _impressao_senha(user.password_hash),
+        "v": user.versao_token or 0,
+        "exp": int(time.time()) + (validade or VALIDADE_TOKEN),
+    }
+    corpo = _b64(json.dumps(carga, separators=(",", ":")).encode())
+    assinatura = _b64(hmac.new(_CHAVE_TOKEN, corpo.encode(), hashlib.sha256).digest())
+    return f"{corpo}.{assinatura}"
+
+
+def validar_token_sessao(token: str):
+    """Retorna o usuário do token se a assinatura, a validade, a senha e a versão (logout) conferem; senão None."""
+    try:
+        corpo, assinatura = (token or "").split(".")
+        esperada = _b64(hmac.new(_CHAVE_TOKEN, corpo.encode(), hashlib.sha256).digest())
+        if not hmac.compare_digest(assinatura, esperada):
+            return None
+        carga = json.loads(_de_b64(corpo))
+    except (ValueError, TypeError):
         return None
+    if carga.get("exp", 0) < time.time():
+        return None
+    session = SessionLocal()
+    try:
+        user = session.get(User, carga.get("uid"))
+        if user is None or not hmac.compare_digest(_impressao_senha(user.password_hash), carga.get("ph", "")):
+            return None
+        if carga.get("v", 0) != (user.versao_token or 0):
+            return None  # revogado (logout)
+        return user
+    finally:
+        session.close()
+
+
+def revogar_tokens_sessao(user_id: int):
+    """Invalida todos os tokens já emitidos para o usuário (logout; vale para todas as sessões dele)."""
+    session = SessionLocal()
+    try:
+        session.execute(update(User).where(User.id == user_id).values(versao_token=User.versao_token + 1))
+        session.commit()
+    finally:
+        session.close()
+
+
+# -------- Estatísticas (Dashboard) --------
+def contar_alunos(filtros: dict = None):
+    session = SessionLocal()
+    try:
+        return _filtrar_alunos(session.query(func.count(Aluno.id)), filtros).scalar() or 0
+    finally:
+        session.close()
+
+
+def contar_presencas(aluno_id: int = None, data_inicio: date = None, data_fim: date = None):
+    session = SessionLocal()
+    try:
+        conn = session.connection()
+        total = 0
+        for inicio, fim in _trechos_do_periodo(conn, data_inicio, data_fim):
+            stmt, _ = _presencas_do_periodo(conn, lambda t: select(t.c.id), aluno_id, inicio, fim)
+            total += session.execute(select(func.count()).select_from(stmt.subquery())).scalar() or 0
+        return total
+    finally:
+        session.close()
+
+
+def contar_alunos_por_pais():
+    session = SessionLocal()
+    try:
+        pais = func.coalesce(Aluno.pais, "")
+        q = session.query(pais, func.count(Aluno.id)).group_by(pais).order_by(func.count(Aluno.id).desc(), pais)
+        return [(p, qtd) for p, qtd in q.all()]
+    finally:
+        session.close()
+
+
+def contar_alunos_por_serie():
+    session = SessionLocal()
+    try:
+        serie = func.coalesce(Aluno.serie, "")
+        q = session.query(serie, func.count(Aluno.id)).group_by(serie).order_by(func.count(Aluno.id).desc(), serie)
+        return [(s, qtd) for s, qtd in q.all()]
+    finally:
+        session.close()
+
+
+def contar_entradas_por_dia(data_inicio: date = None, data_fim: date = None):
+    session = SessionLocal()
+    try:
+        q = session.query(Presenca.data, func.count(Presenca.id)).filter(Presenca.hora_entrada.isnot(None))
+        if data_inicio:
+            q = q.filter(Presenca.data >= data_inicio)
+        if data_fim:
+            q = q.filter(Presenca.data <= data_fim)
+        q = q.group_by(Presenca.data).order_by(Presenca.data.desc())
+        return [(d, qtd) for d, qtd in q.all()]
+    finally:
+        session.close()
+
+
+def contar_presencas_abertas(dia: date = None):
+    session = SessionLocal()
+    try:
+        q = session.query(func.count(Presenca.id)).filter(
+            Presenca.hora_entrada.isnot(None), Presenca.hora_saida.is_(None)
+        )
+        if dia:
+            q = q.filter(Presenca.data == dia)
+        return q.scalar() or 0
     finally:
         session.close()
+
+
+def obter_estatisticas(dias_entradas: int = 30):
+    """Resumo do Dashboard calculado no banco (COUNT/GROUP BY), sem carregar linhas de Aluno."""
+    hoje = date.today()
+    return {
+        "total_alunos": contar_alunos(),
+        "por_pais": contar_alunos_por_pais(),
+        "por_serie": contar_alunos_por_serie(),
+        "entradas_por_dia": contar_entradas_por_dia(data_inicio=hoje - timedelta(days=dias_entradas - 1), data_fim=hoje),
+        "presencas_abertas": contar_presencas_abertas(),
+    }
+
+
+# -------- Rede (todas as escolas) --------
+# Consultas da rede inteira rodam em cada escola em paralelo (pool de threads, cada
+# thread no banco da sua escola) e os resultados são combinados aqui.
+_pool_rede = None
+_pool_rede_lock = threading.Lock()
+
+
+def _executor_rede():
+    global _pool_rede
+    with _pool_rede_lock:
+        if _pool_rede is None:
+            _pool_rede = ThreadPoolExecutor(
+                max_workers=int(os.environ.get("ALUNOS_REDE_THREADS", 8)), thread_name_prefix="rede"
+            )
+        return _pool_rede
+
+
+def na_rede(funcao, *args, escolas=None, **kwargs):
+    """Executa `funcao(*args, **kwargs)` em cada escola em paralelo; retorna {escola: resultado}."""
+    escolas = list(escolas or roteador.escolas)
+
+    def _na_escola(escola):
+        with usar_escola(escola):
+            return funcao(*args, **kwargs)
+
+    if len(escolas) == 1:
+        return {escolas[0]: _na_escola(escolas[0])}
+    futuros = {escola: _executor_rede().submit(_na_escola, escola) for escola in escolas}
+    return {escola: futuro.result() for escola, futuro in futuros.items()}
+
+
+def _somar_contagens(listas):
+    """Junta listas [(chave, quantidade)] somando por chave; maiores primeiro."""
+    soma = {}
+    for lista in listas:
+        for chave, qtd in lista:
+            soma[chave] = soma.get(chave, 0) + qtd
+    return sorted(soma.items(), key=lambda item: (-item[1], item[0]))
+
+
+def contar_alunos_rede(filtros: dict = None):
+    """{escola: alunos} de todas as escolas (o total da rede é a soma)."""
+    return na_rede(contar_alunos, filtros)
+
+
+def contar_alunos_por_pais_rede():
+    return _somar_contagens(na_rede(contar_alunos_por_pais).values())
+
+
+def obter_estatisticas_rede(dias_entradas: int = 30):
+    """obter_estatisticas() somado entre as escolas, com o total de alunos de cada uma em "por_escola"."""
+    por_escola = na_rede(obter_estatisticas, dias_entradas)
+    resumos = list(por_escola.values())
+    return {
+        "total_alunos": sum(r["total_alunos"] for r in resumos),
+        "por_pais": _somar_contagens(r["por_pais"] for r in resumos),
+        "por_serie": _somar_contagens(r["por_serie"] for r in resumos),
+        "entradas_por_dia": sorted(
+            _somar_contagens(r["entradas_por_dia"] for r in resumos), key=lambda item: item[0], reverse=True
+        ),
+        "presencas_abertas": sum(r["presencas_abertas"] for r in resumos),
+        "por_escola": {escola: r["total_alunos"] for escola, r in por_escola.items()},
+    }
+
+
+def _exportar_rede(stmt, cabecalhos, formato: str, lote: int, escolas=None):
+    """Como _exportar, com a coluna Escola, lendo todas as escolas em paralelo.
+
+    Cada escola é lida por uma thread do pool em uma fila limitada; o arquivo é escrito
+    escola por escola, na ordem configurada, então a memória continua limitada.
+    """
+    if formato not in _FORMATOS_EXPORTACAO:
+        raise ValueError(f"formato de exportação desconhecido: {formato}")
+    escolas = list(escolas or roteador.escolas)
+    filas = {escola: queue.Queue(maxsize=4) for escola in escolas}
+    cancelado = threading.Event()
+
+    def entregar(fila, item):
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def ler(escola):
+        try:
+            with usar_escola(escola), engine_atual().connect() as conn:
+                for linhas in _particoes(conn, stmt, lote):
+                    if not entregar(filas[escola], [(escola, *linha) for linha in linhas]):
+                        return
+            entregar(filas[escola], None)
+        except Exception as erro:
+            entregar(filas[escola], erro)
+
+    def particoes():
+        for escola in escolas:
+            while (item := filas[escola].get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+
+    for escola in escolas:
+        _executor_rede().submit(ler, escola)
+    try:
+        return _gravar_exportacao(particoes(), ["Escola", *cabecalhos], formato)
+    finally:
+        cancelado.set()  # libera leitores ainda esperando espaço na fila (em caso de erro)
+
+
+def exportar_alunos_rede(filtros: dict = None, formato: str = "xlsx", lote: int = 2000, escolas=None):
+    return _exportar_rede(_stmt_exportar_alunos(filtros), CABECALHOS_ALUNOS, formato, lote, escolas)
+
+
+def exportar_presencas_rede(data_inicio: date = None, data_fim: date = None, formato: str = "xlsx",
+                            lote: int = 2000, escolas=None):
+    stmt = _stmt_exportar_presencas(None, data_inicio, data_fim)
+    return _exportar_rede(stmt, CABECALHOS_PRESENCAS, formato, lote, escolas)
+
+
+# -------- Planos de consulta --------
+def explicar_plano(funcao, *args, **kwargs):
+    """Executa `funcao` e devolve [(sql, linhas do EXPLAIN QUERY PLAN)] para cada SELECT/UPDATE/DELETE emitido."""
+    capturados = []
+
+    def _capturar(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            capturados.append((statement, parameters))
+
+    alvo = engine_atual()
+    event.listen(alvo, "before_cursor_execute", _capturar)
+    try:
+        funcao(*args, **kwargs)
+    finally:
+        event.remove(alvo, "before_cursor_execute", _capturar)
+
+    planos = []
+    with alvo.connect() as conn:
+        arquivos = _anos_arquivados(conn)
+        for statement, parameters in capturados:
+            # anexa os anos arquivados que a consulta une
+            _anexar_arquivos(conn, [(ano, arquivo) for ano, arquivo in arquivos
+                                    if f"{_esquema_arquivo(ano)}." in statement])
+            linhas = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            planos.append((statement, [linha[-1] for linha in linhas]))
+    return planos
+
+
+def explicar_consultas():
+    """Planos das consultas públicas com filtros representativos (útil para detectar full scans)."""
+    hoje = date.today()
+    casos = {
+        "listar_alunos": (listar_alunos, (), {}),
+        "listar_alunos[busca]": (listar_alunos, (), {"filtros": {"busca": "maria"}}),
+        "buscar_alunos": (buscar_alunos, ("maria",), {}),
+        "listar_alunos[pais]": (listar_alunos, (), {"filtros": {"pais": "Brasil"}}),
+        "listar_alunos[serie]": (listar_alunos, (), {"filtros": {"serie": "1"}}),
+        "listar_alunos[data_entrada]": (listar_alunos, (), {"filtros": {"data_inicio": hoje, "data_fim": hoje}}),
+        "obter_aluno_por_id": (obter_aluno_por_id, (1,), {}),
+        "listar_presencas[aluno]": (listar_presencas, (), {"aluno_id": 1}),
+        "listar_presencas[aluno+periodo]": (listar_presencas, (), {"aluno_id": 1, "data_inicio": hoje, "data_fim": hoje}),
+        "listar_presencas[periodo]": (listar_presencas, (), {"data_inicio": hoje, "data_fim": hoje}),
+        "listar_presencas_pagina[cursor]": (listar_presencas_pagina, (), {"cursor": (hoje, datetime.now(), 1)}),
+        "contar_presencas[periodo]": (contar_presencas, (), {"data_inicio": hoje, "data_fim": hoje}),
+        "obter_estatisticas": (obter_estatisticas, (), {}),
+        "listar_presentes": (listar_presentes, (), {}),
+        "taxa_presenca_por_serie_semana": (taxa_presenca_por_serie_semana, (hoje - timedelta(days=365), hoje), {}),
+        "tempo_medio_por_pais": (tempo_medio_por_pais, (hoje - timedelta(days=365), hoje), {}),
+    }
+    return {nome: explicar_plano(f, *a, **kw) for nome, (f, a, kw) in casos.items()}
+
+
+# -------- Instrumentação --------
+# Cronometra as funções públicas deste módulo e todo SQL executado (ver metricas.py).
+# ALUNOS_METRICAS=0 desliga.
+if os.environ.get("ALUNOS_METRICAS", "1") != "0":
+    metricas.instrumentar_sqlalchemy()
+    metricas.cronometrar_modulo(
+        globals(), __name__,
+        ignorar={
+            "url_banco", "criar_engine", "registrar_pragmas", "configurar_banco", "explicar_plano", "explicar_consultas",
+            "escola_atual", "definir_escola", "usar_escola", "engine_atual", "na_rede", "mudancas_desde", "proxima_serie",
+            "chave_passaporte", "identidade_aluno", "consulta_fts", "stmt_busca_fts", "stmt_fechar_presenca_aberta",
+            "stmt_mudancas", "stmt_presentes",
+        },
+    )
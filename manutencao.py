@@ -0,0 +1,104 @@
+# manutencao.py
+# Tarefas de manutenção do banco, para rodar fora do app (cron / agendador):
+#   python manutencao.py arquivar [--anos-quentes 1] [--ano 2024]   move anos encerrados para o arquivo frio
+#   python manutencao.py otimizar [--sem-vacuum]                    ANALYZE + VACUUM + checkpoint do WAL
+#   python manutencao.py arquivos                                   lista os anos arquivados
+#   python manutencao.py compactar [--dias 30]                      compacta o log de mudanças antigo
+#   python manutencao.py duplicados [--limiar 0.85] [--mesclar A B] lista possíveis alunos duplicados / mescla B em A
+#   python manutencao.py fechar-abertas                             fecha entradas de dias anteriores sem saída
+# Por padrão roda em todas as escolas (ALUNOS_ESCOLAS); --escola limita a uma.
+import argparse
+import sys
+
+import database
+
+
+def _mb(tamanho):
+    return f"{tamanho / 1024 / 1024:.1f} MB" if tamanho is not None else "-"
+
+
+def arquivar(args):
+    if args.ano:
+        resultados = [database.arquivar_presencas(args.ano)]
+    else:
+        resultados = database.arquivar_anos_encerrados(anos_quentes=args.anos_quentes)
+    if not any(r["linhas"] for r in resultados):
+        print("  nada a arquivar")
+    for r in resultados:
+        print(f"  {r['ano']}: {r['linhas']} presença(s) -> {r['arquivo']}")
+
+
+def otimizar(args):
+    tamanhos = database.manter_banco(vacuum=not args.sem_vacuum)
+    print(f"  {_mb(tamanhos['antes'])} -> {_mb(tamanhos['depois'])}")
+
+
+def arquivos(_args):
+    lista = database.listar_arquivos_presencas()
+    if not lista:
+        print("  nenhum ano arquivado")
+    for a in lista:
+        print(f"  {a['ano']}: {a['linhas']} presença(s), {_mb(a['bytes'])}, {a['arquivo']} "
+              f"(arquivado em {a['arquivado_em']:%Y-%m-%d %H:%M})")
+
+
+def compactar(args):
+    r = database.compactar_mudancas(manter_dias=args.dias)
+    print(f"  {r['removidas']} mudança(s) removida(s); log compactado até o seq {r['compactado_ate']}")
+
+
+def duplicados(args):
+    if args.mesclar:
+        manter, remover = args.mesclar
+        try:
+            r = database.mesclar_alunos(manter, remover)
+        except ValueError as erro:
+            sys.exit(f"erro: {erro}")
+        print(f"  {remover} -> {manter}: {r['presencas']} presença(s), {r['arquivadas']} arquivada(s)")
+        return
+    pares = database.encontrar_duplicados(limiar=args.limiar)
+    if not pares:
+        print("  nenhum possível duplicado")
+    for p in pares:
+        print(f"  {p.pontuacao:.2f}  {p.aluno_a.id} {p.aluno_a.nome} ({p.aluno_a.passaporte or '-'})"
+              f"  x  {p.aluno_b.id} {p.aluno_b.nome} ({p.aluno_b.passaporte or '-'})  [{p.motivo}]")
+
+
+def fechar_abertas(_args):
+    print(f"  {database.fechar_presencas_abertas_anteriores()} presença(s) fechada(s) sem saída registrada")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escola", choices=database.roteador.escolas)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    p_arquivar = comandos.add_parser("arquivar")
+    p_arquivar.add_argument("--anos-quentes", type=int, default=1, help="anos mantidos no banco quente (o atual conta)")
+    p_arquivar.add_argument("--ano", type=int, help="arquiva só este ano")
+    p_arquivar.set_defaults(funcao=arquivar)
+    p_otimizar = comandos.add_parser("otimizar")
+    p_otimizar.add_argument("--sem-vacuum", action="store_true", help="só ANALYZE")
+    p_otimizar.set_defaults(funcao=otimizar)
+    comandos.add_parser("arquivos").set_defaults(funcao=arquivos)
+    p_compactar = comandos.add_parser("compactar")
+    p_compactar.add_argument("--dias", type=int, default=30, help="mudanças mais novas que isso ficam completas")
+    p_compactar.set_defaults(funcao=compactar)
+    p_duplicados = comandos.add_parser("duplicados")
+    p_duplicados.add_argument("--limiar", type=float, default=database.LIMIAR_DUPLICADO, help="semelhança mínima (0-1)")
+    p_duplicados.add_argument("--mesclar", type=int, nargs=2, metavar=("MANTER", "REMOVER"),
+                              help="mescla o aluno REMOVER em MANTER (use com --escola)")
+    p_duplicados.set_defaults(funcao=duplicados)
+    comandos.add_parser("fechar-abertas").set_defaults(funcao=fechar_abertas)
+    args = parser.parse_args()
+    if getattr(args, "mesclar", None) and not args.escola and len(database.roteador.escolas) > 1:
+        parser.error("--mesclar precisa de --escola (os IDs são de uma escola)")
+
+    database.criar_banco()
+    for escola in [args.escola] if args.escola else database.roteador.escolas:
+        print(f"[{escola}]")
+        with database.usar_escola(escola):
+            args.funcao(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# metricas.py
+# Instrumentação leve dos caminhos quentes: tempo de cada função pública de database.py,
+# de cada SQL executado (via eventos do SQLAlchemy) e de cada execução de página do app.
+# Tudo fica num buffer circular em memória; a página "Desempenho" lê daqui.
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+Medicao = namedtuple("Medicao", ["tipo", "nome", "segundos", "linhas", "consultas", "sql", "parametros", "momento"])
+
+TAMANHO_BUFFER = int(os.environ.get("ALUNOS_METRICAS_TAMANHO", 5000))
+TAMANHO_MAX_PARAMETROS = 300
+
+_medicoes = deque(maxlen=TAMANHO_BUFFER)
+_lock = threading.Lock()
+# contador de SQL da execução (página) corrente; cada thread/sessão do Streamlit tem o seu
+_execucao_atual = contextvars.ContextVar("execucao_atual", default=None)
+
+
+def registrar(tipo: str, nome: str, segundos: float, linhas: int = None, consultas: int = None,
+              sql: str = None, parametros=None):
+    if parametros is not None:
+        parametros = repr(parametros)[:TAMANHO_MAX_PARAMETROS]
+    with _lock:
+        _medicoes.append(Medicao(tipo, nome, segundos, linhas, consultas, sql, parametros, time.time()))
+
+
+def medicoes(tipo: str = None):
+    with _lock:
+        copia = list(_medicoes)
+    return [m for m in copia if tipo is None or m.tipo == tipo]
+
+
+def limpar():
+    with _lock:
+        _medicoes.clear()
+
+
+# -------- Funções e trechos --------
+def cronometrar(funcao, tipo: str = "funcao", nome: str = None):
+    """Decora `funcao` para registrar a duração de cada chamada."""
+    nome = nome or funcao.__name__
+
+    @functools.wraps(funcao)
+    def _cronometrada(*args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            registrar(tipo, nome, time.perf_counter() - inicio)
+
+    _cronometrada.__cronometrada__ = True
+    return _cronometrada
+
+
+def cronometrar_modulo(namespace: dict, modulo: str, ignorar=()):
+    """Troca, em `namespace`, as funções públicas definidas em `modulo` pelas versões cronometradas."""
+    for nome, valor in list(namespace.items()):
+        if (nome.startswith("_") or nome in ignorar or not callable(valor) or isinstance(valor, type)
+                or getattr(valor, "__module__", None) != modulo or getattr(valor, "__cronometrada__", False)):
+            continue
+        namespace[nome] = cronometrar(valor)
+
+
+class Execucao:
+    """Mede um trecho (ex.: uma execução de página) e conta o SQL emitido dentro dele."""
+
+    def __init__(self, nome: str, tipo: str = "pagina"):
+        self.nome = nome
+        self.tipo = tipo
+        self.consultas = 0
+        self._inicio = None
+        self._token = None
+
+    def iniciar(self):
+        self._inicio = time.perf_counter()
+        self._token = _execucao_atual.set(self)
+        return self
+
+    def finalizar(self):
+        _execucao_atual.reset(self._token)
+        registrar(self.tipo, self.nome, time.perf_counter() - self._inicio, consultas=self.consultas)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *_exc):
+        self.finalizar()
+        return False
+
+
+# -------- SQL (eventos do engine) --------
+_DML = ("INSERT", "UPDATE", "DELETE")
+
+
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    # o início fica no contexto da execução: um SQL que falha (sem after_cursor_execute)
+    # não deixa nada para trás na conexão, que volta ao pool e vive o processo todo
+    if context is not None:
+        context._metricas_inicio = time.perf_counter()
+
+
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicio = getattr(context, "_metricas_inicio", None)
+    if inicio is None:
+        return
+    segundos = time.perf_counter() - inicio
+    execucao = _execucao_atual.get()
+    if execucao is not None:
+        execucao.consultas += 1
+    # rowcount só vale para INSERT/UPDATE/DELETE sem RETURNING: num SELECT o DB-API devolve
+    # -1 e, com RETURNING, as linhas ainda não foram lidas quando o evento dispara
+    linhas = None
+    if (statement.lstrip()[:6].upper() in _DML and "RETURNING" not in statement.upper()
+            and cursor.rowcount is not None and cursor.rowcount >= 0):
+        linhas = cursor.rowcount
+    registrar("sql", " ".join(statement.split())[:200], segundos, linhas=linhas, sql=statement, parametros=parameters)
+
+
+_instrumentado = False
+
+
+def instrumentar_sqlalchemy():
+    """Escuta todos os engines (inclusive os criados depois, como o assíncrono da API)."""
+    global _instrumentado
+    if not _instrumentado:
+        event.listen(Engine, "before_cursor_execute", _antes_sql)
+        event.listen(Engine, "after_cursor_execute", _depois_sql)
+        _instrumentado = True
+
+
+# -------- Relatórios --------
+def _percentil(ordenados, p):
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def resumo(tipo: str = None):
+    """Por (tipo, nome): chamadas, total, p50/p95/p99 e máximo em segundos; mais lentos primeiro."""
+    grupos = {}
+    for m in medicoes(tipo):
+        grupos.setdefault((m.tipo, m.nome), []).append(m)
+    linhas = []
+    for (tipo_m, nome), lista in grupos.items():
+        tempos = sorted(m.segundos for m in lista)
+        consultas = [m.consultas for m in lista if m.consultas is not None]
+        linhas.append({
+            "tipo": tipo_m,
+            "nome": nome,
+            "chamadas": len(tempos),
+            "total": sum(tempos),
+            "p50": _percentil(tempos, 50),
+            "p95": _percentil(tempos, 95),
+            "p99": _percentil(tempos, 99),
+            "max": tempos[-1],
+            "consultas_media": sum(consultas) / len(consultas) if consultas else None,
+        })
+    return sorted(linhas, key=lambda l: l["p95"], reverse=True)
+
+
+def sql_mais_lentos(limite: int = 20):
+    return sorted(medicoes("sql"), key=lambda m: m.segundos, reverse=True)[:limite]
+
+
+def exportar_json(caminho: str):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({
+            "resumo": resumo(),
+            "sql_mais_lentos": [m._asdict() for m in sql_mais_lentos()],
+        }, f, ensure_ascii=False, indent=2)
+    return caminho
+
+
+def _rotulo(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def exportar_prometheus(caminho: str):
+    """Formato texto do Prometheus (summary com quantis), para node_exporter textfile ou similar."""
+    linhas = [
+        "# HELP alunos_latencia_segundos Latência medida pela instrumentação do app.",
+        "# TYPE alunos_latencia_segundos summary",
+    ]
+    for r in resumo():
+        rotulos = f'tipo="{_rotulo(r["tipo"])}",nome="{_rotulo(r["nome"])}"'
+        for quantil, chave in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+            linhas.append(f'alunos_latencia_segundos{{{rotulos},quantile="{quantil}"}} {r[chave]:.6f}')
+        linhas.append(f"alunos_latencia_segundos_sum{{{rotulos}}} {r['total']:.6f}")
+        linhas.append(f"alunos_latencia_segundos_count{{{rotulos}}} {r['chamadas']}")
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write("\n".join(linhas) + "\n")
+    return caminho
@@ -0,0 +1,24 @@
+# requirements.py
+# Dependências do projeto. Para instalar:
+#   pip install $(python requirements.py)            app, API e manutenção
+#   pip install $(python requirements.py --todas)    também benchmarks (bench/) e testes (tests/)
+import sys
+
+DEPENDENCIAS = [
+    "streamlit",            # app.py
+    "pandas",               # tabelas do app, importação/exportação
+    "SQLAlchemy>=2.0",      # database.py (UPDATE ... RETURNING, engine assíncrono)
+    "Werkzeug",             # hash das senhas
+    "openpyxl",             # planilhas XLSX (importar/exportar)
+    "starlette",            # api.py
+    "uvicorn",              # servidor ASGI da api.py
+    "aiosqlite",            # driver assíncrono do SQLite (api.py)
+]
+
+DESENVOLVIMENTO = [
+    "httpx",                # cliente HTTP dos benchmarks da API
+    "pytest",               # tests/
+]
+
+if __name__ == "__main__":
+    print("\n".join(DEPENDENCIAS + (DESENVOLVIMENTO if "--todas" in sys.argv[1:] else [])))
@@ -0,0 +1,55 @@
+# tests/conftest.py
+# Cada teste ganha um banco SQLite novo numa pasta temporária (uma escola só).
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.pop("ALUNOS_DB_URL", None)
+os.environ.pop("ALUNOS_ESCOLAS", None)
+os.environ["ALUNOS_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="alunos_testes_"), "alunos.db")
+
+import database  # noqa: E402
+
+# schema do alunos.db antes das migrações (primeira versão do app)
+SCHEMA_ORIGINAL = """
+CREATE TABLE users (id INTEGER NOT NULL, username VARCHAR NOT NULL, password_hash VARCHAR NOT NULL,
+                    role VARCHAR, PRIMARY KEY (id), UNIQUE (username));
+CREATE INDEX ix_users_id ON users (id);
+CREATE TABLE alunos (id INTEGER NOT NULL, nome VARCHAR NOT NULL, idade INTEGER, pais VARCHAR, passaporte VARCHAR,
+                     serie VARCHAR, data_entrada DATE, responsavel VARCHAR, observacoes TEXT, PRIMARY KEY (id));
+CREATE INDEX ix_alunos_id ON alunos (id);
+CREATE TABLE presencas (id INTEGER NOT NULL, aluno_id INTEGER, data DATE, hora_entrada DATETIME,
+                        hora_saida DATETIME, observacao TEXT, PRIMARY KEY (id),
+                        FOREIGN KEY(aluno_id) REFERENCES alunos (id));
+CREATE INDEX ix_presencas_id ON presencas (id);
+"""
+
+
+def configurar(caminho):
+    database.configurar_banco(f"sqlite:///{caminho}")
+    database.definir_escola(database.roteador.padrao)
+
+
+@pytest.fixture
+def banco(tmp_path):
+    """database com um banco novo, já criado e migrado."""
+    configurar(tmp_path / "alunos.db")
+    database.criar_banco()
+    yield database
+    database.roteador.descartar()
+
+
+@pytest.fixture
+def banco_original(tmp_path):
+    """Caminho de um alunos.db com o schema original (sem migrações); o teste insere as linhas."""
+    caminho = tmp_path / "alunos.db"
+    with sqlite3.connect(caminho) as conn:
+        conn.executescript(SCHEMA_ORIGINAL)
+    configurar(caminho)
+    yield caminho
+    database.roteador.descartar()
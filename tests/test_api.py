@@ -0,0 +1,97 @@
+import pytest
+from starlette.testclient import TestClient
+
+import api
+
+TOKEN = "segredo-de-teste"
+
+
+@pytest.fixture
+def cliente(banco, monkeypatch):
+    monkeypatch.setattr(api, "TOKEN", TOKEN)
+    with TestClient(api.app, headers={"Authorization": f"Bearer {TOKEN}"}) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def ana(banco):
+    return banco.inserir_aluno(nome="Ana Souza", passaporte="AB123", responsavel="Maria Souza")
+
+
+@pytest.mark.parametrize("cabecalho", [None, "Bearer errado", f"Basic {TOKEN}"])
+def test_sem_token_valido_responde_401(cliente, ana, cabecalho):
+    cabecalhos = {"Authorization": cabecalho} if cabecalho else {}
+    cliente.headers.pop("Authorization")
+    resposta = cliente.get("/alunos", params={"q": "ana"}, headers=cabecalhos)
+    assert resposta.status_code == 401
+    assert cliente.post("/presencas/entrada", json={"aluno_id": ana.id}, headers=cabecalhos).status_code == 401
+
+
+def test_api_nao_sobe_sem_token(banco, monkeypatch):
+    monkeypatch.setattr(api, "TOKEN", None)
+    with pytest.raises(RuntimeError, match="ALUNOS_API_TOKEN"):
+        with TestClient(api.app):
+            pass
+
+
+def test_entrada_saida_e_presentes(cliente, ana):
+    entrada = cliente.post("/presencas/entrada", json={"codigo": "AB123"})
+    assert entrada.status_code == 201 and entrada.json()["aluno_id"] == ana.id
+    assert [p["aluno_id"] for p in cliente.get("/presentes").json()] == [ana.id]
+
+    saida = cliente.post("/presencas/saida", json={"aluno_id": ana.id})
+    assert saida.status_code == 200 and saida.json()["id"] == entrada.json()["id"]
+    assert cliente.get("/presentes").json() == []
+    assert cliente.post("/presencas/saida", json={"aluno_id": ana.id}).status_code == 404
+
+
+def test_entrada_em_lote_e_uma_transacao(cliente, ana):
+    resposta = cliente.post("/presencas/entrada/lote", json={"entradas": [{"aluno_id": ana.id}, {"codigo": "ZZ999"}]})
+    assert resposta.status_code == 404
+    assert cliente.get("/presentes").json() == []
+
+    resposta = cliente.post("/presencas/entrada/lote", json={"entradas": [{"aluno_id": ana.id}, {"codigo": str(ana.id)}]})
+    assert resposta.status_code == 201 and resposta.json()["registradas"] == 2
+
+
+@pytest.mark.parametrize("metodo, caminho, corpo, status", [
+    ("POST", "/presencas/entrada", {}, 422),
+    ("POST", "/presencas/entrada", {"aluno_id": "abc"}, 422),
+    ("POST", "/presencas/entrada", {"aluno_id": 999}, 404),
+    ("POST", "/presencas/entrada", {"codigo": "AB123", "quando": "ontem"}, 422),
+    ("POST", "/presencas/entrada/lote", {"entradas": []}, 422),
+    ("GET", "/alunos/abc", None, 422),
+    ("GET", "/alunos/999", None, 404),
+    ("GET", "/alunos", None, 422),
+    ("GET", "/alunos?q=ana&limite=x", None, 422),
+    ("GET", "/presentes?dia=10/03/2025", None, 422),
+    ("GET", "/mudancas?desde=x", None, 422),
+    ("GET", "/presentes?escola=outra", None, 404),
+])
+def test_erros_de_requisicao(cliente, ana, metodo, caminho, corpo, status):
+    resposta = cliente.request(metodo, caminho, json=corpo)
+    assert resposta.status_code == status
+    assert resposta.json()["erro"]
+
+
+def test_corpo_que_nao_e_json_responde_400(cliente):
+    resposta = cliente.post("/presencas/entrada", content=b"{", headers={"Content-Type": "application/json"})
+    assert resposta.status_code == 400
+
+
+def test_consulta_de_alunos(cliente, ana):
+    assert cliente.get(f"/alunos/{ana.id}").json()["passaporte"] == "AB123"
+    assert [a["id"] for a in cliente.get("/alunos", params={"codigo": "AB123"}).json()] == [ana.id]
+    assert [a["id"] for a in cliente.get("/alunos", params={"q": "souz"}).json()] == [ana.id]
+    assert cliente.get("/alunos", params={"q": "***"}).json() == []
+
+
+def test_mudancas_paginadas_por_seq(cliente, banco, ana):
+    banco.inserir_aluno(nome="Bruno Lima")
+    banco.inserir_aluno(nome="Carla Dias")
+    primeira = cliente.get("/mudancas", params={"desde": 0, "limite": 2, "tabelas": "alunos"}).json()
+    assert [m["dados"]["nome"] for m in primeira["mudancas"]] == ["Ana Souza", "Bruno Lima"]
+    assert primeira["mais"] is True
+    segunda = cliente.get("/mudancas", params={"desde": primeira["ultimo_seq"], "limite": 2}).json()
+    assert [m["dados"]["nome"] for m in segunda["mudancas"]] == ["Carla Dias"]
+    assert segunda["mais"] is False and segunda["ultimo_seq"] > primeira["ultimo_seq"]
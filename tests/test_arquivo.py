@@ -0,0 +1,104 @@
+import csv
+import io
+from datetime import date, datetime
+
+import pytest
+
+import database
+
+# mais anos arquivados do que uma conexão consegue anexar de uma vez
+ANOS = list(range(date.today().year - database.MAX_ARQUIVOS_ANEXADOS - 3, date.today().year))
+
+
+@pytest.fixture
+def arquivado(banco):
+    ana = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ana_dup = database.inserir_aluno(nome="Ana Sousa", passaporte="AB124")
+    for ano in ANOS:
+        database.registrar_presenca_entrada(ana.id, quando=datetime(ano, 3, 10, 7, 30))
+        database.registrar_presenca_entrada(ana_dup.id, quando=datetime(ano, 3, 11, 7, 30))
+    for ano in ANOS:
+        assert database.arquivar_presencas(ano)["linhas"] == 2
+    return ana.id, ana_dup.id
+
+
+def _presencas_por_aluno():
+    contagem = {}
+    for p in database.listar_presencas():
+        contagem[p.aluno_id] = contagem.get(p.aluno_id, 0) + 1
+    return contagem
+
+
+def test_consultas_dividem_o_periodo_alem_do_limite_de_anexos(arquivado):
+    presencas = database.listar_presencas()
+    assert len(presencas) == 2 * len(ANOS)
+    assert [p.data for p in presencas] == sorted((p.data for p in presencas), reverse=True)
+    assert database.contar_presencas() == 2 * len(ANOS)
+
+    paginas, cursor = [], None
+    while True:
+        pagina, cursor = database.listar_presencas_pagina(tamanho=5, cursor=cursor)
+        paginas += pagina
+        if cursor is None:
+            break
+    assert paginas == presencas
+
+    arquivo, linhas = database.exportar_presencas(formato="csv")
+    with arquivo:
+        datas = [linha[3] for linha in csv.reader(io.TextIOWrapper(arquivo, encoding="utf-8-sig"), delimiter=";")][1:]
+    assert linhas == len(datas) == 2 * len(ANOS)
+    assert datas == [p.data.isoformat() for p in presencas]
+
+
+def test_uma_consulta_alem_do_limite_de_anexos_falha_com_mensagem(arquivado):
+    with database.engine_atual().connect() as conn:
+        with pytest.raises(ValueError, match="anexa no máximo"):
+            database.reconstruir_presenca_diaria(conn=conn)
+
+
+def test_reconstroi_resumo_de_todos_os_anos_arquivados(arquivado):
+    assert database.reconstruir_presenca_diaria() == 2 * len(ANOS)
+
+
+def test_mescla_move_presencas_de_todos_os_anos_arquivados(arquivado):
+    manter, remover = arquivado
+    assert database.mesclar_alunos(manter, remover) == {"presencas": 0, "arquivadas": len(ANOS)}
+    assert _presencas_por_aluno() == {manter: 2 * len(ANOS)}
+    with database.SessionLocal() as session:
+        dias = session.query(database.PresencaDiaria).filter_by(aluno_id=manter).count()
+    assert dias == 2 * len(ANOS)
+
+
+def test_exclusao_limpa_todos_os_anos_arquivados(arquivado):
+    manter, remover = arquivado
+    assert database.deletar_alunos([remover]) == 1
+    assert _presencas_por_aluno() == {manter: len(ANOS)}
+
+
+def test_presenca_retroativa_depois_do_arquivo_nao_se_perde(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ano = ANOS[-1]
+    arquivada = database.registrar_presenca_entrada(aluno.id, quando=datetime(ano, 3, 10, 7, 30))
+    database.arquivar_presencas(ano)
+
+    retroativa = database.registrar_presenca_entrada(aluno.id, quando=datetime(ano, 12, 20, 7, 30))
+    assert retroativa.id != arquivada.id
+    assert database.arquivar_presencas(ano)["linhas"] == 1
+    assert [p.id for p in database.listar_presencas(aluno_id=aluno.id)] == [retroativa.id, arquivada.id]
+
+
+def test_arquivo_recusa_apagar_presenca_com_id_de_outra_arquivada(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ano = ANOS[-1]
+    arquivada = database.registrar_presenca_entrada(aluno.id, quando=datetime(ano, 3, 10, 7, 30))
+    database.arquivar_presencas(ano)
+    # banco antigo (sem AUTOINCREMENT) que já reaproveitou o id
+    with database.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO presencas (id, aluno_id, data, hora_entrada) VALUES (?, ?, ?, ?)",
+            (arquivada.id, aluno.id, f"{ano}-12-20", f"{ano}-12-20 07:30:00.000000"),
+        )
+
+    with pytest.raises(RuntimeError, match="mesmo id"):
+        database.arquivar_presencas(ano)
+    assert database.contar_presencas(data_inicio=date(ano, 12, 20), data_fim=date(ano, 12, 20)) == 1
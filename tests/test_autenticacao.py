@@ -0,0 +1,34 @@
+# tests/test_autenticacao.py
+import pytest
+
+
+@pytest.mark.parametrize("metodo", ["scrypt", "pbkdf2", "pbkdf2:sha256", "scrypt:32768:8:1"])
+def test_hash_no_metodo_atual_nao_precisa_rehash(banco, metodo):
+    usuario = banco.User(username="u", role="user")
+    usuario.set_password("segredo", metodo=metodo)
+    assert not usuario.precisa_rehash(metodo)
+
+
+def test_hash_com_outros_parametros_precisa_rehash(banco):
+    usuario = banco.User(username="u", role="user")
+    usuario.set_password("segredo", metodo="pbkdf2:sha256:1000")
+    assert usuario.precisa_rehash("scrypt")
+
+
+def test_login_no_metodo_atual_nao_refaz_hash(banco, monkeypatch):
+    monkeypatch.setattr(banco, "METODO_HASH", "pbkdf2")
+    banco.criar_usuario("maria", "senha123")
+    antes = banco.autenticar_usuario("maria", "senha123").password_hash
+    assert banco.autenticar_usuario("maria", "senha123").password_hash == antes
+
+
+def test_token_de_sessao_vale_ate_o_logout(banco):
+    usuario = banco.criar_usuario("joao", "senha123")
+    token = banco.emitir_token_sessao(banco.autenticar_usuario("joao", "senha123"))
+    assert banco.validar_token_sessao(token).username == "joao"
+
+    banco.revogar_tokens_sessao(usuario.id)
+
+    assert banco.validar_token_sessao(token) is None
+    novo = banco.emitir_token_sessao(banco.autenticar_usuario("joao", "senha123"))
+    assert banco.validar_token_sessao(novo).username == "joao"
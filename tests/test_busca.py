@@ -0,0 +1,32 @@
+# tests/test_busca.py
+# Busca de alunos pelo índice FTS5: prefixo, sem acentos, por relevância e com os filtros da listagem.
+
+
+def test_buscar_alunos_por_prefixo_sem_acentos(banco):
+    jose = banco.inserir_aluno(nome="José Conceição", passaporte="AB123")
+    banco.inserir_aluno(nome="Maria Silva", passaporte="CD456")
+
+    assert [a.id for a in banco.buscar_alunos("jose conc")] == [jose.id]
+    assert [a.id for a in banco.buscar_alunos("ab12")] == [jose.id]
+    assert banco.buscar_alunos("  ") == []
+
+
+def test_buscar_alunos_ordena_por_relevancia_e_limita(banco):
+    # o termo repetido no nome curto pesa mais no bm25 que uma ocorrência num cadastro longo
+    longe = banco.inserir_aluno(nome="Ana Maria", responsavel="Pedro Henrique Albuquerque Santos",
+                                observacoes="sem relação")
+    perto = banco.inserir_aluno(nome="Maria Maria")
+    banco.inserir_aluno(nome="Bruno Lima")
+
+    assert [a.id for a in banco.buscar_alunos("maria")] == [perto.id, longe.id]
+    assert [a.id for a in banco.buscar_alunos("maria", limite=1)] == [perto.id]
+
+
+def test_buscar_alunos_com_filtros_da_listagem(banco):
+    brasil = banco.inserir_aluno(nome="Maria Silva", pais="Brasil", serie="2º")
+    banco.inserir_aluno(nome="Maria Souza", pais="Peru", serie="2º")
+    banco.inserir_aluno(nome="Mariana Dias", pais="Brasil", serie="3º")
+
+    filtros = {"busca": "maria", "pais": "Brasil", "serie": "2º"}
+    assert [a.id for a in banco.buscar_alunos("maria", filtros=filtros)] == [brasil.id]
+    assert banco.contar_alunos(filtros) == 1
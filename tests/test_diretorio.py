@@ -0,0 +1,52 @@
+# tests/test_diretorio.py
+# O cache de alunos do processo acompanha escritas feitas fora dele (outro processo, sqlite3 direto).
+import sqlite3
+
+
+def _outro_processo(banco, sql, parametros=()):
+    with sqlite3.connect(banco.engine.url.database) as conn:
+        conn.execute(sql, parametros)
+
+
+def test_diretorio_ve_insercao_de_outro_processo(banco):
+    banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    assert banco.diretorio_alunos.obter_por_passaporte("CD456") is None  # já carregado
+
+    _outro_processo(banco, "INSERT INTO alunos (id, nome, passaporte, serie) VALUES (50, 'Bruno Lima', 'CD456', '1º')")
+
+    item = banco.diretorio_alunos.obter_por_passaporte("CD456")
+    assert (item.id, item.nome, item.serie) == (50, "Bruno Lima", "1º")
+    assert [i.id for i in banco.diretorio_alunos.buscar("bruno")] == [50]
+
+
+def test_diretorio_ve_alteracao_de_outro_processo(banco):
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    assert banco.diretorio_alunos.obter(aluno.id).nome == "Ana Souza"
+
+    _outro_processo(banco, "UPDATE alunos SET nome = 'Ana Costa', passaporte = 'ZZ999' WHERE id = ?", (aluno.id,))
+
+    assert banco.diretorio_alunos.obter(aluno.id).nome == "Ana Costa"
+    assert banco.diretorio_alunos.obter_por_passaporte("AB123") is None
+    assert banco.diretorio_alunos.obter_por_passaporte("ZZ999").id == aluno.id
+
+
+def test_diretorio_ve_exclusao_de_outro_processo(banco):
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    assert banco.diretorio_alunos.obter(aluno.id) is not None
+
+    _outro_processo(banco, "DELETE FROM alunos WHERE id = ?", (aluno.id,))
+
+    assert banco.diretorio_alunos.obter(aluno.id) is None
+    assert banco.diretorio_alunos.obter_por_passaporte("AB123") is None
+    assert banco.diretorio_alunos.buscar("ana") == []
+
+
+def test_diretorio_recarrega_depois_de_carga_grande(banco, monkeypatch):
+    banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    assert len(banco.diretorio_alunos.itens()) == 1
+    monkeypatch.setattr(banco.DiretorioAlunos, "MAX_MUDANCAS_APLICADAS", 2)
+
+    with sqlite3.connect(banco.engine.url.database) as conn:
+        conn.executemany("INSERT INTO alunos (nome) VALUES (?)", [("Bruno",), ("Carla",), ("Davi",)])
+
+    assert sorted(i.nome for i in banco.diretorio_alunos.itens()) == ["Ana Souza", "Bruno", "Carla", "Davi"]
@@ -0,0 +1,64 @@
+# tests/test_duplicados.py
+# Detecção de alunos cadastrados duas vezes: normalização, comparação e blocos.
+import database
+
+
+def _pares(pares):
+    return [(p.aluno_a.id, p.aluno_b.id, p.motivo) for p in pares]
+
+
+def test_passaporte_com_outra_formatacao(banco):
+    assert database.chave_passaporte("ab 123.456-7") == database.chave_passaporte("AB1234567") == "AB1234567"
+    ana = database.inserir_aluno(nome="Ana Souza", passaporte="AB1234567")
+
+    pares = database.possiveis_duplicados("Fulana de Tal", "ab 123.456-7")
+
+    assert [(p.aluno_b.id, p.pontuacao, p.motivo) for p in pares] == [(ana.id, 1.0, "mesmo passaporte")]
+
+
+def test_nome_sem_acentos_particulas_e_em_outra_ordem(banco):
+    maria = database.inserir_aluno(nome="María José da Conceição")
+
+    assert _pares(database.possiveis_duplicados("Conceicao Maria Jose")) == [(None, maria.id, "mesmo nome")]
+    assert _pares(database.possiveis_duplicados("Maria Jose de la Conceicao")) == [(None, maria.id, "mesmo nome")]
+    assert database.possiveis_duplicados("Maria Jose Pereira") == []
+
+
+def test_passaporte_com_um_erro_de_digitacao(banco):
+    ana = database.inserir_aluno(nome="Ana Souza", passaporte="AB123456")
+
+    # mesmo nome e passaporte a uma troca/inversão de distância: provável erro de digitação
+    for digitado in ("AB123457", "AB124356", "AB12345", "AB1234567"):
+        pares = database.possiveis_duplicados("Ana Souza", digitado)
+        assert [(p.aluno_b.id, p.motivo) for p in pares] == [(ana.id, "mesmo nome, passaporte parecido")], digitado
+    # duas diferenças: outra pessoa com o mesmo nome
+    assert database.possiveis_duplicados("Ana Souza", "AB654321") == []
+
+
+def test_inserir_aluno_devolve_os_possiveis_duplicados(banco):
+    primeiro = database.inserir_aluno(nome="José Gonzalez", passaporte="X1234567")
+    assert primeiro.possiveis_duplicados == []
+
+    segundo = database.inserir_aluno(nome="Jose Gonsales", passaporte="x 123 456 7")
+
+    assert isinstance(segundo, database.AlunoInseridoDTO)
+    assert segundo.nome == "Jose Gonsales" and segundo.passaporte == "x 123 456 7"
+    assert [(p.aluno_a.id, p.aluno_b.id) for p in segundo.possiveis_duplicados] == [(segundo.id, primeiro.id)]
+
+
+def test_blocos_maiores_que_o_limite_sao_pulados_menos_os_de_passaporte(banco, monkeypatch):
+    silvas = [database.inserir_aluno(nome="Silva Santos").id for _ in range(3)]
+    mesmo_passaporte = [database.inserir_aluno(nome=nome, passaporte="CD99887").id
+                        for nome in ("Bia Lopes", "Carla Reis", "Duda Melo")]
+
+    todos = _pares(database.encontrar_duplicados())
+    assert [(a, b) for a, b, motivo in todos if motivo == "mesmo nome"] == [
+        (silvas[0], silvas[1]), (silvas[0], silvas[2]), (silvas[1], silvas[2])]
+    assert len(todos) == 6
+
+    # com limite 2 o bloco "Silva Santos" (3 alunos) fica de fora; o do passaporte, não
+    limitados = _pares(database.encontrar_duplicados(limite_bloco=2))
+    assert len(limitados) == 3 and {motivo for _, _, motivo in limitados} == {"mesmo passaporte"}
+    monkeypatch.setattr(database, "LIMITE_BLOCO", 2)
+    assert database.possiveis_duplicados("Silva Santos") == []
+    assert len(database.possiveis_duplicados("Outro Nome", "cd-99887")) == 3
@@ -0,0 +1,16 @@
+import pytest
+
+import database
+
+
+def test_escolas_derivam_arquivos_sqlite_ao_lado_do_padrao(tmp_path):
+    roteador = database.RoteadorEscolas({"centro": None, "norte": None}, f"sqlite:///{tmp_path / 'alunos.db'}")
+    assert roteador.url_escola("centro") == f"sqlite:///{tmp_path / 'alunos.db'}"
+    assert roteador.url_escola("norte") == f"sqlite:///{tmp_path / 'alunos_norte.db'}"
+
+
+def test_banco_servidor_exige_arquivo_sqlite_das_outras_escolas():
+    with pytest.raises(ValueError, match="norte"):
+        database.RoteadorEscolas({"centro": None, "norte": None}, "postgresql://localhost/alunos")
+    roteador = database.RoteadorEscolas({"centro": None, "norte": "norte.db"}, "postgresql://localhost/alunos")
+    assert roteador.url_escola("norte") == "sqlite:///norte.db"
@@ -0,0 +1,65 @@
+# tests/test_fila_presencas.py
+# Fila de entradas gravadas em lote por uma thread (quiosque).
+import logging
+import time
+
+from sqlalchemy import func, select
+
+import database
+
+
+def _presencas():
+    with database.engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(database.Presenca)).scalar()
+
+
+def test_parar_grava_tudo_o_que_foi_enfileirado(banco):
+    ids = [database.inserir_aluno(nome=f"Aluno {i}").id for i in range(5)]
+    fila = database.FilaPresencas(intervalo=0.2, tamanho_lote=7)
+    for i in range(100):
+        fila.registrar_entrada(ids[i % len(ids)])
+
+    fila.parar()
+
+    assert fila.gravadas == 100 and fila.pendentes == 0
+    assert _presencas() == 100
+    with database.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(database.PresencaDiaria)).scalar() == len(ids)
+
+
+def test_parar_nao_espera_o_intervalo(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza")
+    fila = database.FilaPresencas(intervalo=30)
+    fila.registrar_entrada(aluno.id)
+    time.sleep(0.1)  # a thread já está esperando o lote completar
+
+    inicio = time.monotonic()
+    fila.parar()
+
+    assert time.monotonic() - inicio < 5
+    assert _presencas() == 1
+
+
+def test_descarta_entradas_de_aluno_excluido(banco):
+    ana = database.inserir_aluno(nome="Ana Souza")
+    fila = database.FilaPresencas(intervalo=30)
+    fila.registrar_entrada(ana.id)
+    fila.registrar_entrada(999)
+
+    fila.parar()
+
+    assert fila.gravadas == 1 and _presencas() == 1
+
+
+def test_parar_com_erro_persistente_desiste_e_registra_o_lote(banco, caplog, monkeypatch):
+    aluno = database.inserir_aluno(nome="Ana Souza")
+    monkeypatch.setattr(database, "atualizar_presenca_diaria", lambda conn, pares: conn.exec_driver_sql("SELECT * FROM nada"))
+    fila = database.FilaPresencas(intervalo=0.01)
+    fila.registrar_entrada(aluno.id)
+
+    with caplog.at_level(logging.ERROR, logger=database.logger.name):
+        fila.parar()
+
+    assert fila.pendentes == 0 and _presencas() == 0
+    perdidas = [r for r in caplog.records if "perdidas" in r.getMessage()]
+    assert len(perdidas) == 1 and f"'aluno_id': {aluno.id}" in perdidas[0].getMessage()
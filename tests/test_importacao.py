@@ -0,0 +1,77 @@
+import io
+from datetime import date
+
+import pytest
+
+import database
+
+
+def _importar(banco, conteudo, nome="alunos.csv", **kwargs):
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode("utf-8")
+    return banco.importar_alunos(io.BytesIO(conteudo), nome, **kwargs)
+
+
+def _alunos(banco):
+    return {a.nome: a for a in banco.listar_alunos()}
+
+
+def test_cabecalhos_alternativos_e_data_brasileira(banco):
+    resumo = _importar(banco, "Nome completo;País de origem;Passaporte / Documento;Série / Ano;Data de entrada\n"
+                              "Ana Souza;Bolívia;AB123;6º ano;05/02/2025\n")
+    assert resumo["inseridos"] == 1 and resumo["erros"] == []
+    ana = _alunos(banco)["Ana Souza"]
+    assert (ana.pais, ana.passaporte, ana.serie, ana.data_entrada) == ("Bolívia", "AB123", "6º ano", date(2025, 2, 5))
+
+
+def test_passaporte_repetido_no_arquivo_ou_ja_cadastrado_e_ignorado(banco):
+    banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    resumo = _importar(banco, "nome,passaporte\nAna S.,AB123\nBruno Lima,CD456\nBruno L.,CD456\nCarla,\n")
+    assert (resumo["lidas"], resumo["inseridos"], resumo["duplicados"]) == (4, 2, 2)
+    assert set(_alunos(banco)) == {"Ana Souza", "Bruno Lima", "Carla"}
+
+
+def test_erros_por_linha_nao_interrompem_a_importacao(banco):
+    resumo = _importar(banco, "nome,idade,data entrada\n"
+                              ",10,\n"
+                              "Ana,abc,\n"
+                              "Bruno,200,\n"
+                              "Carla,9,31/02/2025\n"
+                              "\n"
+                              "Davi,11,2025-03-01\n")
+    assert resumo["inseridos"] == 1
+    assert [linha for linha, _ in resumo["erros"]] == [2, 3, 4, 5]
+    assert "nome obrigatório" in resumo["erros"][0][1]
+    assert set(_alunos(banco)) == {"Davi"}
+
+
+def test_csv_de_uma_coluna(banco):
+    resumo = _importar(banco, "nome\nAna\nBruno\n")
+    assert resumo["inseridos"] == 2 and resumo["erros"] == []
+
+
+def test_csv_em_cp1252(banco):
+    resumo = _importar(banco, "nome;país\nJoão Conceição;Peru\n".encode("cp1252"))
+    assert resumo["inseridos"] == 1
+    assert _alunos(banco)["João Conceição"].pais == "Peru"
+
+
+def test_arquivo_ilegivel_no_meio_vira_erro_do_arquivo(banco):
+    # 0x81 não existe nem em UTF-8 nem em cp1252
+    resumo = _importar(banco, b"nome\nAna\nBruno\x81\nCarla\n")
+    assert resumo["erros"] and "ilegível" in resumo["erros"][0][1]
+
+
+def test_lotes_gravados_aparecem_no_diretorio_mesmo_com_falha(banco, monkeypatch):
+    banco.diretorio_alunos.buscar("x")  # carrega o cache antes da importação
+    validar = database._validar_linha_importacao
+
+    def falhar_na_terceira(bruta):
+        if bruta["nome"] == "Carla":
+            raise RuntimeError("banco caiu")
+        return validar(bruta)
+
+    monkeypatch.setattr(database, "_validar_linha_importacao", falhar_na_terceira)
+    with pytest.raises(RuntimeError):
+        _importar(banco, "nome,passaporte\nAna,AB1\nBruno,AB2\nCarla,AB3\n", lote=1)
+    assert banco.diretorio_alunos.obter_por_passaporte("AB2") is not None
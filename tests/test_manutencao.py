@@ -0,0 +1,11 @@
+import pytest
+
+import manutencao
+
+
+def test_mesclar_aluno_inexistente_sai_com_erro(banco, monkeypatch):
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    monkeypatch.setattr("sys.argv", ["manutencao.py", "duplicados", "--mesclar", str(aluno.id), "999"])
+    with pytest.raises(SystemExit) as saida:
+        manutencao.main()
+    assert saida.value.code == "erro: aluno não encontrado"
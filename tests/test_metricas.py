@@ -0,0 +1,28 @@
+import database
+import metricas
+
+
+def test_sql_registra_linhas_so_de_escrita(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    metricas.limpar()
+    database.registrar_presenca_entrada(aluno.id)
+    database.listar_alunos()
+    sql = metricas.medicoes("sql")
+    assert [m.linhas for m in sql if m.nome.startswith("INSERT INTO presenca_diaria")] == [1]
+    assert {m.linhas for m in sql if m.nome.startswith("SELECT")} == {None}
+
+
+
+def test_sql_com_erro_nao_deixa_inicio_na_conexao(banco):
+    from sqlalchemy.exc import OperationalError
+
+    metricas.limpar()
+    with database.engine.connect() as conn:
+        for _ in range(3):
+            try:
+                conn.exec_driver_sql("SELECT * FROM tabela_que_nao_existe")
+            except OperationalError:
+                conn.rollback()
+        conn.exec_driver_sql("SELECT 1").scalar()
+        assert not conn.info.get("_metricas_inicio")
+    assert [m.nome for m in metricas.medicoes("sql")] == ["SELECT 1"]
@@ -0,0 +1,90 @@
+# tests/test_migracoes.py
+import sqlite3
+
+from sqlalchemy import func, select
+
+
+def _inserir(caminho, sql, linhas):
+    with sqlite3.connect(caminho) as conn:
+        conn.executemany(sql, linhas)
+
+
+def test_banco_novo_fica_na_ultima_versao(banco):
+    assert banco.versao_schema() == len(banco.MIGRACOES)
+
+
+def test_atualiza_banco_original_com_presencas_orfas(banco_original):
+    import database
+
+    _inserir(banco_original, "INSERT INTO alunos (id, nome) VALUES (?, ?)", [(1, "Ana"), (2, "Bruno")])
+    _inserir(banco_original, "INSERT INTO presencas (aluno_id, data, hora_entrada, hora_saida) VALUES (?, ?, ?, ?)", [
+        (1, "2025-03-10", "2025-03-10 07:00:00.000000", "2025-03-10 12:00:00.000000"),
+        (2, "2025-03-10", "2025-03-10 07:05:00.000000", None),
+        (99, "2025-03-10", "2025-03-10 07:10:00.000000", None),  # aluno já excluído
+    ])
+
+    database.criar_banco()
+
+    assert database.versao_schema() == len(database.MIGRACOES)
+    with database.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(database.Presenca)).scalar() == 2
+        diaria = conn.execute(select(database.PresencaDiaria.aluno_id, database.PresencaDiaria.minutos)
+                              .order_by(database.PresencaDiaria.aluno_id)).all()
+    assert diaria == [(1, 300), (2, 0)]
+
+
+def test_banco_novo_sem_estatisticas_do_fts(banco):
+    # estatísticas de tabelas internas do FTS vazias deixam as inserções dezenas de vezes mais lentas
+    with banco.engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT tbl FROM sqlite_stat1 WHERE tbl LIKE 'alunos_fts%'").all() == []
+
+
+def test_atualiza_banco_original_com_presenca_sem_aluno(banco_original):
+    import database
+
+    _inserir(banco_original, "INSERT INTO alunos (id, nome) VALUES (?, ?)", [(1, "Ana")])
+    _inserir(banco_original, "INSERT INTO presencas (aluno_id, data, hora_entrada) VALUES (?, ?, ?)", [
+        (1, "2025-03-10", "2025-03-10 07:00:00.000000"),
+        (None, "2025-03-10", "2025-03-10 07:10:00.000000"),
+    ])
+
+    database.criar_banco()
+
+    assert database.versao_schema() == len(database.MIGRACOES)
+    assert database.reconstruir_presenca_diaria() == 1
+    with database.engine.connect() as conn:
+        assert conn.execute(select(database.PresencaDiaria.aluno_id)).scalars().all() == [1]
+
+
+def test_presencas_nao_reaproveitam_ids_depois_da_migracao(banco_original):
+    import database
+
+    _inserir(banco_original, "INSERT INTO alunos (id, nome) VALUES (?, ?)", [(1, "Ana")])
+    _inserir(banco_original, "INSERT INTO presencas (id, aluno_id, data, hora_entrada) VALUES (?, ?, ?, ?)", [
+        (5, 1, "2025-03-10", "2025-03-10 07:00:00.000000"),
+    ])
+
+    database.criar_banco()
+
+    with database.engine.begin() as conn:
+        ddl = conn.exec_driver_sql("SELECT sql FROM sqlite_master WHERE name = 'presencas'").scalar()
+        conn.exec_driver_sql("DELETE FROM presencas")
+    assert "AUTOINCREMENT" in ddl
+    assert database.registrar_presenca_entrada(1).id == 6
+
+
+def test_migracao_reserva_ids_ja_arquivados(banco):
+    from datetime import datetime
+
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ano = datetime.now().year - 1
+    arquivada = banco.registrar_presenca_entrada(aluno.id, quando=datetime(ano, 3, 10, 7, 30))
+    banco.arquivar_presencas(ano)
+    # banco da versão anterior: a sequência não conhece os ids que foram para o arquivo
+    with banco.engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'presencas'")
+        conn.exec_driver_sql(f"PRAGMA user_version = {len(banco.MIGRACOES) - 1}")
+
+    banco.criar_banco()
+
+    assert banco.registrar_presenca_entrada(aluno.id).id > arquivada.id
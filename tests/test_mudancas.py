@@ -0,0 +1,80 @@
+# tests/test_mudancas.py
+# Log de mudanças gravado pelos gatilhos: pausa no arquivamento, compactação e leitura por seq.
+from datetime import datetime
+
+
+def _log(banco, seq=0, tabelas=None):
+    return [(m.tabela, m.operacao, m.registro_id) for m in banco.mudancas_desde(seq, tabelas)]
+
+
+def _envelhecer_log(banco):
+    with banco.engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE mudancas SET momento = '2000-01-01 00:00:00.000'")
+
+
+def test_gatilhos_registram_insercao_alteracao_e_exclusao(banco):
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    banco.atualizar_aluno(aluno.id, {"serie": "2º"})
+    banco.deletar_aluno(aluno.id)
+
+    assert _log(banco, tabelas=["alunos"]) == [("alunos", "I", aluno.id), ("alunos", "U", aluno.id),
+                                               ("alunos", "D", aluno.id)]
+    dados = [m.dados for m in banco.mudancas_desde(0, ["alunos"])]
+    assert dados[1]["serie"] == "2º" and dados[2]["nome"] == "Ana Souza"
+
+
+def test_arquivar_nao_registra_exclusoes(banco):
+    aluno = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ano = datetime.now().year - 1
+    banco.registrar_presenca_entrada(aluno.id, quando=datetime(ano, 3, 10, 7, 30))
+    antes = banco.ultimo_seq_mudancas()
+
+    assert banco.arquivar_presencas(ano)["linhas"] == 1
+
+    assert _log(banco, antes) == []
+    with banco.engine.connect() as conn:  # a pausa vale só para a transação do arquivamento
+        assert conn.exec_driver_sql("SELECT COUNT(*) FROM mudancas_controle WHERE chave = 'pausado'").scalar() == 0
+    presenca = banco.registrar_presenca_entrada(aluno.id)
+    assert _log(banco, antes) == [("presencas", "I", presenca.id)]
+
+
+def test_compactar_mantem_ultima_mudanca_de_cada_registro_e_exclusoes(banco):
+    ana = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    bruno = banco.inserir_aluno(nome="Bruno Lima", passaporte="CD456")
+    banco.atualizar_aluno(ana.id, {"serie": "2º"})
+    banco.atualizar_aluno(ana.id, {"serie": "3º"})
+    banco.deletar_aluno(bruno.id)
+    _envelhecer_log(banco)
+    ultimo = banco.ultimo_seq_mudancas()
+
+    resultado = banco.compactar_mudancas()
+
+    assert resultado == {"removidas": 3, "compactado_ate": ultimo}
+    assert _log(banco) == [("alunos", "U", ana.id), ("alunos", "D", bruno.id)]
+    assert [m.dados["serie"] for m in banco.mudancas_desde(0) if m.registro_id == ana.id] == ["3º"]
+    assert banco.ultimo_seq_mudancas() == ultimo  # seq não volta depois de compactar
+
+
+def test_compactar_respeita_janela_e_guarda_compactado_ate(banco):
+    ana = banco.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    banco.atualizar_aluno(ana.id, {"serie": "2º"})
+    _envelhecer_log(banco)
+    compactado_ate = banco.ultimo_seq_mudancas()
+    banco.atualizar_aluno(ana.id, {"serie": "3º"})  # recente: fica, e não conta no compactado_ate
+    banco.inserir_aluno(nome="Bruno Lima")
+
+    assert banco.compactar_mudancas() == {"removidas": 2, "compactado_ate": compactado_ate}
+    # nada antigo sobrando: não mexe no log e devolve o compactado_ate anterior
+    assert banco.compactar_mudancas() == {"removidas": 0, "compactado_ate": compactado_ate}
+    assert [(m.operacao, m.dados["nome"], m.dados["serie"]) for m in banco.mudancas_desde(0)] == [
+        ("U", "Ana Souza", "3º"), ("I", "Bruno Lima", None)]
+
+
+def test_mudancas_desde_pagina_por_seq(banco):
+    ids = [banco.inserir_aluno(nome=nome).id for nome in ("Ana", "Bruno", "Carla")]
+
+    primeira = list(banco.mudancas_desde(0, limite=2))
+    segunda = list(banco.mudancas_desde(primeira[-1].seq, limite=2))
+
+    assert [m.registro_id for m in primeira + segunda] == ids
+    assert list(banco.mudancas_desde(segunda[-1].seq)) == []
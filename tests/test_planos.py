@@ -0,0 +1,41 @@
+# Planos (EXPLAIN QUERY PLAN) das consultas quentes: um índice removido ou uma consulta
+# reescrita que volte a varrer a tabela inteira falha aqui, não em produção.
+import io
+from datetime import date, datetime
+
+import database
+
+
+def _plano(funcao, *args, tabela, **kwargs):
+    """Linhas do plano do primeiro SQL emitido por `funcao` que lê de `tabela`."""
+    for sql, plano in database.explicar_plano(funcao, *args, **kwargs):
+        if f"FROM {tabela}" in sql:
+            return plano
+    raise AssertionError(f"nenhuma consulta em {tabela}")
+
+
+def test_presencas_abertas_usam_indice_parcial(banco):
+    plano = _plano(database.contar_presencas_abertas, tabela="presencas")
+    assert any("ix_presencas_abertas" in linha for linha in plano), plano
+
+
+def test_importacao_procura_passaportes_pelo_indice(banco):
+    csv = io.BytesIO("nome,passaporte\nAna Souza,AB123\n".encode())
+    plano = _plano(database.importar_alunos, csv, "alunos.csv", tabela="alunos")
+    assert any("ix_alunos_passaporte" in linha for linha in plano), plano
+
+
+def test_pagina_de_alunos_continua_pela_chave_primaria(banco):
+    plano = _plano(database.listar_alunos_pagina, cursor=10, tabela="alunos")
+    assert plano == ["SEARCH alunos USING INTEGER PRIMARY KEY (rowid>?)"]
+
+
+def test_pagina_de_presencas_segue_o_indice_sem_ordenar(banco):
+    cursor = (date.today(), datetime.now(), 1)
+    plano = _plano(database.listar_presencas_pagina, cursor=cursor, tabela="presencas")
+    assert any("ix_presencas_data_entrada" in linha for linha in plano), plano
+    assert not any("TEMP B-TREE" in linha for linha in plano), plano
+
+    plano = _plano(database.listar_presencas_pagina, aluno_id=1, cursor=cursor, tabela="presencas")
+    assert any("ix_presencas_aluno_data_entrada (aluno_id=?)" in linha for linha in plano), plano
+    assert not any("TEMP B-TREE" in linha for linha in plano), plano
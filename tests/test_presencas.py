@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import database
+
+
+def test_saida_fecha_so_a_entrada_do_dia(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    database.registrar_presenca_entrada(aluno.id, quando=datetime(2025, 3, 10, 7, 30))
+    assert database.registrar_presenca_saida_por_aluno(aluno.id, quando=datetime(2025, 3, 11, 12, 0)) is None
+
+    database.registrar_presenca_entrada(aluno.id, quando=datetime(2025, 3, 11, 7, 40))
+    saida = database.registrar_presenca_saida_por_aluno(aluno.id, quando=datetime(2025, 3, 11, 12, 0))
+    assert saida.data.day == 11 and saida.hora_entrada == datetime(2025, 3, 11, 7, 40)
+
+
+def test_fecha_entradas_abertas_de_dias_anteriores(banco):
+    aluno = database.inserir_aluno(nome="Ana Souza", passaporte="AB123")
+    ontem = database.registrar_presenca_entrada(aluno.id, quando=datetime(2025, 3, 10, 7, 30))
+    hoje = database.registrar_presenca_entrada(aluno.id, quando=datetime(2025, 3, 11, 7, 40))
+
+    assert database.fechar_presencas_abertas_anteriores(antes_de=hoje.data) == 1
+    with database.SessionLocal() as session:
+        fechada = session.get(database.Presenca, ontem.id)
+        assert fechada.hora_saida == fechada.hora_entrada
+        assert fechada.observacao == database.SAIDA_NAO_REGISTRADA
+        assert session.get(database.Presenca, hoje.id).hora_saida is None
+        diaria = session.get(database.PresencaDiaria, (aluno.id, ontem.data))
+        assert diaria.ultima_saida == fechada.hora_saida and diaria.minutos == 0
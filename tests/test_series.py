@@ -0,0 +1,85 @@
+# tests/test_series.py
+# Alterações em lote de série: promoção de fim de ano (promover_series) e turma selecionada (atualizar_alunos).
+import pytest
+from sqlalchemy import event
+
+import database
+
+
+@pytest.fixture
+def sql_emitido(banco):
+    instrucoes = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        instrucoes.append(" ".join(statement.split()))
+
+    event.listen(banco.engine, "before_cursor_execute", _registrar)
+    yield instrucoes
+    event.remove(banco.engine, "before_cursor_execute", _registrar)
+
+
+@pytest.fixture
+def diretorio_atualizado(banco, monkeypatch):
+    """Itens passados a diretorio_alunos.atualizar (o diretório em si continua sendo atualizado)."""
+    itens = []
+    original = banco.diretorio_alunos.atualizar
+
+    def _atualizar(aluno):
+        itens.append((aluno.id, aluno.serie))
+        original(aluno)
+
+    monkeypatch.setattr(banco.diretorio_alunos, "atualizar", _atualizar)
+    return itens
+
+
+def _series(banco):
+    return {a.id: a.serie for a in banco.listar_alunos()}
+
+
+def test_promover_series_numa_instrucao_sem_encadear(banco, sql_emitido, diretorio_atualizado):
+    primeiro = database.inserir_aluno(nome="Ana", serie="1º ano").id
+    segundo = database.inserir_aluno(nome="Bruno", serie="2º ano").id
+    sem_serie = database.inserir_aluno(nome="Carla").id
+    outro = database.inserir_aluno(nome="Davi", serie="Turma livre").id
+    sql_emitido.clear()
+    diretorio_atualizado.clear()
+
+    alterados = database.promover_series({"1º ano": "2º ano", "2º ano": "3º ano", "": "1º ano", "Turma livre": ""})
+
+    # uma instrução só, e o diretório recebe as linhas do RETURNING, sem reler os alunos
+    assert len(sql_emitido) == 1
+    assert sql_emitido[0].startswith("UPDATE alunos SET serie=CASE") and "RETURNING" in sql_emitido[0]
+    assert sorted(diretorio_atualizado) == sorted([(primeiro, "2º ano"), (segundo, "3º ano"), (sem_serie, "1º ano")])
+    assert alterados == 3  # "Turma livre" -> "" (vazio) não é destino
+    assert _series(banco) == {primeiro: "2º ano", segundo: "3º ano", sem_serie: "1º ano", outro: "Turma livre"}
+    assert database.diretorio_alunos.obter(segundo).serie == "3º ano"
+
+
+def test_promover_series_com_mapa_sem_mudanca(banco, sql_emitido):
+    database.inserir_aluno(nome="Ana", serie="1º ano")
+    sql_emitido.clear()
+
+    assert database.promover_series({"1º ano": "1º ano", "2º ano": None}) == 0
+    assert sql_emitido == []
+
+
+def test_proxima_serie_sugere_o_ano_seguinte():
+    assert database.proxima_serie("5º ano") == "6º ano"
+    assert database.proxima_serie("9º ano") == "1ª série EM"
+    assert database.proxima_serie("2ª série EM") == "3ª série EM"
+    assert database.proxima_serie("3ª série EM") is None
+    assert database.proxima_serie("Turma livre") is None
+
+
+def test_atualizar_alunos_so_os_selecionados(banco, sql_emitido, diretorio_atualizado):
+    ids = [database.inserir_aluno(nome=nome, serie="1º ano").id for nome in ("Ana", "Bruno", "Carla")]
+    sql_emitido.clear()
+    diretorio_atualizado.clear()
+
+    assert database.atualizar_alunos([ids[0], ids[2], 999], {"serie": "2º ano", "nome": None, "senha": "x"}) == 2
+
+    assert len(sql_emitido) == 1 and sql_emitido[0].startswith("UPDATE alunos SET serie=")
+    assert sorted(diretorio_atualizado) == [(ids[0], "2º ano"), (ids[2], "2º ano")]
+    assert _series(banco) == {ids[0]: "2º ano", ids[1]: "1º ano", ids[2]: "2º ano"}
+    assert database.atualizar_alunos([], {"serie": "3º ano"}) == 0
+    assert database.atualizar_alunos(ids, {"nome": None}) == 0